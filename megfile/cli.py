@@ -87,8 +87,10 @@ def ls(path: str, long: bool, recursive: bool, human_readable: bool):
     'Command is performed on all files or objects under the specified directory or prefix.'
 )
 def cp(src_path: str, dst_path: str, recursive: bool):
-    copy_func = smart_sync if recursive else smart_copy
-    copy_func(src_path, dst_path)
+    if recursive:
+        smart_sync(src_path, dst_path, skip_unchanged=True)
+    else:
+        smart_copy(src_path, dst_path)
 
 
 @cli.command(short_help='Move files from source to dest.')
@@ -116,16 +118,53 @@ def mv(src_path: str, dst_path: str, recursive: bool):
     'Command is performed on all files or objects under the specified directory or prefix.'
 )
 def rm(path: str, recursive: bool):
-    remove_func = smart_remove if recursive else smart_unlink
-    remove_func(path)
+    if not recursive:
+        smart_unlink(path)
+        return
+    report = smart_remove(path)
+    if report is not None and report.failures:
+        for failure in report.failures:
+            click.echo(
+                'failed to remove %s: %s %s' %
+                (failure.path, failure.code, failure.message),
+                err=True)
+        raise click.ClickException(
+            'failed to remove %d objects' % len(report.failures))
 
 
 @cli.command(
     short_help='Make source and dest identical, modifying destination only.')
 @click.argument('src_path')
 @click.argument('dst_path')
-def sync(src_path: str, dst_path: str):
-    smart_sync(src_path, dst_path)
+@click.option(
+    '--compare',
+    type=click.Choice(['mtime', 'etag']),
+    default='mtime',
+    help=
+    'Skip files of the same size, and newer mtime (by default) or the same etag / md5 in dest.'
+)
+@click.option(
+    '-f', '--force', is_flag=True, help='Copy all files, even unchanged ones.')
+@click.option(
+    '-n',
+    '--dry-run',
+    is_flag=True,
+    help='Print files to be copied, without copying them.')
+def sync(
+        src_path: str, dst_path: str, compare: str, force: bool, dry_run: bool):
+    delta = smart_sync(
+        src_path,
+        dst_path,
+        skip_unchanged=not force,
+        compare=compare,
+        dry_run=dry_run)
+    if dry_run:
+        for src_file_path, dst_file_path, _ in delta.files:
+            click.echo('%s -> %s' % (src_file_path, dst_file_path))
+        click.echo(
+            'copy %d files (%s), skip %d files (%s)' % (
+                delta.copy_files, get_human_size(delta.copy_bytes),
+                delta.skip_files, get_human_size(delta.skip_bytes)))
 
 
 @cli.command(short_help="Make the path if it doesn't already exist.")
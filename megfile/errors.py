@@ -1,3 +1,4 @@
+import asyncio
 import time
 from contextlib import contextmanager
 from functools import wraps
@@ -154,6 +155,35 @@ def patch_method(
     return wrapper
 
 
+def patch_async_method(
+        func: Callable, max_retries: int,
+        should_retry: Callable[[Exception], bool]):
+    '''Same as patch_method, but for coroutine functions, and the event loop is not blocked between retries'''
+
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        error = None
+        for retries in range(1, max_retries + 1):
+            try:
+                result = await func(*args, **kwargs)
+                if error is not None:
+                    _logger.debug(
+                        'unknown error resolved: %s, with %d tries' %
+                        (full_error_message(error), retries))
+                return result
+            except Exception as exception:
+                error = exception
+                if retries == max_retries or not should_retry(error):
+                    raise
+                retry_interval = min(0.1 * 2**retries, 30)
+                _logger.debug(
+                    'unknown error encountered: %s, retry in %0.1f seconds after %d tries'
+                    % (full_error_message(error), retry_interval, retries))
+                await asyncio.sleep(retry_interval)
+
+    return wrapper
+
+
 def _create_missing_ok_generator(generator, missing_ok: bool, error: Exception):
     if missing_ok:
         yield from generator
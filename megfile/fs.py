@@ -5,7 +5,6 @@ from io import BytesIO
 from stat import S_ISDIR as stat_isdir
 from stat import S_ISLNK as stat_islnk
 from typing import BinaryIO, Callable, Iterator, List, Optional, Tuple
-from unittest.mock import patch
 from urllib.parse import urlsplit
 
 from megfile.errors import _create_missing_ok_generator
@@ -280,15 +279,32 @@ def fs_scandir(path: MegfilePathLike) -> Iterator[FileEntry]:
         yield FileEntry(entry.path, _make_stat(entry.stat()))
 
 
+def _fs_scan_dir(root: str) -> Iterator[str]:
+    # Directory is sorted as 'name/', so that paths are yielded in ascending order,
+    # e.g. 'a-b' < 'a/c' < 'b', same as keys listed by s3, and listings can be merged by smart_sync
+    entries = []
+    for entry in os.scandir(root):
+        name = fspath(entry.name)
+        if entry.is_file() or entry.is_symlink():
+            entries.append((name, name, False))
+        else:
+            entries.append((name + '/', name, True))
+
+    for _, name, is_dir in sorted(entries):
+        path = os.path.join(root, name)
+        if is_dir:
+            yield from _fs_scan_dir(path)
+        else:
+            yield path
+
+
 def _fs_scan(pathname: MegfilePathLike,
              missing_ok: bool = True) -> Iterator[str]:
     if fs_isfile(pathname):
         path = fspath(pathname)
         yield path
-
-    for root, _, files in fs_walk(pathname):
-        for filename in files:
-            yield os.path.join(root, filename)
+    elif fs_exists(pathname):
+        yield from _fs_scan_dir(os.path.normpath(fspath(pathname)))
 
 
 def fs_scan(pathname: MegfilePathLike,
@@ -427,21 +443,6 @@ def _copyfile(
         dst_path: MegfilePathLike,
         callback: Optional[Callable[[int], None]] = None):
 
-    def _patch_copyfileobj(callback=None):
-
-        def _copyfileobj(fsrc, fdst, length=16 * 1024):
-            """copy data from file-like object fsrc to file-like object fdst"""
-            while 1:
-                buf = fsrc.read(length)
-                if not buf:
-                    break
-                fdst.write(buf)
-                if callback is None:
-                    continue
-                callback(len(buf))
-
-        return _copyfileobj
-
     src_stat = fs_stat(src_path)
     if src_stat.is_symlink():
         shutil.copyfile(src_path, dst_path, follow_symlinks=False)
@@ -449,8 +450,21 @@ def _copyfile(
             callback(src_stat.size)
         return
 
-    with patch('shutil.copyfileobj', _patch_copyfileobj(callback)):
+    if callback is None:
         shutil.copyfile(src_path, dst_path)
+        return
+
+    # Copy by ourselves instead of patching shutil.copyfileobj, which is global and not thread-safe
+    if os.path.exists(dst_path) and os.path.samefile(src_path, dst_path):
+        raise shutil.SameFileError(
+            '{!r} and {!r} are the same file'.format(src_path, dst_path))
+    with open(src_path, 'rb') as fsrc, open(dst_path, 'wb') as fdst:
+        while True:
+            buf = fsrc.read(16 * 1024)
+            if not buf:
+                break
+            fdst.write(buf)
+            callback(len(buf))
 
 
 def fs_copy(
@@ -470,9 +484,8 @@ def fs_copy(
 
         the int data is menas the size (in bytes) of the written data that is passed periodically
 
-            3. This function is thread-unsafe
+            3. This function is thread-safe, so that files can be copied concurrently, e.g. by smart_sync
 
-    TODO: get shutil implementation, to make fs_copy thread-safe
     :param src_path: Source file path
     :param dst_path: Target file path
     :param callback: Called periodically during copy, and the input parameter is the data size (in bytes) of copy since the last call
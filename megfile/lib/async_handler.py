@@ -0,0 +1,56 @@
+import asyncio
+import os
+from functools import partial
+from typing import IO, AnyStr
+
+
+class AsyncHandler:
+    '''
+    Asyncio wrapper of a blocking file object, e.g. a local file. Blocking calls run in the default executor of the event loop, so that the event loop is not blocked by I/O.
+    '''
+
+    def __init__(self, file_object: IO[AnyStr]):
+        self._file_object = file_object
+
+    @property
+    def name(self) -> str:
+        return self._file_object.name
+
+    @property
+    def mode(self) -> str:
+        return self._file_object.mode
+
+    @property
+    def closed(self) -> bool:
+        return self._file_object.closed
+
+    def tell(self) -> int:
+        return self._file_object.tell()
+
+    async def _run(self, func, *args):
+        return await asyncio.get_event_loop().run_in_executor(
+            None, partial(func, *args))
+
+    async def __aenter__(self) -> 'AsyncHandler':
+        return self
+
+    async def __aexit__(self, type, value, traceback):
+        await self.close()
+
+    async def read(self, size: int = -1) -> AnyStr:
+        return await self._run(self._file_object.read, size)
+
+    async def readline(self, size: int = -1) -> AnyStr:
+        return await self._run(self._file_object.readline, size)
+
+    async def write(self, data: AnyStr) -> int:
+        return await self._run(self._file_object.write, data)
+
+    async def seek(self, cookie: int, whence: int = os.SEEK_SET) -> int:
+        return await self._run(self._file_object.seek, cookie, whence)
+
+    async def flush(self):
+        await self._run(self._file_object.flush)
+
+    async def close(self):
+        await self._run(self._file_object.close)
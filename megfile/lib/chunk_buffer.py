@@ -0,0 +1,121 @@
+import os
+from collections import deque
+from typing import List, Union
+
+BytesLike = Union[bytes, bytearray, memoryview]
+
+# Smaller writes are copied into a trailing bytearray, instead of being kept as chunks of their own, since every chunk costs memory and time of overwrite
+SMALL_WRITE_SIZE = 64 * 2**10  # 64KB
+
+
+class ChunkBuffer:
+    '''
+    A BytesIO-like buffer of written chunks, data is not copied when it's written or when the buffer grows.
+
+    Written bytes are kept by reference, other bytes-like objects (e.g. memoryview of caller's buffer, which may be reused by caller) are copied once.
+    Writes smaller than SMALL_WRITE_SIZE are coalesced, they are copied into a trailing bytearray chunk, which grows until a larger write is appended.
+    Data is copied only when it's taken out as a contiguous part by read_part(), or when bytes already written are overwritten after seek().
+    Size of buffer is tracked incrementally, so len() is O(1).
+    '''
+
+    def __init__(self):
+        self._chunks = deque()
+        self._tail = None  # Trailing bytearray chunk of small writes
+        self._size = 0
+        self._position = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def chunks(self) -> List[BytesLike]:
+        return list(self._chunks)
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        if whence == os.SEEK_CUR:
+            offset += self._position
+        elif whence == os.SEEK_END:
+            offset += self._size
+        if offset < 0:
+            raise ValueError('negative seek value %d' % offset)
+        self._position = offset
+        return self._position
+
+    def write(self, data: BytesLike) -> int:
+        size = len(data)
+        if size == 0:
+            return 0
+        if self._position < self._size:
+            data = self._overwrite(memoryview(data).cast('B'))
+        if self._position > self._size:
+            # Like BytesIO, the gap after seek beyond the end is filled with zeros
+            self._append(bytes(self._position - self._size))
+        if len(data) > 0:
+            self._append(data)
+            self._position = self._size
+        return size
+
+    def _append(self, data: BytesLike):
+        if len(data) < SMALL_WRITE_SIZE:
+            if self._tail is None:
+                self._tail = bytearray()
+                self._chunks.append(self._tail)
+            self._tail += data
+        else:
+            self._tail = None
+            self._chunks.append(
+                data if isinstance(data, bytes) else bytes(data))
+        self._size += len(data)
+
+    def _overwrite(self, view: memoryview) -> memoryview:
+        '''Overwrite chunks from position in place, return the rest of view to be appended'''
+        offset = 0
+        for index, chunk in enumerate(self._chunks):
+            stop = offset + len(chunk)
+            if stop > self._position:
+                if not isinstance(chunk, bytearray):
+                    chunk = self._chunks[index] = bytearray(chunk)
+                start = self._position - offset
+                size = min(len(chunk) - start, len(view))
+                chunk[start:start + size] = view[:size]
+                view = view[size:]
+                self._position += size
+                if len(view) == 0:
+                    break
+            offset = stop
+        return view
+
+    def read_part(self, size: int) -> bytes:
+        '''
+        Take the first size bytes out of buffer as a contiguous part, data is copied once, or not copied if the part is a written bytes chunk
+
+        Position is moved backwards by size, so that it still points to the same byte.
+        '''
+        size = min(size, self._size)
+        parts, remaining = [], size
+        while remaining > 0:
+            chunk = self._chunks.popleft()
+            if chunk is self._tail:
+                # Rest of tail may be kept as memoryview below, then it can't be resized
+                self._tail = None
+            if len(chunk) > remaining:
+                view = memoryview(chunk)
+                # The rest of chunk is kept as memoryview, it's not copied
+                self._chunks.appendleft(view[remaining:])
+                chunk = view[:remaining]
+            parts.append(chunk)
+            remaining -= len(chunk)
+        self._size -= size
+        self._position = max(self._position - size, 0)
+        if len(parts) == 1 and isinstance(parts[0], bytes):
+            return parts[0]
+        return b''.join(parts)
+
+    def getvalue(self) -> bytes:
+        '''Copy of all bytes in buffer, which are not taken out'''
+        if len(self._chunks) == 1 and isinstance(self._chunks[0], bytes):
+            return self._chunks[0]
+        return b''.join(self._chunks)
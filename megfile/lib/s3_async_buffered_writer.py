@@ -0,0 +1,207 @@
+import asyncio
+from functools import partial
+from logging import getLogger as get_logger
+from typing import Callable, List
+
+from megfile.errors import patch_async_method, raise_s3_error, s3_should_retry
+from megfile.lib.s3_buffered_writer import DEFAULT_BLOCK_SIZE, DEFAULT_MAX_BLOCK_SIZE, DEFAULT_MAX_BUFFER_SIZE, PartResult
+from megfile.lib.s3_metadata_cache import invalidate_metadata
+from megfile.utils import get_human_size
+
+BACKOFF_INITIAL = 64 * 2**20  # 64MB
+BACKOFF_FACTOR = 4
+
+_logger = get_logger(__name__)
+
+
+class AsyncS3BufferedWriter:
+    '''
+    Asyncio counterpart of S3BufferedWriter. Written data is buffered, and every block_size of it is uploaded as a part of multipart upload by a task on the running event loop, instead of threads.
+    write() waits for uploading parts when more than max_buffer_size of data is in memory. File smaller than block_size is uploaded by a single put_object when closed.
+    s3_client is an aiobotocore client, e.g. from megfile.s3_async.get_async_s3_client. Parts and put_object are retried at most max_retries times if should_retry(error) is True.
+    '''
+
+    def __init__(
+            self,
+            bucket: str,
+            key: str,
+            *,
+            s3_client,
+            block_size: int = DEFAULT_BLOCK_SIZE,
+            max_block_size: int = DEFAULT_MAX_BLOCK_SIZE,
+            max_buffer_size: int = DEFAULT_MAX_BUFFER_SIZE,
+            max_retries: int = 10,
+            should_retry: Callable[[Exception], bool] = s3_should_retry):
+
+        self._bucket = bucket
+        self._key = key
+        self._client = s3_client
+        self._max_retries = max_retries
+        self._should_retry = should_retry
+
+        self._block_size = block_size
+        self._max_block_size = max_block_size
+        self._max_buffer_size = max_buffer_size
+        self._offset = 0
+        self._backoff_size = BACKOFF_INITIAL
+        self._buffer = []  # Chunks written since the last part
+        self._buffer_size = 0
+
+        self._tasks = {}  # part number -> asyncio.Task of PartResult
+        self._uploading = set()  # Tasks of parts not uploaded yet
+        self._uploading_size = 0  # Size of parts not uploaded yet
+        self._part_number = 0
+        self._upload_id = None
+        self._closed = False
+
+        _logger.debug('open file: %r, mode: %s' % (self.name, self.mode))
+
+    @property
+    def name(self) -> str:
+        return 's3://%s/%s' % (self._bucket, self._key)
+
+    @property
+    def mode(self) -> str:
+        return 'wb'
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def tell(self) -> int:
+        return self._offset
+
+    async def __aenter__(self) -> 'AsyncS3BufferedWriter':
+        return self
+
+    async def __aexit__(self, type, value, traceback):
+        await self.close()
+
+    @property
+    def _is_multipart(self) -> bool:
+        return len(self._tasks) > 0
+
+    @property
+    def _uploading_tasks(self) -> List[asyncio.Future]:
+        return list(self._uploading)
+
+    def _retry(self, func: Callable) -> Callable:
+        return patch_async_method(
+            func,
+            max_retries=self._max_retries,
+            should_retry=self._should_retry)
+
+    async def _create_upload_id(self):
+        if self._upload_id is None:
+            with raise_s3_error(self.name):
+                self._upload_id = (
+                    await self._client.create_multipart_upload(
+                        Bucket=self._bucket, Key=self._key))['UploadId']
+
+    async def _upload_part(self, part_number: int, content) -> PartResult:
+        with raise_s3_error(self.name):
+            data = await self._retry(self._client.upload_part)(
+                Bucket=self._bucket,
+                Key=self._key,
+                UploadId=self._upload_id,
+                PartNumber=part_number,
+                Body=content,
+            )
+        return PartResult(data['ETag'], part_number, len(content))
+
+    def _on_part_done(self, size: int, task: asyncio.Future):
+        self._uploading.discard(task)
+        self._uploading_size -= size
+
+    async def _submit_part(self, content):
+        self._part_number += 1
+        task = asyncio.ensure_future(
+            self._upload_part(self._part_number, content))
+        self._tasks[self._part_number] = task
+        self._uploading.add(task)
+        self._uploading_size += len(content)
+        # Registered before any waiter, so it's called before waiters wake up
+        task.add_done_callback(partial(self._on_part_done, len(content)))
+        while self._uploading_size > self._max_buffer_size:
+            await asyncio.wait(
+                self._uploading_tasks, return_when=asyncio.FIRST_COMPLETED)
+
+    async def _submit_buffer(self):
+        if self._buffer_size == 0:
+            return
+        content = b''.join(self._buffer)
+        self._buffer = []
+        self._buffer_size = 0
+        await self._create_upload_id()
+
+        # s3 part needs at least 5MB, so we need to divide content into equal-size parts, and give last part more size
+        offset = 0
+        while len(content) - offset - self._max_block_size > self._block_size:
+            offset_stop = offset + self._max_block_size
+            await self._submit_part(content[offset:offset_stop])
+            offset = offset_stop
+        await self._submit_part(content[offset:])
+
+    async def write(self, data: bytes) -> int:
+        if self._closed:
+            raise IOError('file already closed: %r' % self.name)
+
+        size = len(data)
+        self._buffer.append(bytes(data))
+        self._buffer_size += size
+        if self._buffer_size >= self._block_size:
+            await self._submit_buffer()
+
+        self._offset += size
+        if self._offset > self._backoff_size:
+            _logger.debug(
+                'writing file: %r, current size: %s' %
+                (self.name, get_human_size(self._offset)))
+        while self._offset > self._backoff_size:
+            self._backoff_size *= BACKOFF_FACTOR
+        return size
+
+    async def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        _logger.debug('close file: %r' % self.name)
+
+        if not self._is_multipart:
+            with raise_s3_error(self.name):
+                await self._retry(self._client.put_object)(
+                    Bucket=self._bucket,
+                    Key=self._key,
+                    Body=b''.join(self._buffer))
+            invalidate_metadata(self.name)
+            return
+
+        try:
+            await self._submit_buffer()
+            parts = await asyncio.gather(
+                *(self._tasks[number] for number in sorted(self._tasks)))
+            with raise_s3_error(self.name):
+                await self._client.complete_multipart_upload(
+                    Bucket=self._bucket,
+                    Key=self._key,
+                    MultipartUpload={
+                        'Parts': [part.asdict() for part in parts]
+                    },
+                    UploadId=self._upload_id,
+                )
+        except BaseException:
+            await self._abort_upload()
+            raise
+        invalidate_metadata(self.name)
+
+    async def _abort_upload(self):
+        for task in self._uploading_tasks:
+            task.cancel()
+        if self._upload_id is None:
+            return
+        try:
+            await self._client.abort_multipart_upload(
+                Bucket=self._bucket, Key=self._key, UploadId=self._upload_id)
+        except Exception as error:
+            _logger.debug(
+                'failed to abort upload: %r, error: %s' % (self.name, error))
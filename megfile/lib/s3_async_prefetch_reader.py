@@ -0,0 +1,281 @@
+import asyncio
+import os
+from collections import OrderedDict
+from logging import getLogger as get_logger
+from math import ceil
+from typing import Optional
+
+from botocore.exceptions import ClientError
+
+from megfile.errors import S3FileChangedError, client_error_code, patch_async_method, raise_s3_error
+from megfile.lib.s3_prefetch_reader import DEFAULT_BLOCK_CAPACITY, DEFAULT_BLOCK_SIZE, NEWLINE
+from megfile.utils import get_human_size
+
+BACKOFF_INITIAL = 64 * 2**20  # 64MB
+BACKOFF_FACTOR = 4
+
+_logger = get_logger(__name__)
+
+
+class AsyncS3PrefetchReader:
+    '''
+    Asyncio counterpart of S3PrefetchReader. File content is divided into blocks of block_size, at most block_capacity blocks are cached in LRU order, and block_forward blocks after the current one are prefetched as tasks on the running event loop, instead of threads.
+    s3_client is an aiobotocore client, e.g. from megfile.s3_async.get_async_s3_client, and should_retry decides which errors of a block download are retried.
+    File is opened by open() or by entering ``async with``: if content_size is not given, file size and etag are learned from the response of the first block, and HEAD is requested only if the response does not tell them.
+    '''
+
+    def __init__(
+            self,
+            bucket: str,
+            key: str,
+            *,
+            s3_client,
+            should_retry,
+            block_size: int = DEFAULT_BLOCK_SIZE,
+            block_capacity: int = DEFAULT_BLOCK_CAPACITY,
+            block_forward: Optional[int] = None,
+            max_retries: int = 10,
+            content_size: Optional[int] = None,
+            content_etag: Optional[str] = None):
+
+        if block_forward is None:
+            block_forward = block_capacity - 1
+
+        assert block_capacity > block_forward, 'block_capacity should greater than block_forward, got: block_capacity=%s, block_forward=%s' % (
+            block_capacity, block_forward)
+
+        self._bucket = bucket
+        self._key = key
+        self._client = s3_client
+        self._should_retry = should_retry
+        self._max_retries = max_retries
+
+        self._block_size = block_size
+        self._block_capacity = block_capacity
+        self._block_forward = block_forward
+        self._content_size = content_size
+        self._content_etag = content_etag  # Learned from the first response if None
+
+        self._offset = 0
+        self._backoff_size = BACKOFF_INITIAL
+        self._tasks = OrderedDict(
+        )  # block index -> asyncio.Task of block content
+        self._opened = False
+        self._closed = False
+
+    @property
+    def name(self) -> str:
+        return 's3://%s/%s' % (self._bucket, self._key)
+
+    @property
+    def mode(self) -> str:
+        return 'rb'
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    @property
+    def _block_stop(self) -> int:
+        return ceil(self._content_size / self._block_size)
+
+    def tell(self) -> int:
+        return self._offset
+
+    async def __aenter__(self) -> 'AsyncS3PrefetchReader':
+        return await self.open()
+
+    async def __aexit__(self, type, value, traceback):
+        await self.close()
+
+    async def open(self) -> 'AsyncS3PrefetchReader':
+        '''Learn file size and etag, and start prefetching from the beginning of file'''
+        if self._closed:
+            raise IOError('file already closed: %r' % self.name)
+        if self._opened:
+            return self
+        if self._content_size is None:
+            await self._fetch_first_block()
+        self._opened = True
+        self._submit_tasks(0)
+
+        _logger.debug('open file: %r, mode: %s' % (self.name, self.mode))
+        return self
+
+    async def _fetch_first_block(self):
+        '''Download the first block, and learn file size and etag from its response instead of HEAD'''
+
+        async def fetch_block():
+            try:
+                return await self._download_block(
+                    'bytes=0-%d' % (self._block_size - 1))
+            except ClientError as error:
+                if client_error_code(error) in ('416', 'InvalidRange'):
+                    return None, b''  # Empty file
+                raise
+
+        fetch_block = patch_async_method(
+            fetch_block,
+            max_retries=self._max_retries,
+            should_retry=self._should_retry)
+
+        with raise_s3_error(self.name):
+            data, block = await fetch_block()
+
+            # Content-Range of response is like 'bytes 0-1023/4096'
+            content_range = data.get('ContentRange') if data else None
+            if content_range and self._content_etag is not None:
+                self._content_size = int(content_range.rsplit('/', 1)[-1])
+            else:
+                data = await self._client.head_object(
+                    Bucket=self._bucket, Key=self._key)
+                self._content_size = data['ContentLength']
+                self._content_etag = data['ETag']
+
+        future = asyncio.get_event_loop().create_future()
+        future.set_result(block)
+        self._tasks[0] = future
+
+    def _check_etag(self, data: dict):
+        etag = data.get('ETag', None)
+        if etag is None:
+            return
+        if self._content_etag is None:
+            self._content_etag = etag
+        elif etag != self._content_etag:
+            raise S3FileChangedError(
+                'File changed: %r, etag before: %s, after: %s' %
+                (self.name, self._content_etag, etag))
+
+    async def _download_block(self, range_str: str):
+        '''Download range, return the response and the content'''
+        data = await self._client.get_object(
+            Bucket=self._bucket, Key=self._key, Range=range_str)
+        self._check_etag(data)
+        body = data['Body']
+        try:
+            return data, await body.read()
+        finally:
+            body.close()
+
+    async def _fetch_block(self, index: int) -> bytes:
+        range_str = 'bytes=%d-%d' % (
+            index * self._block_size, (index + 1) * self._block_size - 1)
+
+        async def fetch_block() -> bytes:
+            return (await self._download_block(range_str))[1]
+
+        fetch_block = patch_async_method(
+            fetch_block,
+            max_retries=self._max_retries,
+            should_retry=self._should_retry)
+
+        with raise_s3_error(self.name):
+            return await fetch_block()
+
+    def _submit_tasks(self, index: int):
+        '''Prefetch block_forward blocks after index, and mark block of index as the most recently used'''
+        stop = min(index + self._block_forward + 1, self._block_stop)
+        for block_index in range(index + 1, stop):
+            if block_index in self._tasks:
+                self._tasks.move_to_end(block_index)
+            else:
+                self._tasks[block_index] = asyncio.ensure_future(
+                    self._fetch_block(block_index))
+        if index in self._tasks:
+            self._tasks.move_to_end(index)
+        elif index < self._block_stop:
+            self._tasks[index] = asyncio.ensure_future(self._fetch_block(index))
+        self._cleanup_tasks(self._block_capacity)
+
+    def _cleanup_tasks(self, block_capacity: int):
+        while len(self._tasks) > block_capacity:
+            _, task = self._tasks.popitem(last=False)
+            if not task.done():
+                task.cancel()
+            elif not task.cancelled():
+                task.exception()  # Error of evicted prefetch is not raised
+
+    async def _get_block(self, index: int) -> bytes:
+        self._submit_tasks(index)
+        return await self._tasks[index]
+
+    def _set_offset(self, value: int):
+        if value > self._backoff_size:
+            _logger.debug(
+                'reading file: %r, current offset / total size: %s / %s' % (
+                    self.name, get_human_size(value),
+                    get_human_size(self._content_size)))
+        while value > self._backoff_size:
+            self._backoff_size *= BACKOFF_FACTOR
+        self._offset = value
+
+    async def seek(self, cookie: int, whence: int = os.SEEK_SET) -> int:
+        await self.open()
+        if whence == os.SEEK_SET:
+            target = cookie
+        elif whence == os.SEEK_CUR:
+            target = self._offset + cookie
+        elif whence == os.SEEK_END:
+            target = self._content_size + cookie
+        else:
+            raise ValueError('invalid whence: %r' % whence)
+        self._set_offset(target)
+        if target < self._content_size:
+            self._submit_tasks(target // self._block_size)
+        return self._offset
+
+    async def read(self, size: Optional[int] = None) -> bytes:
+        await self.open()
+        if size is None or size < 0:
+            stop = self._content_size
+        else:
+            stop = min(self._offset + size, self._content_size)
+
+        chunks = []
+        offset = self._offset
+        while offset < stop:
+            index = offset // self._block_size
+            block = await self._get_block(index)
+            start = offset - index * self._block_size
+            chunk = memoryview(block)[start:stop - index * self._block_size]
+            if len(chunk) == 0:  # File is shorter than expected
+                break
+            chunks.append(chunk)
+            offset += len(chunk)
+        self._set_offset(offset)
+        return b''.join(chunks)
+
+    async def readline(self, size: Optional[int] = None) -> bytes:
+        await self.open()
+        if size is None or size < 0:
+            stop = self._content_size
+        else:
+            stop = min(self._offset + size, self._content_size)
+
+        chunks = []
+        offset = self._offset
+        while offset < stop:
+            index = offset // self._block_size
+            block = await self._get_block(index)
+            start = offset - index * self._block_size
+            end = min(stop - index * self._block_size, len(block))
+            if end <= start:  # File is shorter than expected
+                break
+            newline = block.find(NEWLINE, start, end)
+            if newline >= 0:
+                end = newline + 1
+            chunk = memoryview(block)[start:end]
+            chunks.append(chunk)
+            offset += len(chunk)
+            if newline >= 0:
+                break
+        self._set_offset(offset)
+        return b''.join(chunks)
+
+    async def close(self):
+        if self._closed:
+            return
+        _logger.debug('close file: %r' % self.name)
+        self._closed = True
+        self._cleanup_tasks(0)
@@ -0,0 +1,136 @@
+import fcntl
+import hashlib
+import mmap
+import os
+from logging import getLogger as get_logger
+from typing import Optional
+
+from megfile.utils import process_local
+
+DEFAULT_BLOCK_CACHE_SIZE = 16 * 2**30  # 16GB
+EVICT_WATERMARK = 0.9
+
+BLOCK_SUFFIX = '.block'
+LOCK_NAME = '.lock'
+
+_logger = get_logger(__name__)
+
+
+class FileBlockCache:
+    '''
+    Block cache stored as files in a directory, e.g. a NVMe disk or tmpfs, which is shared by all readers and processes using the same directory.
+
+    Blocks are keyed by (bucket, key, etag, byte range), so a changed object never hits stale blocks, and readers of different block sizes never hit blocks of each other.
+    Total size of blocks is bounded by max_cache_size, the least recently used blocks are evicted first, until total size is below 90% of max_cache_size.
+    Eviction is protected by a file lock, so it's safe for multiple processes to share one cache directory.
+    '''
+
+    def __init__(
+            self, cache_dir: str,
+            max_cache_size: int = DEFAULT_BLOCK_CACHE_SIZE):
+        os.makedirs(cache_dir, exist_ok=True)
+        self._cache_dir = cache_dir
+        self._max_cache_size = max_cache_size
+        self._lock_path = os.path.join(cache_dir, LOCK_NAME)
+        # Total size of blocks is scanned only when this estimate exceeds max_cache_size
+        self._cached_size = None
+
+    @property
+    def cache_dir(self) -> str:
+        return self._cache_dir
+
+    @property
+    def max_cache_size(self) -> int:
+        return self._max_cache_size
+
+    def _block_path(
+            self, bucket: str, key: str, etag: str, offset: int,
+            size: int) -> str:
+        digest = hashlib.sha1(
+            ('%s/%s/%s/%d-%d' %
+             (bucket, key, etag, offset, offset + size)).encode()).hexdigest()
+        return os.path.join(self._cache_dir, digest + BLOCK_SUFFIX)
+
+    def get(self, bucket: str, key: str, etag: str, offset: int,
+            size: int) -> Optional[mmap.mmap]:
+        '''Return cached block of size bytes from offset as a read-only mmap, or None if block is not cached'''
+        path = self._block_path(bucket, key, etag, offset, size)
+        try:
+            with open(path, 'rb') as fileobj:
+                if size == 0 or os.fstat(fileobj.fileno()).st_size != size:
+                    return None
+                block = mmap.mmap(
+                    fileobj.fileno(), size, access=mmap.ACCESS_READ)
+            os.utime(path)  # mark as recently used
+        except FileNotFoundError:  # not cached, or evicted by other process
+            return None
+        return block
+
+    def put(self, bucket: str, key: str, etag: str, offset: int, data) -> bool:
+        '''Cache block of data from offset, return False if block is not cached, e.g. block is too large or disk is full'''
+        data = memoryview(data)
+        if data.nbytes > self._max_cache_size:
+            return False
+        path = self._block_path(bucket, key, etag, offset, data.nbytes)
+        temp_path = '%s.%d.tmp' % (path, os.getpid())
+        try:
+            with open(temp_path, 'wb') as fileobj:
+                fileobj.write(data)
+            os.replace(temp_path, path)  # readers never see partial blocks
+        except OSError as error:
+            _logger.debug(
+                'failed to cache block: %r, error: %s' % (path, error))
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            return False
+
+        if self._cached_size is None:
+            self.evict()
+        else:
+            self._cached_size += data.nbytes
+            if self._cached_size > self._max_cache_size:
+                self.evict(int(self._max_cache_size * EVICT_WATERMARK))
+        return True
+
+    def evict(self, max_cache_size: Optional[int] = None):
+        '''Remove the least recently used blocks until total size is below max_cache_size'''
+        if max_cache_size is None:
+            max_cache_size = self._max_cache_size
+        with open(self._lock_path, 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            entries = []
+            total_size = 0
+            for entry in os.scandir(self._cache_dir):
+                if not entry.name.endswith(BLOCK_SUFFIX):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total_size += stat.st_size
+            entries.sort()
+            for _, size, path in entries:
+                if total_size <= max_cache_size:
+                    break
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+                total_size -= size
+            self._cached_size = total_size
+            _logger.debug(
+                'block cache: %r, cached size: %d' %
+                (self._cache_dir, total_size))
+
+    def clear(self):
+        self.evict(0)
+
+
+def get_file_block_cache(
+        cache_dir: str,
+        max_cache_size: int = DEFAULT_BLOCK_CACHE_SIZE) -> FileBlockCache:
+    '''Get FileBlockCache of cache_dir, which is shared by all readers in process'''
+    return process_local(
+        'FileBlockCache.%s.%d' % (cache_dir, max_cache_size), FileBlockCache,
+        cache_dir, max_cache_size)
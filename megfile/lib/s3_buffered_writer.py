@@ -1,23 +1,54 @@
 from collections import OrderedDict
-from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
-from io import BytesIO
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from functools import partial
 from logging import getLogger as get_logger
+from math import ceil
 from threading import Lock
-from typing import NamedTuple, Optional
+from time import monotonic
+from typing import BinaryIO, Dict, List, NamedTuple, Optional, Tuple
 
-from megfile.errors import raise_s3_error
+from botocore.exceptions import ClientError
+
+from megfile.errors import client_error_code, raise_s3_error
 from megfile.interfaces import Writable
+from megfile.lib.chunk_buffer import ChunkBuffer
+from megfile.lib.s3_metadata_cache import invalidate_metadata
+from megfile.lib.s3_metrics import WRITER_STALL_SECONDS, get_metrics
+from megfile.lib.s3_upload_journal import UploadJournal
+from megfile.lib.transfer_engine import ByteBudget
 from megfile.utils import get_human_size, process_local
 
 DEFAULT_BLOCK_SIZE = 8 * 2**20  # 8MB
 DEFAULT_MAX_BLOCK_SIZE = DEFAULT_BLOCK_SIZE * 16  # 128MB
 DEFAULT_MAX_BUFFER_SIZE = DEFAULT_BLOCK_SIZE * 16  # 128MB
 GLOBAL_MAX_WORKERS = 128
+MAX_PARTS = 10000  # Max number of parts of s3 multipart upload
+MAX_PART_SIZE = 5 * 2**30  # 5GB, max size of s3 part
+# Part size is doubled every PART_SIZE_GROWTH_INTERVAL parts, so 10000 parts of 8MB block_size can hold 8TB, more than max object size (5TB)
+PART_SIZE_GROWTH_INTERVAL = 1000
 
 BACKOFF_INITIAL = 64 * 2**20  # 64MB
 BACKOFF_FACTOR = 4
 
 _logger = get_logger(__name__)
+_global_buffer_size = None  # type: Optional[int]
+
+
+def set_global_buffer_size(max_bytes: Optional[int]):
+    '''Share a buffer budget of max_bytes by all writers in process opened after, None to disable it'''
+    global _global_buffer_size
+    _global_buffer_size = max_bytes
+
+
+def get_global_buffer_budget() -> Optional[ByteBudget]:
+    '''Get buffer budget shared by writers in process, None if it's disabled'''
+    if _global_buffer_size is None:
+        return None
+    return process_local(
+        'S3BufferedWriter.budget.%d' % _global_buffer_size, ByteBudget,
+        _global_buffer_size)
+
+
 '''
 class PartResult(NamedTuple):
 
@@ -42,6 +73,22 @@ class PartResult(_PartResult):
 
 
 class S3BufferedWriter(Writable):
+    '''
+    Writer of s3 object, content is uploaded by parts in background threads when it is large enough.
+
+    If journal_path (local path or s3 url) is given, the multipart upload is resumable: upload id and uploaded parts are recorded in the journal,
+    and a writer of the same object and journal_path, created after the former writer failed (e.g. process died), continues the upload.
+    The resumed writer checks recorded parts by list_parts, and keeps the uploaded parts from the beginning (committed parts).
+    Content of committed parts is discarded when it is written again, or call skip_committed() to continue writing after them.
+    The journal is removed after upload is completed.
+
+    Parts are block_size large for small files, and grow geometrically as part number increases (see PART_SIZE_GROWTH_INTERVAL),
+    so that a large stream of unknown size is uploaded in fewer, larger parts within 10000 parts.
+    If size_hint (expected file size) is given, block_size is increased if it's too small to upload size_hint bytes in 10000 parts.
+
+    Memory of parts being uploaded is bounded by max_buffer_size, and by the global buffer budget shared by all writers if it's set (see set_global_buffer_size),
+    write() blocks until enough bytes of uploading parts are released, a part larger than a budget takes the whole budget.
+    '''
 
     def __init__(
             self,
@@ -52,7 +99,16 @@ class S3BufferedWriter(Writable):
             block_size: int = DEFAULT_BLOCK_SIZE,
             max_block_size: int = DEFAULT_MAX_BLOCK_SIZE,
             max_buffer_size: int = DEFAULT_MAX_BUFFER_SIZE,
-            max_workers: Optional[int] = None):
+            max_workers: Optional[int] = None,
+            metadata: Optional[Dict[str, str]] = None,
+            journal_path: Optional[str] = None,
+            size_hint: Optional[int] = None):
+
+        if size_hint is not None:
+            # Parts are large enough to upload size_hint bytes in MAX_PARTS parts without growing
+            block_size = min(
+                max(block_size, ceil(size_hint / MAX_PARTS)), MAX_PART_SIZE)
+            max_block_size = max(max_block_size, block_size)
 
         self._bucket = bucket
         self._key = key
@@ -61,11 +117,15 @@ class S3BufferedWriter(Writable):
         self._block_size = block_size
         self._max_block_size = max_block_size
         self._max_buffer_size = max_buffer_size
-        self._total_buffer_size = 0
+        self._total_buffer_size = 0  # Size of all submitted parts
+        self._buffer_size = 0  # Size of parts being uploaded
+        self._buffer_size_lock = Lock()
+        self._budget = ByteBudget(max_buffer_size)
+        self._global_budget = get_global_buffer_budget()
         self._offset = 0
         self.__content_size = 0
         self._backoff_size = BACKOFF_INITIAL
-        self._buffer = BytesIO()
+        self._buffer = ChunkBuffer()
 
         self._futures = OrderedDict()
         self._is_global_executor = False
@@ -82,8 +142,110 @@ class S3BufferedWriter(Writable):
         self.__upload_id = None
         self.__upload_id_lock = Lock()
 
+        self._metadata = metadata or {}
+        self._journal = None
+        self._committed_size = 0
+        self._skip_size = 0
+        if journal_path is not None:
+            self._journal = UploadJournal(journal_path, s3_client)
+            self._resume()
+
         _logger.debug('open file: %r, mode: %s' % (self.name, self.mode))
 
+    def _list_parts(self, upload_id: str) -> Dict[int, str]:
+        parts, marker = {}, 0
+        while True:
+            resp = self._client.list_parts(
+                Bucket=self._bucket,
+                Key=self._key,
+                UploadId=upload_id,
+                PartNumberMarker=marker)
+            for part in resp.get('Parts', []):
+                parts[part['PartNumber']] = part['ETag']
+            if not resp.get('IsTruncated'):
+                return parts
+            marker = resp['NextPartNumberMarker']
+
+    def _abort_stale_upload(self, upload: dict):
+        '''Abort upload of journal which can't be resumed, otherwise its parts are kept (and charged) forever'''
+        try:
+            self._client.abort_multipart_upload(
+                Bucket=upload['bucket'],
+                Key=upload['key'],
+                UploadId=upload['upload_id'])
+        except Exception as error:
+            _logger.warning(
+                'failed to abort stale upload in journal: %r, upload id: %s, error: %r'
+                % (self._journal.path, upload.get('upload_id'), error))
+
+    def _resume(self):
+        upload, journal_parts = self._journal.load()
+        if upload is None:
+            return
+        if upload.get('bucket') != self._bucket or upload.get(
+                'key') != self._key or upload.get('metadata',
+                                                  {}) != self._metadata:
+            _logger.info(
+                'upload in journal is changed: %r, upload id: %s' %
+                (self._journal.path, upload.get('upload_id')))
+            self._abort_stale_upload(upload)
+            return
+        upload_id = upload['upload_id']
+        try:
+            with raise_s3_error(self.name):
+                uploaded_parts = self._list_parts(upload_id)
+        except Exception as error:
+            if isinstance(error.__cause__, ClientError) and client_error_code(
+                    error.__cause__) == 'NoSuchUpload':
+                _logger.info(
+                    'upload in journal not found: %r, upload id: %s' %
+                    (self._journal.path, upload_id))
+                return
+            raise
+
+        # Keep parts uploaded continuously from the beginning
+        committed_parts = []
+        while True:
+            part = journal_parts.get(self._part_number + 1)
+            if part is None or part['offset'] != self._committed_size or \
+                    uploaded_parts.get(part['part_number']) != part['etag']:
+                break
+            future = Future()
+            future.set_result(
+                PartResult(part['etag'], part['part_number'], part['size']))
+            self._futures[part['part_number']] = future
+            committed_parts.append(part)
+            self._part_number += 1
+            self._committed_size += part['size']
+
+        self.__upload_id = upload_id
+        self._total_buffer_size = self._committed_size
+        self._skip_size = self._committed_size
+        self._journal.resume(upload, committed_parts)
+        _logger.info(
+            'resume upload: %r, upload id: %s, committed parts: %d, size: %s' %
+            (
+                self.name, upload_id, self._part_number,
+                get_human_size(self._committed_size)))
+
+    @property
+    def committed_size(self) -> int:
+        '''Size of committed parts, which are uploaded before the writer is resumed'''
+        return self._committed_size
+
+    def skip_committed(self) -> int:
+        '''
+        Continue writing after committed parts, instead of writing them again, must be called before any write
+
+        :returns: Offset to continue writing from
+        '''
+        if self._offset != 0:
+            raise IOError('file already written: %r' % self.name)
+        self._skip_size = 0
+        self._offset = self._committed_size
+        self._content_size = self._offset
+        return self._offset
+
     @property
     def name(self) -> str:
         return 's3://%s/%s' % (self._bucket, self._key)
@@ -113,6 +275,12 @@ class S3BufferedWriter(Writable):
     def _is_multipart(self) -> bool:
         return len(self._futures) > 0
 
+    @property
+    def _extra_args(self) -> dict:
+        if not self._metadata:
+            return {}
+        return {'Metadata': self._metadata}
+
     @property
     def _upload_id(self) -> str:
         with self.__upload_id_lock:
@@ -121,16 +289,18 @@ class S3BufferedWriter(Writable):
                     self.__upload_id = self._client.create_multipart_upload(
                         Bucket=self._bucket,
                         Key=self._key,
+                        **self._extra_args,
                     )['UploadId']
+                    if self._journal is not None:
+                        self._journal.start(
+                            {
+                                'bucket': self._bucket,
+                                'key': self._key,
+                                'upload_id': self.__upload_id,
+                                'metadata': self._metadata,
+                            })
             return self.__upload_id
 
-    @property
-    def _buffer_size(self):
-        return self._total_buffer_size - sum(
-            future.result().content_size
-            for future in self._futures.values()
-            if future.done())
-
     @property
     def _uploading_futures(self):
         return [
@@ -157,39 +327,114 @@ class S3BufferedWriter(Writable):
                     Body=content,
                 )['ETag'], part_number, len(content))
 
+    def _upload_journaled_buffer(self, part_number, offset, content):
+        result = self._upload_buffer(part_number, content)
+        with raise_s3_error(self._journal.path):
+            self._journal.add_part(
+                part_number, offset, result.content_size, result.etag)
+        return result
+
+    def _acquire_buffer(self, size: int) -> List[Tuple[ByteBudget, int]]:
+        '''Acquire size bytes from budgets of writer and process, block until they are available, return the acquired budgets and sizes'''
+        acquired = []
+        start_time = None
+        for budget in (self._budget, self._global_budget):
+            if budget is None:
+                continue
+            acquired_size = budget.try_acquire(size)
+            if acquired_size is None:
+                if start_time is None:
+                    start_time = monotonic()
+                acquired_size = budget.acquire(size)
+            acquired.append((budget, acquired_size))
+        if start_time is not None:
+            metrics = get_metrics()
+            if metrics is not None:
+                metrics.observe(
+                    WRITER_STALL_SECONDS,
+                    monotonic() - start_time,
+                    bucket=self._bucket)
+        return acquired
+
+    def _release_buffer(
+            self, acquired: List[Tuple[ByteBudget, int]], size: int,
+            future: Future):
+        with self._buffer_size_lock:
+            self._buffer_size -= size
+        for budget, acquired_size in acquired:
+            budget.release(acquired_size)
+
     def _submit_upload_buffer(self, part_number, content):
-        self._futures[part_number] = self._executor.submit(
-            self._upload_buffer, part_number, content)
+        acquired = self._acquire_buffer(len(content))
+        with self._buffer_size_lock:
+            self._buffer_size += len(content)
+        if self._journal is None:
+            self._futures[part_number] = self._executor.submit(
+                self._upload_buffer, part_number, content)
+        else:
+            # Parts are submitted in order, offset of part is size of submitted content
+            self._futures[part_number] = self._executor.submit(
+                self._upload_journaled_buffer, part_number,
+                self._total_buffer_size, content)
         self._total_buffer_size += len(content)
-        while self._buffer_size > self._max_buffer_size:
-            wait(self._uploading_futures, return_when=FIRST_COMPLETED)
+        # Budgets are released as soon as the part is uploaded (or failed)
+        self._futures[part_number].add_done_callback(
+            partial(self._release_buffer, acquired, len(content)))
+
+    def _get_block_size(self, part_number: int) -> int:
+        '''Size of part of part_number, which is doubled every PART_SIZE_GROWTH_INTERVAL parts'''
+        growth = (part_number - 1) // PART_SIZE_GROWTH_INTERVAL
+        return min(self._block_size << growth, MAX_PART_SIZE)
+
+    @property
+    def _next_block_size(self) -> int:
+        return self._get_block_size(self._part_number + 1)
 
-    def _submit_upload_content(self, content: bytes):
+    def _submit_part(self, size: int):
+        self._part_number += 1
+        if self._part_number > MAX_PARTS:
+            raise IOError(
+                'too many parts: %r, s3 supports at most %d parts' %
+                (self.name, MAX_PARTS))
+        self._submit_upload_buffer(
+            self._part_number, self._buffer.read_part(size))
+
+    def _submit_upload_content(self, size: int):
+        '''Take size bytes out of buffer, and upload them by parts, every part is copied from buffer once'''
         # s3 part needs at least 5MB, so we need to divide content into equal-size parts, and give last part more size
         # e.g. 257MB can be divided into 2 parts, 128MB and 129MB
-        offset = 0
-        while len(content) - offset - self._max_block_size > self._block_size:
-            self._part_number += 1
-            offset_stop = offset + self._max_block_size
-            self._submit_upload_buffer(
-                self._part_number, content[offset:offset_stop])
-            offset = offset_stop
-        self._part_number += 1
-        self._submit_upload_buffer(self._part_number, content[offset:])
+        while True:
+            block_size = self._next_block_size
+            max_block_size = min(
+                max(self._max_block_size, block_size), MAX_PART_SIZE)
+            if size - max_block_size <= block_size:
+                break
+            self._submit_part(max_block_size)
+            size -= max_block_size
+        self._submit_part(size)
 
     def _submit_futures(self):
-        content = self._buffer.getvalue()
-        if len(content) == 0:
+        if len(self._buffer) == 0:
             return
-        self._buffer = BytesIO()
-        self._submit_upload_content(content)
+        self._submit_upload_content(len(self._buffer))
+
+    def _skip(self, data: bytes) -> int:
+        size = min(self._skip_size, len(data))
+        self._skip_size -= size
+        self._offset += size
+        self._content_size = self._offset
+        if size < len(data):
+            self.write(data[size:])
+        return len(data)
 
     def write(self, data: bytes) -> int:
         if self.closed:
             raise IOError('file already closed: %r' % self.name)
+        if self._skip_size > 0:
+            return self._skip(data)
 
         result = self._buffer.write(data)
-        if self._buffer.tell() >= self._block_size:
+        if self._buffer.tell() >= self._next_block_size:
             self._submit_futures()
         self._offset += result
         self._content_size = self._offset
@@ -199,15 +444,65 @@ class S3BufferedWriter(Writable):
         if not self._is_global_executor:
             self._executor.shutdown()
 
+    def __exit__(self, type, value, traceback):
+        if type is not None and self._journal is not None and \
+                not self.closed:
+            # Keep uploaded parts and journal to be resumed, instead of completing upload with partial content
+            wait(self._uploading_futures)
+            self._shutdown()
+            self._flush_journal()
+            setattr(self, '__closed__', True)
+            return
+        self.close()
+
+    def abort(self):
+        '''Close the writer without uploading content, multipart upload is aborted, unless it's resumable'''
+        if self.closed:
+            return
+        wait(self._uploading_futures)
+        self._shutdown()
+        setattr(self, '__closed__', True)
+        if self._journal is not None:
+            self._flush_journal()
+        elif self._is_multipart:
+            with raise_s3_error(self.name):
+                self._client.abort_multipart_upload(
+                    Bucket=self._bucket,
+                    Key=self._key,
+                    UploadId=self._upload_id)
+
+    def _flush_journal(self):
+        try:
+            self._journal.flush()
+        except Exception as error:
+            # Parts not in journal are uploaded again when resumed
+            _logger.warning(
+                'failed to save upload journal: %r, error: %r' %
+                (self._journal.path, error))
+
+    def _remove_journal(self):
+        if self._journal is not None:
+            with raise_s3_error(self._journal.path):
+                self._journal.remove()
+
     def _close(self):
         _logger.debug('close file: %r' % self.name)
 
+        if self._skip_size > 0:
+            self._shutdown()
+            raise IOError(
+                'content is shorter than committed parts: %r, %d bytes missing'
+                % (self.name, self._skip_size))
+
         if not self._is_multipart:
             with raise_s3_error(self.name):
                 self._client.put_object(
                     Bucket=self._bucket,
                     Key=self._key,
-                    Body=self._buffer.getvalue())
+                    Body=self._buffer.getvalue(),
+                    **self._extra_args)
+            invalidate_metadata(self.name)
+            self._remove_journal()
             self._shutdown()
             return
 
@@ -220,5 +515,35 @@ class S3BufferedWriter(Writable):
                 MultipartUpload=self._multipart_upload,
                 UploadId=self._upload_id,
             )
+        invalidate_metadata(self.name)
+        self._remove_journal()
 
         self._shutdown()
+
+
+def upload_fileobj(
+        fileobj: BinaryIO,
+        bucket: str,
+        key: str,
+        *,
+        s3_client,
+        block_size: int = DEFAULT_BLOCK_SIZE) -> int:
+    '''
+    Upload content of fileobj from its current position to s3 object by S3BufferedWriter, fileobj is not closed
+
+    Unlike upload_fileobj of boto3, no transfer manager or threads are set up for small content:
+    content not larger than block_size is uploaded by a single put_object, and it's promoted to multipart upload once more is read.
+    If reading fileobj fails, nothing is uploaded.
+
+    :returns: Size of uploaded content
+    '''
+    writer = S3BufferedWriter(
+        bucket, key, s3_client=s3_client, block_size=block_size)
+    try:
+        for data in iter(lambda: fileobj.read(block_size), b''):
+            writer.write(data)
+    except Exception:
+        writer.abort()
+        raise
+    writer.close()
+    return writer.tell()
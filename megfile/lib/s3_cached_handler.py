@@ -4,6 +4,7 @@ from typing import Iterable, List, Optional
 
 from megfile.errors import S3ConfigError, UnknownError, raise_s3_error, translate_fs_error, translate_s3_error
 from megfile.interfaces import Readable, Seekable, Writable
+from megfile.lib.s3_buffered_writer import upload_fileobj
 
 
 class S3CachedHandler(Readable, Seekable, Writable):
@@ -120,7 +121,8 @@ class S3CachedHandler(Readable, Seekable, Writable):
         # directly upload from file handle
         self.seek(0, os.SEEK_SET)
         with raise_s3_error(self.name):
-            self._client.upload_fileobj(self._fileobj, self._bucket, self._key)
+            upload_fileobj(
+                self._fileobj, self._bucket, self._key, s3_client=self._client)
 
     def _close(self, need_upload: bool = True):
         if need_upload:
@@ -0,0 +1,137 @@
+import logging
+from threading import Lock
+from typing import Any, Callable, Dict, Hashable, Iterator, Optional, Tuple
+
+from megfile.utils import process_local
+
+# urllib3 warns with this message when a connection is returned to a full pool, and the connection is closed
+DISCARD_MESSAGE = 'Connection pool is full, discarding connection'
+
+_logger = logging.getLogger(__name__)
+
+
+class _DiscardCounter(logging.Filter):
+    '''
+    Count connections discarded by urllib3 pools of all clients, by host
+
+    urllib3 doesn't count them, so they are counted by the warning it logs, as a filter of logger urllib3.connectionpool.
+    A filter only sees records which are logged, nothing is counted if level of the logger is raised above WARNING, e.g. to silence the warning.
+    '''
+
+    def __init__(self):
+        super().__init__()
+        self._lock = Lock()
+        self.discards = {}  # type: Dict[str, int]
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if isinstance(record.msg,
+                      str) and record.msg.startswith(DISCARD_MESSAGE):
+            host = str(record.args[0]) if record.args else ''
+            with self._lock:
+                self.discards[host] = self.discards.get(host, 0) + 1
+        return True
+
+
+_discard_counter = _DiscardCounter()
+logging.getLogger('urllib3.connectionpool').addFilter(_discard_counter)
+
+
+class S3PoolStats:
+    '''
+    Connection pool statistics of clients in S3ClientRegistry.
+    Requests served by a pooled connection are hits, other requests open new connections, connections returned to a full pool are discarded.
+    '''
+
+    def __init__(self):
+        self.clients = 0
+        self.pools = 0
+        self.requests = 0
+        self.new_connections = 0
+        self.discarded_connections = 0
+
+    @property
+    def hits(self) -> int:
+        return max(self.requests - self.new_connections, 0)
+
+    def __repr__(self) -> str:
+        return '%s(clients=%d, pools=%d, requests=%d, hits=%d, new_connections=%d, discarded_connections=%d)' % (
+            type(self).__name__, self.clients, self.pools, self.requests,
+            self.hits, self.new_connections, self.discarded_connections)
+
+
+def config_key(config) -> Optional[Tuple[Tuple[str, str], ...]]:
+    '''Hashable key of botocore Config, configs of the same options have the same key'''
+    if config is None:
+        return None
+    options = getattr(config, '_user_provided_options', None)
+    if options is None:
+        return (('id', str(id(config))),)
+    return tuple(sorted((name, repr(value)) for name, value in options.items()))
+
+
+def _iter_pools(client) -> Iterator[Any]:
+    '''urllib3 connection pools of a botocore client'''
+    http_session = getattr(
+        getattr(client, '_endpoint', None), 'http_session', None)
+    managers = [getattr(http_session, '_manager', None)]
+    managers.extend(getattr(http_session, '_proxy_managers', {}).values())
+    for manager in managers:
+        pools = getattr(manager, 'pools', None)
+        if pools is None:
+            continue
+        for pool_key in pools.keys():
+            pool = pools.get(pool_key)
+            if pool is not None:
+                yield pool
+
+
+class S3ClientRegistry:
+    '''
+    Clients shared by all threads in process, keyed by e.g. (endpoint_url, profile_name, config_key(config)).
+
+    botocore clients are thread-safe, sharing a client shares its connection pool, so connections are reused across threads instead of opened (and TLS handshaked) by every thread.
+    '''
+
+    def __init__(self):
+        self._lock = Lock()
+        self._clients = {}  # type: Dict[Hashable, Any]
+
+    def __len__(self) -> int:
+        return len(self._clients)
+
+    def get(self, key: Hashable, create: Callable[[], Any]) -> Any:
+        '''Get client of key, create it by create() if it's missing'''
+        client = self._clients.get(key)
+        if client is not None:
+            return client
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                _logger.debug('create s3 client: %r' % (key,))
+                client = create()
+                self._clients[key] = client
+            return client
+
+    def clear(self):
+        with self._lock:
+            self._clients.clear()
+
+    def stats(self) -> S3PoolStats:
+        stats = S3PoolStats()
+        with self._lock:
+            clients = list(self._clients.values())
+        stats.clients = len(clients)
+        for client in clients:
+            for pool in _iter_pools(client):
+                stats.pools += 1
+                stats.requests += getattr(pool, 'num_requests', 0)
+                stats.new_connections += getattr(pool, 'num_connections', 0)
+        with _discard_counter._lock:
+            stats.discarded_connections = sum(
+                _discard_counter.discards.values())
+        return stats
+
+
+def get_client_registry() -> S3ClientRegistry:
+    '''Get S3ClientRegistry of process, clients are not shared with forked processes'''
+    return process_local('S3ClientRegistry', S3ClientRegistry)
@@ -1,11 +1,12 @@
 import os
-from io import BytesIO
 from logging import getLogger as get_logger
 from typing import Optional
 
 from megfile.errors import raise_s3_error
 from megfile.interfaces import Seekable
+from megfile.lib.chunk_buffer import ChunkBuffer
 from megfile.lib.s3_buffered_writer import DEFAULT_BLOCK_SIZE, DEFAULT_MAX_BLOCK_SIZE, DEFAULT_MAX_BUFFER_SIZE, S3BufferedWriter
+from megfile.lib.s3_metadata_cache import invalidate_metadata
 
 _logger = get_logger(__name__)
 
@@ -29,7 +30,8 @@ class S3LimitedSeekableWriter(Seekable, S3BufferedWriter):
             tail_block_size: Optional[int] = None,
             max_block_size: int = DEFAULT_MAX_BLOCK_SIZE,
             max_buffer_size: int = DEFAULT_MAX_BUFFER_SIZE,
-            max_workers: Optional[int] = None):
+            max_workers: Optional[int] = None,
+            size_hint: Optional[int] = None):
 
         super().__init__(
             bucket,
@@ -38,19 +40,20 @@ class S3LimitedSeekableWriter(Seekable, S3BufferedWriter):
             block_size=block_size,
             max_block_size=max_block_size,
             max_buffer_size=max_buffer_size,
-            max_workers=max_workers)
+            max_workers=max_workers,
+            size_hint=size_hint)
 
         self._head_block_size = head_block_size or block_size
         self._tail_block_size = tail_block_size or block_size
-        self._head_buffer = BytesIO()
+        self._head_buffer = ChunkBuffer()
 
     @property
     def _head_size(self) -> int:
-        return len(self._head_buffer.getvalue())
+        return len(self._head_buffer)
 
     @property
     def _tail_size(self) -> int:
-        return len(self._buffer.getvalue())
+        return len(self._buffer)
 
     @property
     def _tail_offset(self) -> int:
@@ -118,20 +121,18 @@ class S3LimitedSeekableWriter(Seekable, S3BufferedWriter):
 
     def _write_to_tail(self, data: bytes):
         self._buffer.write(data)
-        if self._buffer.tell() >= self._block_size + self._tail_block_size:
+        if self._buffer.tell() >= self._next_block_size + self._tail_block_size:
             self._submit_futures()
         self._offset += len(data)
         if self._offset > self._content_size:
             self._content_size = self._offset
 
     def _submit_futures(self):
-        content = self._buffer.getvalue()
-        if len(content) == 0:
+        if len(self._buffer) == 0:
             return
-        offset = len(content) - self._tail_block_size
-        self._buffer = BytesIO(content[offset:])
+        # Keep the last tail_block_size bytes in buffer, to be seeked and written again
+        self._submit_upload_content(len(self._buffer) - self._tail_block_size)
         self._buffer.seek(0, os.SEEK_END)
-        self._submit_upload_content(content[:offset])
 
     def _close(self):
         _logger.debug('close file: %r' % self.name)
@@ -141,17 +142,17 @@ class S3LimitedSeekableWriter(Seekable, S3BufferedWriter):
                 self._client.put_object(
                     Bucket=self._bucket,
                     Key=self._key,
-                    Body=self._head_buffer.getvalue() + self._buffer.getvalue())
+                    Body=b''.join(
+                        self._head_buffer.chunks + self._buffer.chunks))
+            invalidate_metadata(self.name)
             self._shutdown()
             return
 
         self._submit_upload_buffer(1, self._head_buffer.getvalue())
-        self._head_buffer = BytesIO()  # clean memory
+        self._head_buffer = ChunkBuffer()  # clean memory
 
-        content = self._buffer.getvalue()
-        if len(content) > 0:
-            self._submit_upload_content(content)
-        self._buffer = BytesIO()  # clean memory
+        if len(self._buffer) > 0:
+            self._submit_upload_content(len(self._buffer))
 
         with raise_s3_error(self.name):
             self._client.complete_multipart_upload(
@@ -160,5 +161,6 @@ class S3LimitedSeekableWriter(Seekable, S3BufferedWriter):
                 MultipartUpload=self._multipart_upload,
                 UploadId=self._upload_id,
             )
+        invalidate_metadata(self.name)
 
         self._shutdown()
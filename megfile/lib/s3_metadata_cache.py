@@ -0,0 +1,187 @@
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic
+from typing import Any, Callable, Optional, Tuple
+
+from megfile.utils import process_local
+
+DEFAULT_METADATA_CACHE_TTL = 60  # seconds
+DEFAULT_METADATA_CACHE_SIZE = 100000
+DEFAULT_BUCKET_CACHE_TTL = 60  # seconds
+
+# Kinds of cached metadata
+HEAD = 'head'  # Response of head_object, None if there is no such file
+DIR = 'dir'  # Whether path is a directory
+BUCKET = 'bucket'  # Status of bucket, see BUCKET_OK / BUCKET_MISSING / BUCKET_DENIED
+
+BUCKET_OK = 'ok'
+BUCKET_MISSING = 'missing'
+BUCKET_DENIED = 'denied'  # Bucket exists but is not accessible
+
+_options = None  # type: Optional[Tuple[float, int]]
+_bucket_cache_ttl = DEFAULT_BUCKET_CACHE_TTL
+
+
+def _parse_s3_url(s3_url: str) -> Tuple[str, str]:
+    bucket, _, key = s3_url[len('s3://'):].partition('/')
+    return bucket, key
+
+
+def _dir_path(path: str) -> str:
+    # s3://bucket/dir and s3://bucket/dir/ are the same directory
+    return path.rstrip('/') if path != 's3://' else path
+
+
+class S3MetadataCache:
+    '''
+    Cache of s3 metadata in process, entries are keyed by (kind, path), e.g. (HEAD, 's3://bucket/key'), and expire after ttl seconds.
+
+    Negative results (no such file / directory / bucket) are cached as well, errors are never cached.
+    At most max_size entries are kept, the least recently used entry is evicted first.
+    Entries are invalidated by megfile when it writes or deletes paths, changes made by others are visible after ttl at most.
+    '''
+
+    def __init__(
+            self,
+            ttl: float = DEFAULT_METADATA_CACHE_TTL,
+            max_size: int = DEFAULT_METADATA_CACHE_SIZE):
+        self._ttl = ttl
+        self._max_size = max_size
+        self._lock = Lock()
+        self._entries = OrderedDict()
+        # Increased by every invalidation, so that a value loaded before an invalidation is not cached after it
+        self._generation = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _key(self, kind: str, path: str) -> Tuple[str, str]:
+        if kind == DIR:
+            path = _dir_path(path)
+        return kind, path
+
+    def get_or_load(self, kind: str, path: str, load: Callable[[], Any]) -> Any:
+        '''Get cached value of path, or load and cache it if it's missing or expired, error raised by load is not cached'''
+        key = self._key(kind, path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > monotonic():
+                self._entries.move_to_end(key)
+                return entry[1]
+            generation = self._generation
+        value = load()
+        with self._lock:
+            if generation == self._generation:
+                self._put(key, value)
+        return value
+
+    def _put(self, key: Tuple[str, str], value: Any):
+        self._entries[key] = (monotonic() + self._ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+
+    def set(self, kind: str, path: str, value: Any):
+        with self._lock:
+            self._put(self._key(kind, path), value)
+
+    def invalidate(self, path: str, recursive: bool = False):
+        '''
+        Invalidate entries of path and its parent directories, since a file written or deleted may change existence of them
+
+        :param recursive: If True, entries of all paths under path are invalidated as well, e.g. after a directory is removed
+        '''
+        bucket, key = _parse_s3_url(path)
+        paths = ['s3://%s/%s' % (bucket, key)]
+        parts = key.rstrip('/').split('/')
+        for index in range(len(parts)):
+            paths.append('s3://%s/%s' % (bucket, '/'.join(parts[:index])))
+        with self._lock:
+            self._generation += 1
+            for parent in paths:
+                self._entries.pop((HEAD, parent), None)
+                self._entries.pop((DIR, _dir_path(parent)), None)
+            if recursive:
+                prefix = _dir_path(paths[0]) + '/'
+                for cache_key in list(self._entries):
+                    if cache_key[0] != BUCKET and cache_key[1].startswith(
+                            prefix):
+                        del self._entries[cache_key]
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+
+def enable_metadata_cache(
+        ttl: float = DEFAULT_METADATA_CACHE_TTL,
+        max_size: int = DEFAULT_METADATA_CACHE_SIZE):
+    '''Enable metadata cache of process, entries cached before are cleared'''
+    global _options
+    _options = (ttl, max_size)
+    get_metadata_cache().clear()
+
+
+def disable_metadata_cache():
+    global _options
+    cache = get_metadata_cache()
+    if cache is not None:
+        cache.clear()
+    _options = None
+
+
+def get_metadata_cache() -> Optional[S3MetadataCache]:
+    '''Get metadata cache of process, None if it's not enabled, cache is not shared with forked processes'''
+    if _options is None:
+        return None
+    ttl, max_size = _options
+    return process_local(
+        'S3MetadataCache.%s.%d' % (ttl, max_size), S3MetadataCache, ttl,
+        max_size)
+
+
+def cached_metadata(kind: str, path: str, load: Callable[[], Any]) -> Any:
+    '''Get metadata of path from cache if it's enabled, else load it'''
+    cache = get_metadata_cache()
+    if cache is None:
+        return load()
+    return cache.get_or_load(kind, path, load)
+
+
+def set_bucket_cache_ttl(ttl: float):
+    '''Set ttl of bucket status cache, 0 to disable it, entries cached before are cleared'''
+    global _bucket_cache_ttl
+    cache = get_bucket_cache()
+    if cache is not None:
+        cache.clear()
+    _bucket_cache_ttl = ttl
+
+
+def get_bucket_cache() -> Optional[S3MetadataCache]:
+    '''
+    Get bucket status cache of process, None if it's disabled
+
+    Unlike metadata cache, bucket status cache is enabled by default, since buckets are rarely created or deleted,
+    it's shared by threads, and reset in forked processes.
+    '''
+    if _bucket_cache_ttl <= 0:
+        return None
+    return process_local(
+        'S3BucketCache.%s' % _bucket_cache_ttl, S3MetadataCache,
+        _bucket_cache_ttl, DEFAULT_METADATA_CACHE_SIZE)
+
+
+def cached_bucket_status(path: str, load: Callable[[], str]) -> str:
+    '''Get status of bucket of path from cache if it's enabled, else load it'''
+    cache = get_bucket_cache()
+    if cache is None:
+        return load()
+    return cache.get_or_load(BUCKET, 's3://%s' % _parse_s3_url(path)[0], load)
+
+
+def invalidate_metadata(path: str, recursive: bool = False):
+    '''Invalidate cached metadata of path if cache is enabled, see S3MetadataCache.invalidate'''
+    cache = get_metadata_cache()
+    if cache is not None:
+        cache.invalidate(path, recursive=recursive)
@@ -0,0 +1,335 @@
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from functools import wraps
+from threading import Lock
+from time import monotonic
+from typing import Callable, Dict, List, Optional, Tuple
+
+from botocore.exceptions import ClientError
+
+from megfile.errors import client_error_code
+
+DEFAULT_LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)  # seconds
+
+# Kinds of metrics
+COUNTER = 'counter'
+HISTOGRAM = 'histogram'
+
+# Metrics of requests, labeled by operation (e.g. GetObject) and bucket, errors are labeled by code as well
+REQUESTS = 's3_requests_total'  # Every attempt of a request is counted, including retries of botocore itself
+REQUEST_SECONDS = 's3_request_seconds'  # Latency of a request includes retries of botocore itself
+RECEIVED_BYTES = 's3_received_bytes_total'
+SENT_BYTES = 's3_sent_bytes_total'
+RETRIES = 's3_retries_total'
+ERRORS = 's3_errors_total'
+# Metrics of readers and writers, labeled by bucket
+READER_BLOCK_HITS = 's3_reader_block_hits_total'  # Block is downloaded when it's read
+READER_BLOCK_MISSES = 's3_reader_block_misses_total'  # Reader waits for block to be downloaded
+READER_WASTED_BLOCKS = 's3_reader_wasted_blocks_total'  # Prefetched block is evicted without being read
+READER_WASTED_BYTES = 's3_reader_wasted_bytes_total'
+WRITER_STALL_SECONDS = 's3_writer_stall_seconds'  # Writer waits for parts to be uploaded, since buffer is full
+
+# Keys in botocore request context
+_BUCKET_CONTEXT_KEY = 'megfile_bucket'
+_ATTEMPTS_CONTEXT_KEY = 'megfile_attempts'
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class MetricsSink(ABC):
+    '''Receiver of every recorded value, e.g. aggregates values in memory, or sends them to a statsd server'''
+
+    @abstractmethod
+    def record(self, kind: str, name: str, value: float, labels: Labels):
+        '''
+        :param kind: COUNTER or HISTOGRAM
+        :param name: Name of metric, e.g. s3_requests_total
+        :param value: Increment of counter, or observed value of histogram
+        :param labels: Sorted tuple of (label name, label value)
+        '''
+
+
+class Histogram:
+    '''Count of observed values in each bucket (upper bound, inclusive), and sum of them'''
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # The last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def __repr__(self) -> str:
+        return '%s(count=%d, sum=%.3f)' % (
+            type(self).__name__, self.count, self.sum)
+
+
+class MemorySink(MetricsSink):
+    '''Aggregate values in memory, counters are summed and values of histograms are counted in buckets, see snapshot()'''
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_LATENCY_BUCKETS):
+        self._buckets = buckets
+        self._lock = Lock()
+        self._counters = {}  # type: Dict[Tuple[str, Labels], float]
+        self._histograms = {}  # type: Dict[Tuple[str, Labels], Histogram]
+
+    def record(self, kind: str, name: str, value: float, labels: Labels):
+        key = (name, labels)
+        with self._lock:
+            if kind == COUNTER:
+                self._counters[key] = self._counters.get(key, 0) + value
+                return
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(self._buckets)
+            histogram.observe(value)
+
+    def snapshot(self) -> Dict[Tuple[str, Labels], object]:
+        '''
+        Copy of aggregated metrics, keyed by (name, labels), value of counter is a number, value of histogram is a Histogram
+
+        e.g. snapshot()[('s3_requests_total', (('bucket', 'bucket'), ('operation', 'GetObject')))]
+        '''
+        with self._lock:
+            result = dict(self._counters)
+            for key, histogram in self._histograms.items():
+                copied = Histogram(histogram.buckets)
+                copied.counts = list(histogram.counts)
+                copied.sum, copied.count = histogram.sum, histogram.count
+                result[key] = copied
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+
+def _escape_label_value(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels: Labels, extra: Labels = ()) -> str:
+    labels = labels + extra
+    if not labels:
+        return ''
+    return '{%s}' % ','.join(
+        '%s="%s"' % (name, _escape_label_value(value))
+        for name, value in labels)
+
+
+def _format_number(value: float) -> str:
+    if value == int(value):
+        return str(int(value))
+    return repr(value)
+
+
+class PrometheusSink(MemorySink):
+    '''Aggregate values in memory like MemorySink, and render them in Prometheus text exposition format, e.g. for a /metrics handler'''
+
+    def render(self) -> str:
+        lines = []  # type: List[str]
+        types = {}  # type: Dict[str, str]
+        for (name, labels), value in sorted(self.snapshot().items(),
+                                            key=lambda item: item[0]):
+            if isinstance(value, Histogram):
+                if name not in types:
+                    types[name] = HISTOGRAM
+                    lines.append('# TYPE %s histogram' % name)
+                cumulative = 0
+                for bound, count in zip(value.buckets + (float('inf'),),
+                                        value.counts):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else _format_number(
+                        bound)
+                    lines.append(
+                        '%s_bucket%s %d' % (
+                            name, _format_labels(labels,
+                                                 (('le', le),)), cumulative))
+                lines.append(
+                    '%s_sum%s %s' %
+                    (name, _format_labels(labels), _format_number(value.sum)))
+                lines.append(
+                    '%s_count%s %d' %
+                    (name, _format_labels(labels), value.count))
+            else:
+                if name not in types:
+                    types[name] = COUNTER
+                    lines.append('# TYPE %s counter' % name)
+                lines.append(
+                    '%s%s %s' %
+                    (name, _format_labels(labels), _format_number(value)))
+        return ''.join(line + '\n' for line in lines)
+
+
+class StatsdSink(MetricsSink):
+    '''
+    Send every value to callback(name, value, metric_type, tags), e.g. a statsd / DogStatsD client, values are not aggregated
+
+    metric_type is 'c' for counters and 'h' for histograms, tags is dict of labels.
+    '''
+
+    def __init__(
+            self, callback: Callable[[str, float, str, Dict[str, str]], None]):
+        self._callback = callback
+
+    def record(self, kind: str, name: str, value: float, labels: Labels):
+        self._callback(
+            name, value, 'c' if kind == COUNTER else 'h', dict(labels))
+
+
+class S3Metrics:
+    '''Record values of metrics to sinks'''
+
+    def __init__(self, sinks: List[MetricsSink]):
+        self._sinks = sinks
+
+    @property
+    def sinks(self) -> List[MetricsSink]:
+        return self._sinks
+
+    def inc(self, name: str, value: float = 1, **labels: str):
+        '''Increase counter by value'''
+        labels = tuple(sorted(labels.items()))
+        for sink in self._sinks:
+            sink.record(COUNTER, name, value, labels)
+
+    def observe(self, name: str, value: float, **labels: str):
+        '''Observe value of histogram'''
+        labels = tuple(sorted(labels.items()))
+        for sink in self._sinks:
+            sink.record(HISTOGRAM, name, value, labels)
+
+
+_metrics = None  # type: Optional[S3Metrics]
+
+
+def enable_metrics(*sinks: MetricsSink) -> S3Metrics:
+    '''Enable metrics of process, values are recorded to sinks, former sinks are replaced'''
+    global _metrics
+    _metrics = S3Metrics(list(sinks))
+    return _metrics
+
+
+def disable_metrics():
+    global _metrics
+    _metrics = None
+
+
+def get_metrics() -> Optional[S3Metrics]:
+    '''Get metrics of process, None if it's not enabled, so that nothing is recorded by hot paths'''
+    return _metrics
+
+
+def remember_bucket(params: dict, context: dict, **kwargs):
+    '''Handler of botocore event before-parameter-build, keep bucket of request in request context'''
+    context[_BUCKET_CONTEXT_KEY] = params.get('Bucket', '')
+
+
+def count_retry(attempts: int, operation, request_dict: dict, **kwargs):
+    '''
+    Handler of botocore event needs-retry, which is emitted after every attempt of request, count attempts retried by botocore itself
+
+    They are made within one call of _make_request, so they are not seen by instrument_request.
+    '''
+    metrics = _metrics
+    if metrics is None or attempts < 2:
+        return None
+    bucket = request_dict.get('context', {}).get(_BUCKET_CONTEXT_KEY, '')
+    metrics.inc(RETRIES, operation=operation.name, bucket=bucket)
+    metrics.inc(REQUESTS, operation=operation.name, bucket=bucket)
+    return None  # Retry is decided by handler of botocore
+
+
+def _body_size(body) -> int:
+    if body is None:
+        return 0
+    if isinstance(body, (bytes, bytearray, memoryview)):
+        return len(body)
+    if isinstance(body, str):
+        return len(body.encode())
+    try:
+        # File-like body is rewound before every attempt
+        offset = body.tell()
+        size = body.seek(0, 2) - offset
+        body.seek(offset)
+        return size
+    except (AttributeError, OSError, ValueError):
+        return 0
+
+
+def _error_code(error: Exception) -> str:
+    if isinstance(error, ClientError):
+        return client_error_code(error)
+    return type(error).__name__
+
+
+def instrument_request(make_request: Callable) -> Callable:
+    '''
+    Wrap _make_request of botocore client, to record metrics of every attempt of request when metrics is enabled
+
+    Bucket of request is kept in request context by remember_bucket, and attempts after the first one are counted as retries.
+    Botocore retries some errors by itself within one call of _make_request, these attempts are counted by count_retry,
+    but latency of the call includes them (and the backoff between them), and only the error of the last attempt is counted.
+    Redirection (3xx) is not counted as error, since it's followed by botocore, e.g. to the region of bucket.
+    '''
+
+    @wraps(make_request)
+    def wrapper(operation_model, request_dict, request_context):
+        metrics = _metrics
+        if metrics is None:
+            return make_request(operation_model, request_dict, request_context)
+
+        operation = operation_model.name
+        bucket = request_context.get(_BUCKET_CONTEXT_KEY, '')
+        attempts = request_context.get(_ATTEMPTS_CONTEXT_KEY, 0) + 1
+        request_context[_ATTEMPTS_CONTEXT_KEY] = attempts
+        if attempts > 1:
+            metrics.inc(RETRIES, operation=operation, bucket=bucket)
+        metrics.inc(REQUESTS, operation=operation, bucket=bucket)
+        sent_bytes = _body_size(request_dict.get('body'))
+        if sent_bytes:
+            metrics.inc(
+                SENT_BYTES, sent_bytes, operation=operation, bucket=bucket)
+
+        start_time = monotonic()
+        try:
+            http, parsed = make_request(
+                operation_model, request_dict, request_context)
+        except Exception as error:
+            metrics.observe(
+                REQUEST_SECONDS,
+                monotonic() - start_time,
+                operation=operation,
+                bucket=bucket)
+            metrics.inc(
+                ERRORS,
+                operation=operation,
+                bucket=bucket,
+                code=_error_code(error))
+            raise
+        metrics.observe(
+            REQUEST_SECONDS,
+            monotonic() - start_time,
+            operation=operation,
+            bucket=bucket)
+        if http.status_code >= 400:
+            # Error response is raised by botocore later
+            code = parsed.get('Error', {}).get('Code') or str(http.status_code)
+            metrics.inc(ERRORS, operation=operation, bucket=bucket, code=code)
+        elif request_dict.get('method') != 'HEAD':
+            received_bytes = int(http.headers.get('content-length', 0) or 0)
+            if received_bytes:
+                metrics.inc(
+                    RECEIVED_BYTES,
+                    received_bytes,
+                    operation=operation,
+                    bucket=bucket)
+        return http, parsed
+
+    return wrapper
@@ -1,11 +1,20 @@
 import atexit
 import concurrent.futures  # don't delete this import, to ensure the _close_s3_pipes registeration is earlier than concurrent.futures._python_exit
 import os
+from collections import deque
+from concurrent.futures import Future
+from math import ceil
 from threading import Thread
-from typing import Optional
+from typing import Callable, Optional
 
-from megfile.errors import translate_s3_error
+from botocore.exceptions import ClientError, IncompleteReadError
+
+from megfile.errors import S3FileChangedError, client_error_code, patch_method, raise_s3_error, s3_should_retry, translate_s3_error
 from megfile.interfaces import Readable, Writable
+from megfile.lib.s3_buffered_writer import upload_fileobj
+from megfile.lib.s3_prefetch_reader import DEFAULT_BLOCK_SIZE, BlockBuffer, get_block_pool, read_body_into
+
+DEFAULT_MAX_WORKERS = 4
 
 _s3_opened_pipes = []
 
@@ -24,7 +33,37 @@ def _close_s3_pipes():  # pragma: no cover
         try_close_pipe(w)
 
 
+def _submit_daemon(func: Callable, *args) -> Future:
+    '''Run func in a daemon thread, unlike threads of executors, it's not joined when process exits, so that handles not closed don't block the exit'''
+    future = Future()
+
+    def run():
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            result = func(*args)
+        except BaseException as error:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    Thread(target=run, daemon=True).start()
+    return future
+
+
 class S3PipeHandler(Readable, Writable):
+    '''
+    Sequential reader / writer of s3 object
+
+    Read-handle splits the object into ranges of block_size, at most max_workers ranges are downloaded concurrently ahead of the reader in daemon threads,
+    and they are consumed in order from a ring of blocks borrowed from the BlockPool, block of a consumed range is reused by the next range.
+    Data is copied from the response body into blocks, and from blocks into the caller's buffer by readinto(), without going through a kernel pipe.
+    Unlike S3PrefetchReader, it doesn't support seek and keeps no consumed blocks, memory is bounded by (max_workers + 1) * block_size.
+
+    If content_size and content_etag are given, e.g. from HEAD of the caller, read-handle is opened without another HEAD request.
+
+    Write-handle writes into an OS pipe, which is uploaded by upload_fileobj in another thread.
+    '''
 
     def __init__(
             self,
@@ -33,7 +72,12 @@ class S3PipeHandler(Readable, Writable):
             mode: str,
             *,
             s3_client,
-            join_thread: bool = True):
+            join_thread: bool = True,
+            block_size: int = DEFAULT_BLOCK_SIZE,
+            max_workers: int = DEFAULT_MAX_WORKERS,
+            max_retries: int = 10,
+            content_size: Optional[int] = None,
+            content_etag: Optional[str] = None):
 
         assert mode in ('rb', 'wb')
 
@@ -45,17 +89,16 @@ class S3PipeHandler(Readable, Writable):
         self._offset = 0
 
         self._exc = None
-        self._pipe = os.pipe()
-        _s3_opened_pipes.append(self._pipe)
-
         if self._mode == 'rb':
-            self._fileobj = os.fdopen(self._pipe[0], 'rb')
-            self._async_task = Thread(
-                target=self._download_fileobj, daemon=True)
+            self._block_size = block_size
+            self._max_workers = max_workers
+            self._start_download(max_retries, content_size, content_etag)
         else:
+            self._pipe = os.pipe()
+            _s3_opened_pipes.append(self._pipe)
             self._fileobj = os.fdopen(self._pipe[1], 'wb')
             self._async_task = Thread(target=self._upload_fileobj, daemon=True)
-        self._async_task.start()
+            self._async_task.start()
 
     @property
     def name(self) -> str:
@@ -68,21 +111,102 @@ class S3PipeHandler(Readable, Writable):
     def tell(self) -> int:
         return self._offset
 
-    def _download_fileobj(self):
+    def _start_download(
+            self, max_retries: int, content_size: Optional[int],
+            content_etag: Optional[str]):
+        if content_size is None:
+            with raise_s3_error(self.name):
+                resp = self._client.head_object(
+                    Bucket=self._bucket, Key=self._key)
+            content_size, content_etag = resp['ContentLength'], resp['ETag']
+        self._content_size = content_size
+        self._content_etag = content_etag
+        self._block_stop = ceil(self._content_size / self._block_size)
+        self._block_pool = get_block_pool(self._block_size)
+        self._fetch_block = patch_method(
+            self._fetch_block,
+            max_retries=max_retries,
+            should_retry=s3_should_retry)
+        self._futures = deque()
+        self._next_index = 0
+        self._buffer = BlockBuffer(bytearray(), 0)
+        for _ in range(self._max_workers):
+            self._submit_next_block()
+
+    def _submit_next_block(self):
+        if self._next_index >= self._block_stop:
+            return
+        self._futures.append(
+            _submit_daemon(self._fetch_block, self._next_index))
+        self._next_index += 1
+
+    def _fetch_block(self, index: int) -> BlockBuffer:
+        start = index * self._block_size
+        stop = min(start + self._block_size, self._content_size)
+        # Ranges are read from the same version of file, if its etag is known
+        extra_args = {}
+        if self._content_etag is not None:
+            extra_args['IfMatch'] = self._content_etag
         try:
-            with os.fdopen(self._pipe[1], 'wb') as buffer:
-                self._client.download_fileobj(self._bucket, self._key, buffer)
-        except BrokenPipeError:
-            if self._fileobj.closed:
-                return
+            resp = self._client.get_object(
+                Bucket=self._bucket,
+                Key=self._key,
+                Range='bytes=%d-%d' % (start, stop - 1),
+                **extra_args)
+        except ClientError as error:
+            if client_error_code(error) in ('412', 'PreconditionFailed'):
+                raise S3FileChangedError(
+                    'File changed: %r, etag before: %s' %
+                    (self.name, self._content_etag))
             raise
-        except Exception as error:
-            self._exc = error
+        etag = resp.get('ETag')
+        # Some servers return no ETag for ranged GET
+        if etag is not None and self._content_etag is not None and \
+                etag != self._content_etag:
+            raise S3FileChangedError(
+                'File changed: %r, etag before: %s, after: %s' %
+                (self.name, self._content_etag, etag))
+        block = self._block_pool.acquire()
+        try:
+            size = read_body_into(
+                resp['Body'],
+                memoryview(block)[:stop - start])
+        except Exception:
+            self._block_pool.release(block)
+            raise
+        if size < stop - start:
+            self._block_pool.release(block)
+            raise IncompleteReadError(
+                actual_bytes=size, expected_bytes=stop - start)
+        return BlockBuffer(block, size)
+
+    def _release_future(self, future: Future):
+        '''Cancel download of a range, or release its block after it's downloaded'''
+
+        def release(future: Future):
+            if not future.cancelled() and future.exception() is None:
+                self._block_pool.release(future.result().block)
+
+        if not future.cancel():
+            future.add_done_callback(release)
+
+    def _next_buffer(self) -> bool:
+        '''Release block of the consumed range, and wait for the next range, return False if all ranges are consumed'''
+        self._block_pool.release(self._buffer.block)
+        self._buffer = BlockBuffer(bytearray(), 0)
+        if len(self._futures) == 0:
+            return False
+        future = self._futures.popleft()
+        with raise_s3_error(self.name):
+            self._buffer = future.result()
+        self._submit_next_block()
+        return True
 
     def _upload_fileobj(self):
         try:
             with os.fdopen(self._pipe[0], 'rb') as buffer:
-                self._client.upload_fileobj(buffer, self._bucket, self._key)
+                upload_fileobj(
+                    buffer, self._bucket, self._key, s3_client=self._client)
         except Exception as error:
             self._exc = error
 
@@ -94,22 +218,62 @@ class S3PipeHandler(Readable, Writable):
         return self._mode == 'rb'
 
     def read(self, size: Optional[int] = None) -> bytes:
-        self._raise_exception()
-        data = self._fileobj.read(size)
+        if size is None or size < 0:
+            size = self._content_size - self._offset
+        chunks, remaining = [], size
+        while remaining > 0:
+            data = self._buffer.read(remaining)
+            if len(data) == 0:
+                if not self._next_buffer():
+                    break
+                continue
+            chunks.append(data)
+            remaining -= len(data)
+        data = chunks[0] if len(chunks) == 1 else b''.join(chunks)
         self._offset += len(data)
         return data
 
     def readline(self, size: Optional[int] = None) -> bytes:
-        self._raise_exception()
-        data = self._fileobj.readline(size)
+        if size is None or size < 0:
+            size = self._content_size - self._offset
+        chunks, remaining = [], size
+        while remaining > 0:
+            data = self._buffer.readline(remaining)
+            if len(data) == 0:
+                if not self._next_buffer():
+                    break
+                continue
+            chunks.append(data)
+            remaining -= len(data)
+            if data.endswith(b'\n'):
+                break
+        data = chunks[0] if len(chunks) == 1 else b''.join(chunks)
         self._offset += len(data)
         return data
 
+    def readinto(self, buffer) -> int:
+        '''Read bytes into buffer, data is copied from downloaded blocks into buffer directly
+
+        :returns: Number of bytes read, less than len(buffer) only at the end of file
+        '''
+        view = memoryview(buffer).cast('B')
+        offset = 0
+        while offset < len(view):
+            size = self._buffer.readinto(view[offset:])
+            if size == 0:
+                if not self._next_buffer():
+                    break
+                continue
+            offset += size
+        self._offset += offset
+        return offset
+
     def writable(self) -> bool:
         return self._mode == 'wb'
 
     def flush(self):
-        self._fileobj.flush()
+        if self._mode == 'wb':
+            self._fileobj.flush()
 
     def write(self, data: bytes) -> int:
         self._raise_exception()
@@ -117,6 +281,12 @@ class S3PipeHandler(Readable, Writable):
         return self._fileobj.write(data)
 
     def _close(self):
+        if self._mode == 'rb':
+            while self._futures:
+                self._release_future(self._futures.popleft())
+            self._block_pool.release(self._buffer.block)
+            self._buffer = BlockBuffer(bytearray(), 0)
+            return
         self._fileobj.close()
         if self._join_thread:
             self._async_task.join()
@@ -1,20 +1,46 @@
 import os
 from collections import OrderedDict
-from concurrent.futures import ThreadPoolExecutor
-from io import BytesIO
+from concurrent.futures import Future, ThreadPoolExecutor
 from logging import getLogger as get_logger
 from math import ceil
 from statistics import mean
-from typing import Optional
+from threading import Lock
+from time import monotonic
+from typing import List, Optional, Tuple
 
-from megfile.errors import S3FileChangedError, patch_method, raise_s3_error, s3_should_retry
+from botocore.exceptions import ClientError
+
+from megfile.errors import S3FileChangedError, client_error_code, patch_method, raise_s3_error, s3_should_retry
 from megfile.interfaces import Readable, Seekable
-from megfile.utils import get_human_size, process_local
+from megfile.lib.s3_block_cache import FileBlockCache
+from megfile.lib.s3_metrics import READER_BLOCK_HITS, READER_BLOCK_MISSES, READER_WASTED_BLOCKS, READER_WASTED_BYTES, get_metrics
+from megfile.utils import coalesce_ranges, get_content_offset, get_human_size, process_local
 
 DEFAULT_BLOCK_SIZE = 8 * 2**20  # 8MB
 DEFAULT_BLOCK_CAPACITY = 16
+DEFAULT_BLOCK_POOL_CAPACITY = 16
 GLOBAL_MAX_WORKERS = 128
 
+# Bounds of block size when auto tuning
+MIN_BLOCK_SIZE = 2**20  # 1MB
+MAX_BLOCK_SIZE = 64 * 2**20  # 64MB
+# Expected ratio of transfer time to latency of a block, latency costs at most 1 / (1 + ratio) of the request time
+LATENCY_RATIO = 4
+# Weight of the latest sample in moving average
+THROUGHPUT_ALPHA = 0.2
+# Min number of samples before tuning block size
+THROUGHPUT_MIN_SAMPLES = 4
+# Transfer time of smaller blocks are dominated by noise, not used for bandwidth
+THROUGHPUT_MIN_SAMPLE_SIZE = 64 * 2**10  # 64KB
+
+# Ranges at most this apart are merged into one request, reading the gap costs less than the latency of another request
+DEFAULT_RANGE_GAP = 512 * 2**10  # 512KB
+# Merged ranges stop growing at this size, and larger ranges are split into requests of this size, so that large ranges are still downloaded in parallel
+DEFAULT_MAX_RANGE_SIZE = 64 * 2**20  # 64MB
+
+# Size of the range requested when opened without content_size, it costs about a HEAD, and small files are downloaded by it as a whole
+FIRST_RANGE_SIZE = 64 * 2**10  # 64KB
+
 BACKOFF_INITIAL = 64 * 2**20  # 64MB
 BACKOFF_FACTOR = 4
 
@@ -31,10 +57,278 @@ class SeekRecord:
         self.read_count = 0
 
 
+def read_body_into(body, view: memoryview) -> int:
+    '''Read the response body into view, return the number of bytes read'''
+    readinto = getattr(body, 'readinto', None)
+    offset = 0
+    while offset < len(view):
+        if readinto is not None:
+            size = readinto(view[offset:])
+        else:
+            data = body.read(len(view) - offset)
+            size = len(data)
+            view[offset:offset + size] = data
+        if not size:
+            break
+        offset += size
+    return offset
+
+
+class BlockBuffer:
+    '''
+    A read-only BytesIO-like view over a downloaded block, the block is a bytearray which may be borrowed from a BlockPool.
+    read() / readline() copy data out as bytes, readinto() copies data into the caller's buffer directly.
+    '''
+
+    def __init__(self, block: bytearray, size: int):
+        self._block = block
+        self._view = memoryview(block)[:size]
+        self._size = size
+        self._offset = 0
+        self.used = False  # Whether block is read by reader, see S3PrefetchReader._buffer
+
+    @property
+    def block(self) -> bytearray:
+        return self._block
+
+    def __len__(self) -> int:
+        return self._size
+
+    def tell(self) -> int:
+        return self._offset
+
+    def seek(self, offset: int) -> int:
+        self._offset = max(min(offset, self._size), 0)
+        return self._offset
+
+    def _stop(self, size: Optional[int]) -> int:
+        if size is None or size < 0:
+            return self._size
+        return min(self._offset + size, self._size)
+
+    def read(self, size: Optional[int] = None) -> bytes:
+        stop = self._stop(size)
+        data = self._view[self._offset:stop].tobytes()
+        self._offset = stop
+        return data
+
+    def readline(self, size: Optional[int] = None) -> bytes:
+        stop = self._stop(size)
+        index = self._block.find(b'\n', self._offset, stop)
+        if index >= 0:
+            stop = index + 1
+        data = self._view[self._offset:stop].tobytes()
+        self._offset = stop
+        return data
+
+    def readinto(self, buffer) -> int:
+        view = memoryview(buffer).cast('B')
+        stop = self._stop(len(view))
+        size = stop - self._offset
+        view[:size] = self._view[self._offset:stop]
+        self._offset = stop
+        return size
+
+
+class BlockPool:
+    '''
+    A bounded pool of reusable bytearray blocks with the same size.
+    Blocks are downloaded straight into borrowed blocks, and returned to the pool when evicted from the cache, so that the allocator is not churned by every block.
+    At most capacity idle blocks are kept, the others are left to the garbage collector.
+    '''
+
+    def __init__(
+            self, block_size: int, capacity: int = DEFAULT_BLOCK_POOL_CAPACITY):
+        self._block_size = block_size
+        self._capacity = capacity
+        self._blocks = []
+        self._lock = Lock()
+
+    @property
+    def block_size(self) -> int:
+        return self._block_size
+
+    def __len__(self) -> int:
+        return len(self._blocks)
+
+    def acquire(self) -> bytearray:
+        with self._lock:
+            if len(self._blocks) > 0:
+                return self._blocks.pop()
+        return bytearray(self._block_size)
+
+    def release(self, block: bytearray):
+        # Blocks read from FileBlockCache are read-only mmap, never reuse them
+        if not isinstance(block, bytearray) or len(block) != self._block_size:
+            return
+        with self._lock:
+            if len(self._blocks) < self._capacity:
+                self._blocks.append(block)
+
+
+class ThroughputStats:
+    '''
+    Statistics of block downloads in process, latency (time to first byte) and bandwidth of single request are exponentially weighted moving averages.
+    Used to choose block size of auto tuning readers, so that latency is amortized, while small files are not over-fetched.
+    '''
+
+    def __init__(self, alpha: float = THROUGHPUT_ALPHA):
+        self._alpha = alpha
+        self._lock = Lock()
+        self.count = 0
+        self.latency = None
+        self.bandwidth = None
+
+    def _moving_average(self, average: Optional[float], value: float) -> float:
+        if average is None:
+            return value
+        return average + self._alpha * (value - average)
+
+    def record(self, latency: float, size: int, transfer_time: float):
+        with self._lock:
+            self.count += 1
+            self.latency = self._moving_average(self.latency, latency)
+            if size >= THROUGHPUT_MIN_SAMPLE_SIZE and transfer_time > 0:
+                self.bandwidth = self._moving_average(
+                    self.bandwidth, size / transfer_time)
+
+    def suggest_block_size(
+            self,
+            content_size: int,
+            block_size: int = DEFAULT_BLOCK_SIZE,
+            min_block_size: int = MIN_BLOCK_SIZE,
+            max_block_size: int = MAX_BLOCK_SIZE) -> int:
+        '''
+        Return a power of 2 times of min_block_size within [min_block_size, max_block_size],
+        which makes transfer time of a block LATENCY_RATIO times of latency. Use block_size if there are not enough samples.
+        '''
+        with self._lock:
+            if self.count < THROUGHPUT_MIN_SAMPLES or self.bandwidth is None:
+                target_size = block_size
+            else:
+                target_size = self.bandwidth * self.latency * LATENCY_RATIO
+        # No need to use blocks larger than the file
+        target_size = min(target_size, content_size)
+        size = min_block_size
+        while size < target_size and size < max_block_size:
+            size *= 2
+        return min(size, max_block_size)
+
+
+def get_throughput_stats() -> ThroughputStats:
+    return process_local('S3PrefetchReader.throughput_stats', ThroughputStats)
+
+
+def get_block_pool(block_size: int) -> BlockPool:
+    '''Get the process-wide BlockPool of the given block size'''
+    return process_local(
+        'S3PrefetchReader.block_pool.%d' % block_size, BlockPool, block_size)
+
+
+def get_global_executor() -> ThreadPoolExecutor:
+    '''Get the process-wide executor shared by readers'''
+    return process_local(
+        'S3PrefetchReader.executor',
+        ThreadPoolExecutor,
+        max_workers=GLOBAL_MAX_WORKERS)
+
+
+def read_ranges(
+        client,
+        bucket: str,
+        key: str,
+        ranges: List[Tuple[int, int]],
+        *,
+        executor: ThreadPoolExecutor,
+        etag: Optional[str] = None,
+        size: Optional[int] = None,
+        max_retries: int = 10,
+        range_gap: int = DEFAULT_RANGE_GAP,
+        max_range_size: int = DEFAULT_MAX_RANGE_SIZE) -> List[memoryview]:
+    '''
+    Read ranges [start, stop) of s3 object concurrently, nearby ranges are merged into one ranged GET, and ranges larger than max_range_size are split into several
+
+    Ranges beyond end of file are truncated, and ranges starting at or beyond end of file are empty.
+
+    :param ranges: list of (start, stop), where 0 <= start <= stop
+    :param executor: executor to run requests
+    :param etag: expected etag of object, if etag is None, all responses should have the same etag
+    :param size: size of object if known, then ranges are truncated without requests
+    :returns: memoryview of each range in the order of ranges, views of merged ranges share one buffer
+    '''
+    name = 's3://%s/%s' % (bucket, key)
+    if size is not None:
+        ranges = [(min(start, size), min(stop, size)) for start, stop in ranges]
+
+    def fetch_range(start: int, stop: int):
+        try:
+            data = client.get_object(
+                Bucket=bucket, Key=key, Range='bytes=%d-%d' % (start, stop - 1))
+        except ClientError as error:
+            # Range starts at or beyond end of file
+            if client_error_code(error) in ('416', 'InvalidRange'):
+                return memoryview(b''), None
+            raise
+        # Response of range beyond end of file is shorter
+        buffer = bytearray(
+            min(data.get('ContentLength', stop - start), stop - start))
+        size = read_body_into(data['Body'], memoryview(buffer))
+        return memoryview(buffer)[:size], data.get('ETag', None)
+
+    fetch_range = patch_method(
+        fetch_range, max_retries=max_retries, should_retry=s3_should_retry)
+
+    merged_ranges = coalesce_ranges(ranges, range_gap, max_range_size)
+    futures = [
+        [
+            executor.submit(
+                fetch_range, part_start, min(part_start + max_range_size, stop))
+            for part_start in range(start, stop, max_range_size)
+        ]
+        for start, stop, _ in merged_ranges
+    ]
+    views = [None] * len(ranges)
+    try:
+        with raise_s3_error(name):
+            for (start, _, indexes), part_futures in zip(merged_ranges,
+                                                         futures):
+                part_views = []
+                for future in part_futures:
+                    view, response_etag = future.result()
+                    if response_etag is not None:
+                        if etag is None:
+                            etag = response_etag
+                        elif response_etag != etag:
+                            raise S3FileChangedError(
+                                'File changed: %r, etag before: %s, after: %s' %
+                                (name, etag, response_etag))
+                    part_views.append(view)
+                if len(part_views) == 0:
+                    view = memoryview(b'')
+                elif len(part_views) == 1:
+                    view = part_views[0]
+                else:
+                    # Parts of a split range are joined into one buffer
+                    view = memoryview(b''.join(part_views))
+                for index in indexes:
+                    range_start, range_stop = ranges[index]
+                    # Ranges beyond end of file are truncated
+                    views[index] = view[range_start - start:range_stop - start]
+    finally:
+        for part_futures in futures:
+            for future in part_futures:
+                future.cancel()
+    return views
+
+
 class S3PrefetchReader(Readable, Seekable):
     '''
     Reader to fast read the s3 content. This will divide the file content into equal parts of block_size size, and will use LRU to cache at most block_capacity blocks in memory.
     open(), seek() and read() will trigger prefetch read. The prefetch will cached block_forward blocks of data from offset position (the position after reading if the called function is read).
+    If block_cache is given, it works as the second tier of cache: downloaded blocks are also written to block_cache, and blocks in block_cache are read from it instead of s3, even if they are opened by another reader later.
+    If auto_tune is True, block_size is chosen within [min_block_size, max_block_size] when opened, according to latency and bandwidth measured by previous downloads in process.
+    Memory ceiling block_size * block_capacity is kept, so smaller blocks mean more blocks prefetched, and larger blocks mean fewer.
+    If content_size is given, e.g. from s3_scan_stat, the file is opened without any request. Otherwise file size and etag are learned from the response of the first FIRST_RANGE_SIZE bytes, which are kept as the first block if they are the whole block, and HEAD is requested only if the response does not tell them.
     '''
 
     def __init__(
@@ -47,7 +341,13 @@ class S3PrefetchReader(Readable, Seekable):
             block_capacity: int = DEFAULT_BLOCK_CAPACITY,
             block_forward: Optional[int] = None,
             max_retries: int = 10,
-            max_workers: Optional[int] = None):
+            max_workers: Optional[int] = None,
+            block_cache: Optional[FileBlockCache] = None,
+            auto_tune: bool = False,
+            min_block_size: int = MIN_BLOCK_SIZE,
+            max_block_size: int = MAX_BLOCK_SIZE,
+            content_size: Optional[int] = None,
+            content_etag: Optional[str] = None):
 
         block_forward = self._get_block_forward(block_capacity, block_forward)
 
@@ -59,16 +359,31 @@ class S3PrefetchReader(Readable, Seekable):
         self._client = s3_client
         self._max_retries = max_retries
 
-        with raise_s3_error(self.name):
-            data = self._client.head_object(Bucket=self._bucket, Key=self._key)
-            self._content_size = data['ContentLength']
-            self._content_etag = data['ETag']
-            self._content_info = data
+        self._content_etag = content_etag  # Learned from the first response if None
+        first_buffer = None
+        if content_size is not None:
+            self._content_size = content_size
+            self._content_info = {
+                'ContentLength': content_size,
+                'ETag': content_etag
+            }
+        elif auto_tune:
+            # Block size is chosen according to file size
+            self._head_object()
+        else:
+            first_buffer = self._fetch_first_buffer(block_size)
+
+        if auto_tune:
+            block_size, block_capacity, block_forward = self._tune_block_size(
+                block_size, block_capacity, block_forward, min_block_size,
+                max_block_size)
 
         self._block_size = block_size
         self._block_capacity = block_capacity  # Max number of blocks
         self._block_forward = block_forward  # Number of blocks every prefetch, which should be smaller than block_capacity
         self._block_stop = ceil(self._content_size / block_size)
+        self._block_pool = get_block_pool(block_size)
+        self._block_cache = block_cache
 
         self.__offset = 0
         self._backoff_size = BACKOFF_INITIAL
@@ -78,17 +393,70 @@ class S3PrefetchReader(Readable, Seekable):
         self._futures = self._get_futures()
         self._is_global_executor = False
         if max_workers is None:
-            self._executor = process_local(
-                'S3PrefetchReader.executor',
-                ThreadPoolExecutor,
-                max_workers=GLOBAL_MAX_WORKERS)
+            self._executor = get_global_executor()
             self._is_global_executor = True
         else:
             self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        if first_buffer is not None:
+            if self._block_cache is not None:
+                self._block_cache.put(
+                    self._bucket, self._key, self._content_etag, 0,
+                    memoryview(first_buffer.block)[:len(first_buffer)])
+            self._put_future(0, first_buffer)
         self._seek_buffer(0)
 
         _logger.debug('open file: %r, mode: %s' % (self.name, self.mode))
 
+    def _head_object(self):
+        with raise_s3_error(self.name):
+            data = self._client.head_object(Bucket=self._bucket, Key=self._key)
+        self._content_size = data['ContentLength']
+        self._content_etag = data['ETag']
+        self._content_info = data
+
+    def _fetch_first_buffer(self, block_size: int) -> Optional[BlockBuffer]:
+        '''
+        Download the head of file, and learn file size and etag from its response instead of HEAD
+
+        :returns: The first block, or None if the head of file is only a part of it
+        '''
+        block_pool = get_block_pool(block_size)
+        range_size = min(block_size, FIRST_RANGE_SIZE)
+
+        def fetch_block():
+            try:
+                return self._download_block(
+                    'bytes=0-%d' % (range_size - 1), block_pool)
+            except ClientError as error:
+                if client_error_code(error) in ('416', 'InvalidRange'):
+                    return None, None  # Empty file
+                raise
+
+        fetch_block = patch_method(
+            fetch_block,
+            max_retries=self._max_retries,
+            should_retry=s3_should_retry)
+
+        with raise_s3_error(self.name):
+            data, buffer = fetch_block()
+
+        # Content-Range of response is like 'bytes 0-1023/4096'
+        content_range = data.get('ContentRange') if data else None
+        if content_range and self._content_etag is not None:
+            self._content_size = int(content_range.rsplit('/', 1)[-1])
+            self._content_info = {
+                'ContentLength': self._content_size,
+                'ETag': self._content_etag
+            }
+        else:
+            self._head_object()
+        if buffer is not None and len(buffer) < min(self._content_size,
+                                                    block_size):
+            # The first block is downloaded as others when it's read
+            block_pool.release(buffer.block)
+            return None
+        return buffer
+
     def _get_block_forward(
             self, block_capacity: int, block_forward: Optional[int]):
         self._is_auto_scaling = block_forward is None
@@ -96,6 +464,22 @@ class S3PrefetchReader(Readable, Seekable):
             block_forward = block_capacity - 1
         return block_forward
 
+    def _tune_block_size(
+            self, block_size: int, block_capacity: int, block_forward: int,
+            min_block_size: int, max_block_size: int):
+        max_buffer_size = block_size * block_capacity
+        block_size = get_throughput_stats().suggest_block_size(
+            self._content_size, block_size, min_block_size, max_block_size)
+        block_capacity = max(max_buffer_size // block_size, 2)
+        if self._is_auto_scaling:
+            block_forward = block_capacity - 1
+        else:
+            block_forward = min(block_forward, block_capacity - 1)
+        _logger.debug(
+            'tune file: %r, block size: %s, block capacity: %d' %
+            (self.name, get_human_size(block_size), block_capacity))
+        return block_size, block_capacity, block_forward
+
     def _get_futures(self):
         return LRUCacheFutureManager()
 
@@ -187,15 +571,15 @@ class S3PrefetchReader(Readable, Seekable):
             self._offset += len(data)
             return data
 
-        buffer = BytesIO()
-        buffer.write(data)
-        while buffer.tell() < size:
-            remain_size = size - buffer.tell()
-            data = self._next_buffer.read(remain_size)
-            buffer.write(data)
+        buffer = bytearray(size)
+        offset = len(data)
+        buffer[:offset] = data
+        view = memoryview(buffer)
+        while offset < size:
+            offset += self._next_buffer.readinto(view[offset:])
 
-        self._offset += buffer.tell()
-        return buffer.getvalue()
+        self._offset += offset
+        return bytes(buffer)
 
     def readline(self, size: Optional[int] = None):
         '''
@@ -221,17 +605,17 @@ class S3PrefetchReader(Readable, Seekable):
             self._offset += len(data)
             return data
 
-        buffer = BytesIO()
-        buffer.write(data)
+        chunks = [data]
+        offset = len(data)
         while True:
-            remain_size = size - buffer.tell()
-            data = self._next_buffer.readline(remain_size)
-            buffer.write(data)
-            if buffer.tell() == size or data[-1] == NEWLINE:
+            data = self._next_buffer.readline(size - offset)
+            chunks.append(data)
+            offset += len(data)
+            if offset == size or data[-1] == NEWLINE:
                 break
 
-        self._offset += buffer.tell()
-        return buffer.getvalue()
+        self._offset += offset
+        return b''.join(chunks)
 
     def _read(self, size: int):
         if size == 0 or self._offset >= self._content_size:
@@ -244,31 +628,56 @@ class S3PrefetchReader(Readable, Seekable):
         return data
 
     def readinto(self, buffer: bytearray) -> int:
+        '''Read bytes into buffer, data is copied from cached blocks into buffer only once'''
         if self.closed:
             raise IOError('file already closed: %r' % self.name)
 
         if self._offset >= self._content_size:
             return 0
 
-        size = len(buffer)
-        size = min(size, self._content_size - self._offset)
-
-        data = self._buffer.read(size)
-        buffer[:len(data)] = data
-        if len(data) == size:
-            self._offset += len(data)
-            return size
+        view = memoryview(buffer).cast('B')
+        size = min(len(view), self._content_size - self._offset)
+        view = view[:size]
 
-        offset = len(data)
+        offset = self._buffer.readinto(view)
         while offset < size:
-            remain_size = size - offset
-            data = self._next_buffer.read(remain_size)
-            buffer[offset:offset + len(data)] = data
-            offset += len(data)
+            offset += self._next_buffer.readinto(view[offset:])
 
         self._offset += offset
         return size
 
+    def read_ranges(
+            self,
+            ranges: List[Tuple[Optional[int], Optional[int]]],
+            range_gap: int = DEFAULT_RANGE_GAP,
+            max_range_size: int = DEFAULT_MAX_RANGE_SIZE) -> List[memoryview]:
+        '''
+        Read ranges [start, stop) concurrently, nearby ranges are merged into one request.
+        Offset of reader is not changed, and ranges are downloaded directly instead of blocks.
+
+        :param ranges: list of (start, stop), start and stop can be None or negative, like slice
+        :param range_gap: ranges at most range_gap apart are merged
+        :param max_range_size: max size of merged range, larger ranges are split into requests of this size
+        :returns: memoryview of each range, in the order of ranges
+        '''
+        if self.closed:
+            raise IOError('file already closed: %r' % self.name)
+        ranges = [
+            get_content_offset(start, stop, self._content_size)
+            for start, stop in ranges
+        ]
+        return read_ranges(
+            self._client,
+            self._bucket,
+            self._key,
+            ranges,
+            executor=self._executor,
+            etag=self._content_etag,
+            size=self._content_size,
+            max_retries=self._max_retries,
+            range_gap=range_gap,
+            max_range_size=max_range_size)
+
     @property
     def _is_alive(self):
         return not self._executor._shutdown  # pytype: disable=attribute-error
@@ -282,7 +691,7 @@ class S3PrefetchReader(Readable, Seekable):
         return list(self._futures.keys())
 
     @property
-    def _buffer(self) -> BytesIO:
+    def _buffer(self) -> BlockBuffer:
         if self._cached_offset is not None:
             start = self._block_index
             stop = min(start + self._block_forward, self._block_stop)
@@ -292,14 +701,21 @@ class S3PrefetchReader(Readable, Seekable):
                 self._submit_future(index)
             self._cleanup_futures()
 
+            metrics = get_metrics()
+            if metrics is not None:
+                metrics.inc(
+                    READER_BLOCK_HITS if self._is_block_ready(
+                        self._block_index) else READER_BLOCK_MISSES,
+                    bucket=self._bucket)
             self._cached_buffer = self._fetch_future_result(self._block_index)
+            self._cached_buffer.used = True
             self._cached_buffer.seek(self._cached_offset)
             self._cached_offset = None
 
         return self._cached_buffer
 
     @property
-    def _next_buffer(self) -> BytesIO:
+    def _next_buffer(self) -> BlockBuffer:
         # Get next buffer by this function when finished reading current buffer (self._buffer)
         # Make sure that _buffer is used before using _next_buffer(), or will make _cached_offset invalid
         self._block_index += 1
@@ -327,27 +743,67 @@ class S3PrefetchReader(Readable, Seekable):
         self._cached_offset = offset
         self._block_index = index
 
-    def _fetch_buffer(self, index: int) -> BytesIO:
+    def _fetch_buffer(self, index: int) -> BlockBuffer:
+        offset = index * self._block_size
+        if self._block_cache is not None and self._content_etag is not None:
+            # Blocks are keyed by etag and byte range, so blocks of changed file, or of another block size, are never hit
+            size = min(self._block_size, self._content_size - offset)
+            block = self._block_cache.get(
+                self._bucket, self._key, self._content_etag, offset, size)
+            if block is not None:
+                return BlockBuffer(block, len(block))  # pytype: disable=wrong-arg-types
+
+        buffer = self._download_buffer(index)
+        if self._block_cache is not None and self._content_etag is not None:
+            # Write through in the download thread, so that read() is not blocked by disk
+            self._block_cache.put(
+                self._bucket, self._key, self._content_etag, offset,
+                memoryview(buffer.block)[:len(buffer)])
+        return buffer
+
+    def _check_etag(self, data: dict):
+        etag = data.get('ETag', None)
+        if etag is None:
+            return
+        if self._content_etag is None:
+            self._content_etag = etag
+        elif etag != self._content_etag:
+            raise S3FileChangedError(
+                'File changed: %r, etag before: %s, after: %s' %
+                (self.name, self._content_info, data))
+
+    def _download_block(self, range_str: str, block_pool: BlockPool):
+        '''Download range into a block borrowed from block_pool, return the response and the block'''
+        start_time = monotonic()
+        data = self._client.get_object(
+            Bucket=self._bucket, Key=self._key, Range=range_str)
+        first_byte_time = monotonic()
+        self._check_etag(data)
+        block = block_pool.acquire()
+        try:
+            size = read_body_into(data['Body'], memoryview(block))
+        except Exception:
+            block_pool.release(block)
+            raise
+        get_throughput_stats().record(
+            first_byte_time - start_time, size,
+            monotonic() - first_byte_time)
+        return data, BlockBuffer(block, size)
+
+    def _download_buffer(self, index: int) -> BlockBuffer:
         range_str = 'bytes=%d-%d' % (
             index * self._block_size, (index + 1) * self._block_size - 1)
 
-        def fetch_bytes() -> bytes:
-            data = self._client.get_object(
-                Bucket=self._bucket, Key=self._key, Range=range_str)
-            etag = data.get('ETag', None)
-            if etag is not None and etag != self._content_etag:
-                raise S3FileChangedError(
-                    'File changed: %r, etag before: %s, after: %s' %
-                    (self.name, self._content_info, data))
-            return data['Body'].read()
-
-        fetch_bytes = patch_method(
-            fetch_bytes,
+        def fetch_block() -> BlockBuffer:
+            return self._download_block(range_str, self._block_pool)[1]
+
+        fetch_block = patch_method(
+            fetch_block,
             max_retries=self._max_retries,
             should_retry=s3_should_retry)
 
         with raise_s3_error(self.name):
-            return BytesIO(fetch_bytes())
+            return fetch_block()
 
     def _submit_future(self, index: int):
         if index < 0 or index >= self._block_stop:
@@ -357,15 +813,41 @@ class S3PrefetchReader(Readable, Seekable):
     def _fetch_future_result(self, index: int):
         return self._futures.result(index)
 
+    def _is_block_ready(self, index: int) -> bool:
+        future = self._futures.get(index)
+        return future is not None and future.done()
+
+    def _put_future(self, index: int, buffer: BlockBuffer):
+        future = Future()
+        future.set_result(buffer)
+        self._futures[index] = future
+
     def _cleanup_futures(self):
-        self._futures.cleanup(self._block_capacity)
+        for future in self._futures.cleanup(self._block_capacity):
+            self._release_future(future)
+
+    def _release_future(self, future: Future):
+        # Return the block to pool after the download finished, a cancelled future owns no block
+        future.add_done_callback(self._release_block)
+
+    def _release_block(self, future: Future):
+        if future.cancelled() or future.exception() is not None:
+            return
+        buffer = future.result()
+        metrics = get_metrics()
+        if metrics is not None and not buffer.used:
+            # Prefetched block is evicted (or reader is closed) before it's read
+            metrics.inc(READER_WASTED_BLOCKS, bucket=self._bucket)
+            metrics.inc(READER_WASTED_BYTES, len(buffer), bucket=self._bucket)
+        self._block_pool.release(buffer.block)
 
     def _close(self):
         _logger.debug('close file: %r' % self.name)
 
+        for future in self._futures.cleanup(0):
+            self._release_future(future)
         if not self._is_global_executor:
             self._executor.shutdown()
-        self._futures.clear()  # clean memory
 
 
 class LRUCacheFutureManager(OrderedDict):
@@ -387,8 +869,12 @@ class LRUCacheFutureManager(OrderedDict):
         self.move_to_end(key, last=True)
         return self[key].result()
 
-    def cleanup(self, block_capacity: int):
+    def cleanup(self, block_capacity: int) -> List[Future]:
+        '''Evict the least recently used futures, return the evicted futures'''
+        futures = []
         while len(self) > block_capacity:
             _, future = self.popitem(last=False)
             if not future.done():
                 future.cancel()
+            futures.append(future)
+        return futures
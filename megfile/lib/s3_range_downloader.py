@@ -0,0 +1,251 @@
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from logging import getLogger as get_logger
+from threading import Lock
+from typing import Callable, Optional, Set, Tuple
+
+from botocore.exceptions import ClientError, IncompleteReadError
+
+from megfile.errors import S3FileChangedError, client_error_code, patch_method, s3_should_retry
+
+DEFAULT_RANGE_SIZE = 16 * 2**20  # 16MB
+DEFAULT_MAX_WORKERS = 8
+# Range is read from response body and written by chunks of this size, so memory of a range is never held at once
+READ_CHUNK_SIZE = 2**20  # 1MB
+# Data is downloaded into '<path>.megfile-download', and completed ranges are recorded in '<path>.megfile-download.json'
+DOWNLOAD_SUFFIX = '.megfile-download'
+SIDECAR_SUFFIX = '.json'
+
+_logger = get_logger(__name__)
+_pwrite_lock = Lock()
+
+
+def _pwrite(fd: int, data: bytes, offset: int):
+    '''Write all of data at offset of fd, without moving the file offset shared by threads'''
+    if not hasattr(os, 'pwrite'):  # pragma: no cover
+        # Windows has no pwrite, seek and write are serialized instead
+        with _pwrite_lock:
+            os.lseek(fd, offset, os.SEEK_SET)
+            while data:
+                data = data[os.write(fd, data):]
+        return
+    view = memoryview(data)
+    while view:
+        written = os.pwrite(fd, view, offset)
+        view = view[written:]
+        offset += written
+
+
+class DownloadSidecar:
+    '''
+    Completed ranges of a resumable download, saved as json lines in a local file next to the destination
+
+    The first line is the object, e.g. {"bucket": ..., "key": ..., "etag": ..., "size": ..., "range_size": ...}.
+    Each of the following lines is a downloaded range, e.g. {"start": 0, "stop": 16777216}.
+    '''
+
+    def __init__(self, path: str):
+        self._path = path
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    def load(self) -> Tuple[Optional[dict], Set[int]]:
+        '''
+        Load the object and starts of its downloaded ranges
+
+        :returns: The object (None if there is no sidecar), and set of starts of downloaded ranges
+        '''
+        if not os.path.exists(self._path):
+            return None, set()
+        header, starts = None, set()
+        with open(self._path) as f:
+            for line in f.read().splitlines():
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # The last line may be partially written when process died
+                    _logger.warning(
+                        'invalid line in download sidecar: %r, %r' %
+                        (self._path, line))
+                    break
+                if header is None:
+                    header = record
+                else:
+                    starts.add(record['start'])
+        return header, starts
+
+    def start(self, header: dict):
+        '''Start sidecar of a new download, former sidecar is overwritten'''
+        with open(self._path, 'w') as f:
+            f.write(json.dumps(header) + '\n')
+
+    def add_range(self, start: int, stop: int):
+        with open(self._path, 'a') as f:
+            f.write(json.dumps({'start': start, 'stop': stop}) + '\n')
+
+    def remove(self):
+        '''Remove sidecar after download is completed'''
+        if os.path.exists(self._path):
+            os.unlink(self._path)
+
+
+class S3RangeDownloader:
+    '''
+    Download an s3 object to a local file by ranges, which are fetched in max_workers threads and written at their offsets by os.pwrite.
+
+    Object not larger than range_size is downloaded by a single request.
+    Larger object is downloaded into a sparse temporary file preallocated to its size, and every completed range is recorded in a sidecar,
+    if the download is interrupted, the next download of the same object to the same path only fetches missing ranges.
+    All ranges are requested with the etag of the object, S3FileChangedError is raised if the object is changed during download,
+    and a sidecar of another version of the object is discarded.
+    '''
+
+    def __init__(
+            self,
+            bucket: str,
+            key: str,
+            path: str,
+            *,
+            s3_client,
+            max_workers: int = DEFAULT_MAX_WORKERS,
+            range_size: int = DEFAULT_RANGE_SIZE,
+            max_retries: int = 10,
+            callback: Optional[Callable[[int], None]] = None):
+        self._bucket = bucket
+        self._key = key
+        self._path = path
+        self._client = s3_client
+        self._max_workers = max_workers
+        self._range_size = range_size
+        self._max_retries = max_retries
+        self._callback = callback
+        self._etag = None
+
+    @property
+    def name(self) -> str:
+        return 's3://%s/%s' % (self._bucket, self._key)
+
+    @property
+    def temp_path(self) -> str:
+        return self._path + DOWNLOAD_SUFFIX
+
+    @property
+    def sidecar_path(self) -> str:
+        return self.temp_path + SIDECAR_SUFFIX
+
+    def _get_object(self, **kwargs) -> dict:
+        try:
+            resp = self._client.get_object(
+                Bucket=self._bucket,
+                Key=self._key,
+                IfMatch=self._etag,
+                **kwargs)
+        except ClientError as error:
+            if client_error_code(error) in ('412', 'PreconditionFailed'):
+                raise S3FileChangedError(
+                    'File changed: %r, etag before: %s' %
+                    (self.name, self._etag))
+            raise
+        etag = resp.get('ETag')
+        # Some servers return no ETag for ranged GET
+        if etag is not None and etag != self._etag:
+            raise S3FileChangedError(
+                'File changed: %r, etag before: %s, after: %s' %
+                (self.name, self._etag, etag))
+        return resp
+
+    def _fetch_range(self, fd: int, start: int, stop: int):
+        resp = self._get_object(Range='bytes=%d-%d' % (start, stop - 1))
+        body, offset = resp['Body'], start
+        while offset < stop:
+            data = body.read(min(READ_CHUNK_SIZE, stop - offset))
+            if not data:
+                raise IncompleteReadError(
+                    actual_bytes=offset - start, expected_bytes=stop - start)
+            _pwrite(fd, data, offset)
+            offset += len(data)
+
+    def _fetch_whole(self, size: int):
+        resp = self._get_object()
+        with open(self.temp_path, 'wb') as f:
+            for data in iter(lambda: resp['Body'].read(READ_CHUNK_SIZE), b''):
+                f.write(data)
+        if self._callback is not None:
+            self._callback(size)
+
+    def _fetch_ranges(self, size: int):
+        ranges = [
+            (start, min(start + self._range_size, size))
+            for start in range(0, size, self._range_size)
+        ]
+        header = {
+            'bucket': self._bucket,
+            'key': self._key,
+            'etag': self._etag,
+            'size': size,
+            'range_size': self._range_size,
+        }
+        sidecar = DownloadSidecar(self.sidecar_path)
+        saved_header, done = sidecar.load()
+        if saved_header != header or not os.path.exists(self.temp_path) or \
+                os.path.getsize(self.temp_path) != size:
+            if saved_header is not None:
+                _logger.info(
+                    'discard download sidecar of another version: %r' %
+                    sidecar.path)
+            done = set()
+            sidecar.start(header)
+        elif done:
+            _logger.info(
+                'resume download: %r, %d of %d ranges are downloaded' %
+                (self.name, len(done), len(ranges)))
+            if self._callback is not None:
+                self._callback(
+                    sum(
+                        stop - start
+                        for start, stop in ranges
+                        if start in done))
+
+        fetch_range = patch_method(
+            self._fetch_range,
+            max_retries=self._max_retries,
+            should_retry=s3_should_retry)
+        fd = os.open(self.temp_path, os.O_RDWR | os.O_CREAT, 0o666)
+        try:
+            # Extend file to its size without writing, blocks are allocated when ranges are written
+            os.ftruncate(fd, size)
+            with ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+                futures = {
+                    executor.submit(fetch_range, fd, start, stop):
+                    (start, stop) for start, stop in ranges if start not in done
+                }
+                try:
+                    for future in as_completed(futures):
+                        future.result()
+                        start, stop = futures[future]
+                        sidecar.add_range(start, stop)
+                        if self._callback is not None:
+                            self._callback(stop - start)
+                finally:
+                    for future in futures:
+                        future.cancel()
+        finally:
+            os.close(fd)
+        return sidecar
+
+    def download(self):
+        resp = self._client.head_object(Bucket=self._bucket, Key=self._key)
+        size, self._etag = resp['ContentLength'], resp['ETag']
+        if size <= self._range_size:
+            patch_method(
+                self._fetch_whole,
+                max_retries=self._max_retries,
+                should_retry=s3_should_retry)(size)
+            os.replace(self.temp_path, self._path)
+            return
+        sidecar = self._fetch_ranges(size)
+        os.replace(self.temp_path, self._path)
+        sidecar.remove()
@@ -1,8 +1,10 @@
 from collections import Counter
+from concurrent.futures import Future
 from logging import getLogger as get_logger
 from typing import Optional
 
-from megfile.lib.s3_prefetch_reader import LRUCacheFutureManager, S3PrefetchReader
+from megfile.lib.s3_prefetch_reader import BlockBuffer, LRUCacheFutureManager, S3PrefetchReader
+from megfile.lib.s3_shm_cache import ShmBlockCache
 from megfile.utils import thread_local
 
 DEFAULT_BLOCK_SIZE = 8 * 2**20  # 8MB
@@ -20,6 +22,7 @@ class S3ShareCacheReader(S3PrefetchReader):
     '''
     Reader to fast read the s3 content. This will divide the file content into equal parts of block_size size, and will use LRU to cache at most block_capacity blocks in memory.
     open(), seek() and read() will trigger prefetch read. The prefetch will cached block_forward blocks of data from offset position (the position after reading if the called function is read).
+    Blocks are shared by readers with the same cache_key in one thread. If shm_cache is given, blocks are also shared by all processes on the node using the same shm_cache directory.
     '''
 
     def __init__(
@@ -33,7 +36,10 @@ class S3ShareCacheReader(S3PrefetchReader):
             block_forward: Optional[int] = None,
             max_retries: int = 10,
             cache_key: str = 'lru',
-            max_workers: Optional[int] = None):
+            max_workers: Optional[int] = None,
+            shm_cache: Optional[ShmBlockCache] = None,
+            content_size: Optional[int] = None,
+            content_etag: Optional[str] = None):
 
         self._cache_key = cache_key
 
@@ -46,6 +52,9 @@ class S3ShareCacheReader(S3PrefetchReader):
             block_forward=block_forward,
             max_retries=max_retries,
             max_workers=max_workers,
+            block_cache=shm_cache,
+            content_size=content_size,
+            content_etag=content_etag,
         )
 
     def _get_block_forward(
@@ -75,6 +84,18 @@ class S3ShareCacheReader(S3PrefetchReader):
     def _fetch_future_result(self, index: int):
         return self._futures.result((self.name, index))
 
+    def _is_block_ready(self, index: int) -> bool:
+        future = self._futures.get((self.name, index))
+        return future is not None and future.done()
+
+    def _put_future(self, index: int, buffer: BlockBuffer):
+        # The block may be downloaded by another reader already
+        if (self.name, index) in self._futures:
+            return
+        future = Future()
+        future.set_result(buffer)
+        self._futures[(self.name, index)] = future
+
     def _cleanup_futures(self):
         self._futures.cleanup(DEFAULT_BLOCK_CAPACITY)
 
@@ -0,0 +1,41 @@
+import os
+import tempfile
+from typing import Optional
+
+from megfile.lib.s3_block_cache import FileBlockCache
+from megfile.utils import process_local
+
+DEFAULT_SHM_CACHE_SIZE = 2**30  # 1GB
+
+
+def get_default_shm_cache_dir() -> str:
+    '''Use tmpfs if available, so that cached blocks are kept in memory'''
+    if os.path.isdir('/dev/shm'):
+        return '/dev/shm/megfile'
+    return os.path.join(tempfile.gettempdir(), 'megfile-shm')
+
+
+class ShmBlockCache(FileBlockCache):
+    '''
+    Block cache shared by all processes on one node, blocks are stored as files in a tmpfs directory (/dev/shm by default) and mmap-ed when read.
+    Blocks are keyed by byte range, so processes opening the same file with different block sizes don't read blocks of each other.
+    '''
+
+    def __init__(
+            self,
+            cache_dir: Optional[str] = None,
+            max_cache_size: int = DEFAULT_SHM_CACHE_SIZE):
+        if cache_dir is None:
+            cache_dir = get_default_shm_cache_dir()
+        super().__init__(cache_dir, max_cache_size)
+
+
+def get_shm_block_cache(
+        cache_dir: Optional[str] = None,
+        max_cache_size: int = DEFAULT_SHM_CACHE_SIZE) -> ShmBlockCache:
+    '''Get ShmBlockCache of cache_dir, which is shared by all readers in process'''
+    if cache_dir is None:
+        cache_dir = get_default_shm_cache_dir()
+    return process_local(
+        'ShmBlockCache.%s.%d' % (cache_dir, max_cache_size), ShmBlockCache,
+        cache_dir, max_cache_size)
@@ -0,0 +1,162 @@
+import json
+import os
+from logging import getLogger as get_logger
+from threading import Lock
+from time import monotonic
+from typing import Dict, List, Optional, Tuple
+
+from botocore.exceptions import ClientError
+
+from megfile.errors import client_error_code
+
+_logger = get_logger(__name__)
+
+# Min interval (in seconds) between puts of s3 journal when parts are added
+S3_JOURNAL_FLUSH_INTERVAL = 1.0
+
+
+def _parse_s3_url(s3_url: str) -> Tuple[str, str]:
+    bucket, _, key = s3_url[len('s3://'):].partition('/')
+    return bucket, key
+
+
+class UploadJournal:
+    '''
+    Journal of a resumable multipart upload, saved as json lines in a local file or an s3 object (sidecar)
+
+    The first line is the upload, e.g. {"bucket": ..., "key": ..., "upload_id": ..., "metadata": ...}.
+    Each of the following lines is an uploaded part, e.g. {"part_number": 1, "offset": 0, "size": 8388608, "etag": ...}, a later line overrides an earlier one of the same part number.
+    Lines are appended to a local journal. S3 object can't be appended, so s3 journal is put as a whole, and added parts are batched:
+    it's put at most every S3_JOURNAL_FLUSH_INTERVAL seconds and by flush(), parts added after the last put are uploaded again if the process dies.
+    '''
+
+    def __init__(self, path: str, s3_client=None):
+        self._path = path
+        self._client = s3_client
+        self._lock = Lock()
+        self._lines = []
+        self._version = 0  # Increased when lines are changed
+        self._flush_lock = Lock()  # Held by the put of s3 journal
+        self._flushed_version = 0  # Version of lines in the last put
+        self._flushed_time = monotonic()
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    @property
+    def _is_s3(self) -> bool:
+        return self._path.startswith('s3://')
+
+    def _read_lines(self) -> List[str]:
+        if self._is_s3:
+            bucket, key = _parse_s3_url(self._path)
+            try:
+                resp = self._client.get_object(Bucket=bucket, Key=key)
+            except ClientError as error:
+                if client_error_code(error) in ('404', 'NoSuchKey'):
+                    return []
+                raise
+            return resp['Body'].read().decode().splitlines()
+        if not os.path.exists(self._path):
+            return []
+        with open(self._path) as f:
+            return f.read().splitlines()
+
+    def load(self) -> Tuple[Optional[dict], Dict[int, dict]]:
+        '''
+        Load the upload and its uploaded parts
+
+        :returns: The upload (None if there is no journal), and dict of part number to uploaded part
+        '''
+        upload, parts = None, {}
+        for line in self._read_lines():
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # The last line may be partially written when process died
+                _logger.warning(
+                    'invalid line in upload journal: %r, %r' %
+                    (self._path, line))
+                break
+            if upload is None:
+                upload = record
+            else:
+                parts[record['part_number']] = record
+        return upload, parts
+
+    def _put(self):
+        '''Put lines to s3 journal, should be called with _flush_lock held, so that puts are not reordered'''
+        with self._lock:
+            if self._flushed_version == self._version:
+                return
+            body = ''.join(self._lines).encode()
+            version = self._version
+        bucket, key = _parse_s3_url(self._path)
+        self._client.put_object(Bucket=bucket, Key=key, Body=body)
+        self._flushed_version = version
+        self._flushed_time = monotonic()
+
+    def flush(self):
+        '''Put lines not saved yet to s3 journal, local journal is always saved'''
+        if not self._is_s3:
+            return
+        with self._flush_lock:
+            self._put()
+
+    def _save(self, line: str, append: bool = True):
+        if self._is_s3:
+            with self._lock:
+                if not append:
+                    self._lines = []
+                self._lines.append(line)
+                self._version += 1
+            if not append:
+                self.flush()
+            elif monotonic() - self._flushed_time >= S3_JOURNAL_FLUSH_INTERVAL and \
+                    self._flush_lock.acquire(blocking=False):
+                # Parts being uploaded don't wait for each other's put, one of them puts all lines
+                try:
+                    self._put()
+                finally:
+                    self._flush_lock.release()
+            return
+        with self._lock:
+            directory = os.path.dirname(self._path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self._path, 'a' if append else 'w') as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def start(self, upload: dict):
+        '''Start journal of a new upload, former journal is overwritten'''
+        self._save(json.dumps(upload) + '\n', append=False)
+
+    def resume(self, upload: dict, parts: List[dict]):
+        '''Continue journal of a resumed upload, only parts to be kept are written'''
+        self._save(
+            ''.join(json.dumps(record) + '\n' for record in [upload] + parts),
+            append=False)
+
+    def add_part(self, part_number: int, offset: int, size: int, etag: str):
+        self._save(
+            json.dumps(
+                {
+                    'part_number': part_number,
+                    'offset': offset,
+                    'size': size,
+                    'etag': etag,
+                }) + '\n')
+
+    def remove(self):
+        '''Remove journal after upload is completed'''
+        with self._flush_lock, self._lock:
+            self._lines = []
+            self._flushed_version = self._version
+            if self._is_s3:
+                bucket, key = _parse_s3_url(self._path)
+                self._client.delete_object(Bucket=bucket, Key=key)
+            elif os.path.exists(self._path):
+                os.unlink(self._path)
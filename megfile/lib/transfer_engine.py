@@ -0,0 +1,272 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+from logging import getLogger as get_logger
+from queue import Full, Queue
+from threading import BoundedSemaphore, Condition, Event, Lock, Thread
+from time import monotonic
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Tuple
+
+from megfile.utils import get_human_size
+
+DEFAULT_MAX_WORKERS = 16
+DEFAULT_MAX_LARGE_WORKERS = 4
+DEFAULT_LARGE_FILE_SIZE = 64 * 2**20  # 64MB
+DEFAULT_MAX_INFLIGHT_FILES = 1024
+DEFAULT_MAX_INFLIGHT_BYTES = 2**30  # 1GB
+DEFAULT_LISTING_BUFFER_SIZE = 10000
+# Interval (in seconds) of checking stop event when waiting for free space of a bounded queue
+QUEUE_PUT_INTERVAL = 0.1
+
+_logger = get_logger(__name__)
+
+
+class TransferProgress:
+    '''
+    Aggregate progress of a TransferEngine, files and bytes are counted when they are listed (submitted) and when they are copied.
+    Listing is pipelined with copying, so listed_files / listed_bytes grow until listing is finished.
+    '''
+
+    def __init__(self):
+        self.start_time = monotonic()
+        self.listed_files = 0
+        self.listed_bytes = 0
+        self.copied_files = 0
+        self.copied_bytes = 0
+        self.listing_finished = False
+
+    @property
+    def elapsed_time(self) -> float:
+        return monotonic() - self.start_time
+
+    @property
+    def speed(self) -> float:
+        '''Copied bytes per second'''
+        return self.copied_bytes / max(self.elapsed_time, 1e-6)
+
+    def __repr__(self) -> str:
+        return '%s(files=%d/%d, bytes=%s/%s, speed=%s/s)' % (
+            type(self).__name__, self.copied_files, self.listed_files,
+            get_human_size(self.copied_bytes), get_human_size(
+                self.listed_bytes), get_human_size(self.speed))
+
+
+class SyncDelta:
+    '''
+    Files to be copied and files skipped (unchanged) by a sync.
+    Paths of files to be copied are kept in `files` only if the sync is a dry run, otherwise only counts are kept.
+    '''
+
+    def __init__(self):
+        self.copy_files = 0
+        self.copy_bytes = 0
+        self.skip_files = 0
+        self.skip_bytes = 0
+        self.files = []  # type: List[Tuple[str, str, int]]
+
+    def __repr__(self) -> str:
+        return '%s(copy=%d files / %s, skip=%d files / %s)' % (
+            type(self).__name__, self.copy_files, get_human_size(
+                self.copy_bytes), self.skip_files,
+            get_human_size(self.skip_bytes))
+
+
+def put_unless_stopped(queue: Queue, item: Any, stop: Event) -> bool:
+    '''
+    Put item into a bounded queue, wait for free space until stop is set, so that producer won't block forever after consumer is gone.
+
+    :returns: True if item is put, False if stopped
+    '''
+    while not stop.is_set():
+        try:
+            queue.put(item, timeout=QUEUE_PUT_INTERVAL)
+            return True
+        except Full:
+            pass
+    return False
+
+
+def iter_in_background(
+        iterable: Iterable,
+        max_size: int = DEFAULT_LISTING_BUFFER_SIZE) -> Iterator:
+    '''
+    Consume iterable in a background thread, buffer at most max_size items, so that a slow listing runs concurrently with the consumer.
+    Error raised by iterable is re-raised in the consumer.
+    '''
+    queue = Queue(max_size)
+    stop = Event()
+    sentinel = object()
+
+    def worker():
+        try:
+            for item in iterable:
+                if not put_unless_stopped(queue, (item, None), stop):
+                    return
+            put_unless_stopped(queue, (sentinel, None), stop)
+        except Exception as error:
+            put_unless_stopped(queue, (sentinel, error), stop)
+
+    Thread(target=worker, daemon=True).start()
+    try:
+        while True:
+            item, error = queue.get()
+            if error is not None:
+                raise error
+            if item is sentinel:
+                return
+            yield item
+    finally:
+        # Worker waiting for free space gives up
+        stop.set()
+
+
+def merge_join(left: Iterable, right: Iterable,
+               key: Callable[[Any], str]) -> Iterator[Tuple[Any, Any]]:
+    '''
+    Join two iterables sorted by key in ascending order, yield (left_item, right_item) for every item in left, right_item is None if there is no item of the same key in right.
+
+    If right is not sorted, some matched items may be missed (joined to None), but never mismatched.
+    '''
+    right = iter(right)
+    right_item = next(right, None)
+    for left_item in left:
+        left_key = key(left_item)
+        while right_item is not None and key(right_item) < left_key:
+            right_item = next(right, None)
+        if right_item is not None and key(right_item) == left_key:
+            yield left_item, right_item
+            right_item = next(right, None)
+        else:
+            yield left_item, None
+
+
+class ByteBudget:
+    '''Counting semaphore of bytes, acquire() blocks until enough bytes are released'''
+
+    def __init__(self, max_bytes: int):
+        self._max_bytes = max_bytes
+        self._available = max_bytes
+        self._condition = Condition()
+
+    def acquire(self, size: int) -> int:
+        '''Acquire size bytes, larger size than the whole budget is acquired as the whole budget, return the acquired size'''
+        size = min(size, self._max_bytes)
+        with self._condition:
+            self._condition.wait_for(lambda: self._available >= size)
+            self._available -= size
+        return size
+
+    def try_acquire(self, size: int) -> Optional[int]:
+        '''Acquire size bytes like acquire(), but return None instead of blocking if they are not available'''
+        size = min(size, self._max_bytes)
+        with self._condition:
+            if self._available < size:
+                return None
+            self._available -= size
+        return size
+
+    def release(self, size: int):
+        with self._condition:
+            self._available += size
+            self._condition.notify_all()
+
+
+class TransferEngine:
+    '''
+    Copy many files concurrently, e.g. for smart_sync.
+
+    Files are copied by copy_func(src_path, dst_path, callback=callback) in max_workers threads, while the (lazy) list of files is still being consumed, so listing and copying are pipelined.
+    Files larger than large_file_size are copied in another pool of max_large_workers threads, since their copy may be split into parts by copy_func itself, they won't block small files.
+    At most max_inflight_files files and max_inflight_bytes bytes are submitted but not copied, listing waits when either is exceeded.
+
+    callback(src_path, num_bytes) is called when bytes of a file are copied, progress_callback(progress) is called with the aggregate TransferProgress, both are called in worker threads, and progress_callback is serialized by a lock.
+    If any copy fails, no more files are submitted, and the first error is raised after submitted copies are finished.
+    '''
+
+    def __init__(
+            self,
+            copy_func: Callable,
+            *,
+            max_workers: int = DEFAULT_MAX_WORKERS,
+            max_large_workers: int = DEFAULT_MAX_LARGE_WORKERS,
+            large_file_size: int = DEFAULT_LARGE_FILE_SIZE,
+            max_inflight_files: int = DEFAULT_MAX_INFLIGHT_FILES,
+            max_inflight_bytes: int = DEFAULT_MAX_INFLIGHT_BYTES,
+            callback: Optional[Callable[[str, int], None]] = None,
+            progress_callback: Optional[
+                Callable[[TransferProgress], None]] = None):
+        self._copy_func = copy_func
+        self._max_workers = max_workers
+        self._max_large_workers = max_large_workers
+        self._large_file_size = large_file_size
+        self._callback = callback
+        self._progress_callback = progress_callback
+
+        self._files = BoundedSemaphore(max_inflight_files)
+        self._bytes = ByteBudget(max_inflight_bytes)
+        self._progress = TransferProgress()
+        self._lock = Lock()
+        self._error = None
+
+    @property
+    def progress(self) -> TransferProgress:
+        return self._progress
+
+    def _update_progress(self, files: int = 0, num_bytes: int = 0):
+        with self._lock:
+            self._progress.copied_files += files
+            self._progress.copied_bytes += num_bytes
+            if self._progress_callback is not None:
+                self._progress_callback(self._progress)
+
+    def _copy(self, src_path: str, dst_path: str, size: int):
+        if self._callback is None and self._progress_callback is None:
+            # Nobody watches, copied bytes are counted after file is copied
+            self._copy_func(src_path, dst_path, callback=None)
+            self._update_progress(files=1, num_bytes=size)
+            return
+
+        def callback(num_bytes: int):
+            if self._callback is not None:
+                self._callback(src_path, num_bytes)
+            self._update_progress(num_bytes=num_bytes)
+
+        self._copy_func(src_path, dst_path, callback=callback)
+        self._update_progress(files=1)
+
+    def _on_done(self, budget: int, future: Future):
+        self._bytes.release(budget)
+        self._files.release()
+        if future.exception() is not None:
+            with self._lock:
+                if self._error is None:
+                    self._error = future.exception()
+
+    def run(self, tasks: Iterable[Tuple[str, str, int]]) -> TransferProgress:
+        '''
+        Copy files in tasks, and wait until all copies are finished
+
+        :param tasks: Iterable of (src_path, dst_path, file size), file size is used to bound in-flight bytes and choose pool
+        :returns: Aggregate progress
+        '''
+        with ThreadPoolExecutor(max_workers=self._max_workers) as executor, \
+                ThreadPoolExecutor(max_workers=self._max_large_workers) as large_executor:
+            for src_path, dst_path, size in tasks:
+                if self._error is not None:
+                    break
+                self._files.acquire()
+                budget = self._bytes.acquire(size)
+                with self._lock:
+                    self._progress.listed_files += 1
+                    self._progress.listed_bytes += size
+                if size >= self._large_file_size:
+                    future = large_executor.submit(
+                        self._copy, src_path, dst_path, size)
+                else:
+                    future = executor.submit(
+                        self._copy, src_path, dst_path, size)
+                future.add_done_callback(partial(self._on_done, budget))
+            self._progress.listing_finished = True
+        _logger.debug('transfer finished: %r' % self._progress)
+        if self._error is not None:
+            raise self._error
+        return self._progress
@@ -3,11 +3,16 @@ import inspect
 import io
 import os
 import re
-from collections import defaultdict
+import time
+from collections import defaultdict, deque
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from fnmatch import fnmatchcase
 from functools import partial, wraps
-from itertools import chain
+from itertools import chain, islice
 from logging import getLogger as get_logger
-from typing import Any, BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple, Union
+from queue import Queue
+from threading import Event
+from typing import Any, BinaryIO, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Union
 from urllib.parse import urlsplit
 
 import boto3
@@ -16,18 +21,28 @@ import smart_open.s3
 
 from megfile.errors import S3BucketNotFoundError, S3ConfigError, S3FileExistsError, S3FileNotFoundError, S3IsADirectoryError, S3NotADirectoryError, S3PermissionError, S3UnknownError, UnsupportedError, _create_missing_ok_generator
 from megfile.errors import _logger as error_logger
-from megfile.errors import patch_method, raise_s3_error, s3_should_retry, translate_fs_error, translate_s3_error
+from megfile.errors import client_error_code, patch_method, raise_s3_error, s3_should_retry, translate_fs_error, translate_s3_error
 from megfile.interfaces import Access, FileCacher, FileEntry, MegfilePathLike, StatResult
 from megfile.lib.compat import fspath
 from megfile.lib.fnmatch import translate
 from megfile.lib.glob import globlize, has_magic, ungloblize
 from megfile.lib.joinpath import uri_join
-from megfile.lib.s3_buffered_writer import DEFAULT_MAX_BUFFER_SIZE, S3BufferedWriter
+from megfile.lib.s3_block_cache import DEFAULT_BLOCK_CACHE_SIZE, get_file_block_cache
+from megfile.lib.s3_buffered_writer import DEFAULT_MAX_BUFFER_SIZE, S3BufferedWriter, set_global_buffer_size, upload_fileobj
 from megfile.lib.s3_cached_handler import S3CachedHandler
+from megfile.lib.s3_client_registry import S3PoolStats, config_key, get_client_registry
 from megfile.lib.s3_limited_seekable_writer import S3LimitedSeekableWriter
+from megfile.lib.s3_metadata_cache import BUCKET_DENIED, BUCKET_MISSING, BUCKET_OK, DEFAULT_METADATA_CACHE_SIZE, DEFAULT_METADATA_CACHE_TTL, DIR, HEAD, cached_bucket_status, cached_metadata, disable_metadata_cache, enable_metadata_cache, invalidate_metadata, set_bucket_cache_ttl
+from megfile.lib.s3_metrics import MetricsSink, count_retry, disable_metrics, enable_metrics, instrument_request, remember_bucket
+from megfile.lib.s3_pipe_handler import DEFAULT_MAX_WORKERS as DEFAULT_PIPE_MAX_WORKERS
 from megfile.lib.s3_pipe_handler import S3PipeHandler
-from megfile.lib.s3_prefetch_reader import DEFAULT_BLOCK_SIZE, S3PrefetchReader
+from megfile.lib.s3_prefetch_reader import DEFAULT_BLOCK_SIZE, GLOBAL_MAX_WORKERS, S3PrefetchReader, get_global_executor, read_ranges
+from megfile.lib.s3_range_downloader import DEFAULT_MAX_WORKERS as DEFAULT_DOWNLOAD_MAX_WORKERS
+from megfile.lib.s3_range_downloader import DEFAULT_RANGE_SIZE as DEFAULT_DOWNLOAD_RANGE_SIZE
+from megfile.lib.s3_range_downloader import S3RangeDownloader
 from megfile.lib.s3_share_cache_reader import S3ShareCacheReader
+from megfile.lib.s3_shm_cache import DEFAULT_SHM_CACHE_SIZE, get_shm_block_cache
+from megfile.lib.transfer_engine import DEFAULT_MAX_WORKERS, TransferEngine, TransferProgress, put_unless_stopped
 from megfile.utils import get_binary_mode, get_content_offset, is_readable, thread_local
 
 # Monkey patch for smart_open
@@ -45,7 +60,8 @@ if 'resource_kwargs' in _smart_open_parameters:
 elif 'client' in _smart_open_parameters:
     # smart_open >= 5.0.0
     def _s3_open(bucket: str, key: str, mode: str):
-        return smart_open.s3.open(bucket, key, mode, client=get_s3_client())
+        return smart_open.s3.open(
+            bucket, key, mode, client=get_s3_client(bucket=bucket))
 
 else:
     # smart_open < 1.8.1, >= 1.6.0
@@ -78,9 +94,16 @@ __all__ = [
     's3_legacy_open',
     's3_listdir',
     's3_load_content',
+    's3_load_ranges',
     's3_load_from',
     's3_makedirs',
     's3_memory_open',
+    's3_enable_metadata_cache',
+    's3_disable_metadata_cache',
+    's3_enable_metrics',
+    's3_set_global_buffer_size',
+    's3_disable_metrics',
+    's3_set_bucket_cache_ttl',
     's3_open',
     's3_path_join',
     's3_pipe_open',
@@ -99,7 +122,14 @@ __all__ = [
     's3_upload',
     's3_walk',
     'S3Cacher',
+    'S3RemoveReport',
     'get_s3_client',
+    'get_s3_client_stats',
+    's3_clear_client_cache',
+    'get_s3_route',
+    's3_add_route',
+    's3_clear_routes',
+    'S3Route',
     'parse_s3_url',
     'get_endpoint_url',
     'S3BufferedWriter',
@@ -112,6 +142,8 @@ __all__ = [
 _logger = get_logger(__name__)
 
 content_md5_header = 'megfile-content-md5'
+# Size and mtime of local file being uploaded, a resumed upload of changed file is not continued
+source_version_header = 'megfile-source-version'
 endpoint_url = 'https://s3.amazonaws.com'
 
 
@@ -126,15 +158,33 @@ def get_endpoint_url() -> str:
     return oss_endpoint
 
 
-def get_s3_session():
+# Increased by s3_clear_client_cache, sessions of former generations are created again, so that credentials are resolved again
+_session_generation = 0
+
+
+def _create_s3_session(profile_name: Optional[str]):
+    if profile_name is None:
+        return _session_generation, boto3.session.Session()
+    return _session_generation, boto3.session.Session(profile_name=profile_name)
+
+
+def get_s3_session(profile_name: Optional[str] = None):
     '''Get S3 session
 
+    :param profile_name: Credentials profile of session, default profile if it's None
     returns: S3 session
     '''
-    return thread_local('s3_session', boto3.session.Session)
+    key = 's3_session' if profile_name is None else 's3_session.%s' % profile_name
+    generation, session = thread_local(key, _create_s3_session, profile_name)
+    if generation != _session_generation:
+        del thread_local[key]
+        generation, session = thread_local(
+            key, _create_s3_session, profile_name)
+    return session
 
 
-max_pool_connections = 32
+# Clients are shared by threads, pool is as large as the global executors, so that every worker keeps its connection
+max_pool_connections = GLOBAL_MAX_WORKERS
 max_retries = 10
 
 
@@ -153,8 +203,11 @@ def _patch_make_request(client: botocore.client.BaseClient):
             'send s3 request: %r, with parameters: %s', operation_model.name,
             request_dict)
 
+    # Metrics of requests are recorded by every attempt, see s3_enable_metrics
+    client.meta.events.register('before-parameter-build.s3', remember_bucket)
+    client.meta.events.register('needs-retry.s3', count_retry)
     client._make_request = patch_method(
-        client._make_request,
+        instrument_request(client._make_request),
         max_retries=max_retries,
         should_retry=s3_should_retry,
         before_callback=before_callback,
@@ -184,20 +237,111 @@ def _patch_send_request():
 
 _patch_send_request()
 
+# Endpoint, credentials profile and client config of buckets, None means the default one
+S3Route = NamedTuple(
+    'S3Route', [
+        ('endpoint_url', Optional[str]),
+        ('profile_name', Optional[str]),
+        ('config', Optional[botocore.config.Config]),
+    ])
+S3Route.__new__.__defaults__ = (None, None, None)
+
+_routes = []  # type: List[Tuple[str, S3Route]]
+_default_route = S3Route()
+
+
+def s3_add_route(
+        bucket_pattern: str,
+        endpoint_url: Optional[str] = None,
+        profile_name: Optional[str] = None,
+        config: Optional[botocore.config.Config] = None) -> None:
+    '''
+    Route buckets matching bucket_pattern to another endpoint / credentials profile / client config, so that one process can access multiple S3-compatible services
+
+    Routes are matched in the order they are added, buckets matching no route use get_endpoint_url() and the default profile.
+    Files are copied between buckets of different routes by streaming through the process, e.g. by s3_copy and smart_sync.
+
+    :param bucket_pattern: Bucket name, or shell-style pattern of bucket names, e.g. 'onprem-*'
+    :param endpoint_url: Endpoint of the buckets, get_endpoint_url() if it's None
+    :param profile_name: Credentials profile of the buckets, default profile if it's None
+    :param config: Client config of the buckets, e.g. pool size and retries, default config if it's None
+    '''
+    _routes.append(
+        (bucket_pattern, S3Route(endpoint_url, profile_name, config)))
+
+
+def s3_clear_routes() -> None:
+    '''Remove all routes added by s3_add_route'''
+    _routes.clear()
+
+
+def get_s3_route(bucket: str) -> S3Route:
+    '''Get route of bucket, see s3_add_route'''
+    for bucket_pattern, route in _routes:
+        if fnmatchcase(bucket, bucket_pattern):
+            return route
+    return _default_route
+
 
 def get_s3_client(
         config: Optional[botocore.config.Config] = None,
-        cache_key: Optional[str] = None):
+        cache_key: Optional[str] = None,
+        profile_name: Optional[str] = None,
+        bucket: Optional[str] = None):
     '''Get S3 client
 
+    Clients are cached in a registry by (endpoint, profile, config), and shared by all threads in process,
+    so that connections in pool are reused, see get_s3_client_stats.
+    Clients are cached for the lifetime of process, and credentials are resolved when the first client of a session is created,
+    so rotated static credentials (e.g. in environment or credentials file) are not picked up until s3_clear_client_cache() is called.
+    Refreshable credentials, e.g. of assumed role or instance profile, are refreshed by botocore itself.
+
+    :param config: Config of client, by default connection pool has max_pool_connections connections
+    :param cache_key: Deprecated, clients are always cached
+    :param profile_name: Credentials profile, default profile if it's None
+    :param bucket: Bucket to be accessed by client, endpoint / profile / config of its route are used unless given, see s3_add_route
     returns: S3 client
     '''
-    if cache_key is not None:
-        return thread_local(cache_key, get_s3_client, config)
-    client = get_s3_session().client(
-        's3', endpoint_url=get_endpoint_url(), config=config)
-    client = _patch_make_request(client)
-    return client
+    endpoint_url = None
+    if bucket:
+        route = get_s3_route(bucket)
+        endpoint_url = route.endpoint_url
+        profile_name = profile_name or route.profile_name
+        config = config or route.config
+    if config is None:
+        config = botocore.config.Config(
+            max_pool_connections=max_pool_connections)
+    if endpoint_url is None:
+        endpoint_url = get_endpoint_url()
+
+    def create():
+        client = get_s3_session(profile_name).client(
+            's3', endpoint_url=endpoint_url, config=config)
+        return _patch_make_request(client)
+
+    return get_client_registry().get(
+        (endpoint_url, profile_name, config_key(config)), create)
+
+
+def get_s3_client_stats() -> S3PoolStats:
+    '''
+    Get connection pool statistics of cached S3 clients in process, e.g. requests served by pooled connections (hits), new connections and discarded connections
+
+    Connections are discarded when they are returned to a full pool, increase max_pool_connections if it happens frequently.
+    Discarded connections are counted by the warnings of logger urllib3.connectionpool, nothing is counted if its level is raised above WARNING.
+    '''
+    return get_client_registry().stats()
+
+
+def s3_clear_client_cache() -> None:
+    '''
+    Remove cached S3 clients and sessions of process, clients got after it are created again, and resolve credentials again
+
+    Clients got before are not closed, they still work with former credentials.
+    '''
+    global _session_generation
+    _session_generation += 1
+    get_client_registry().clear()
 
 
 def is_s3(path: MegfilePathLike) -> bool:
@@ -243,17 +387,177 @@ def _make_stat(content: Dict[str, Any]):
     )
 
 
+DEFAULT_COPY_PART_SIZE = 64 * 2**20  # 64MB
+DEFAULT_COPY_MAX_WORKERS = 8
+max_copy_part_size = 5 * 2**30  # 5GB, max size of copy_object and upload_part_copy
+max_copy_parts = 10000
+# Headers set when object is created, they are kept by copy_object, and copied from source to multipart upload
+copied_headers = (
+    'CacheControl', 'ContentDisposition', 'ContentEncoding', 'ContentLanguage',
+    'ContentType', 'Expires', 'WebsiteRedirectLocation')
+
+
+def _copy_part(
+        s3_client, src_bucket: str, src_key: str, src_etag: str,
+        dst_bucket: str, dst_key: str, upload_id: str, part_number: int,
+        start: int, stop: int) -> dict:
+    resp = s3_client.upload_part_copy(
+        Bucket=dst_bucket,
+        Key=dst_key,
+        UploadId=upload_id,
+        PartNumber=part_number,
+        CopySource={
+            'Bucket': src_bucket,
+            'Key': src_key
+        },
+        CopySourceRange='bytes=%d-%d' % (start, stop - 1),
+        # Part is copied from the same version of source
+        CopySourceIfMatch=src_etag)
+    return {
+        'PartNumber': part_number,
+        'ETag': resp['CopyPartResult']['ETag'],
+    }
+
+
+def _copy_object(
+        s3_client,
+        src_bucket: str,
+        src_key: str,
+        dst_bucket: str,
+        dst_key: str,
+        callback: Optional[Callable[[int], None]] = None,
+        max_workers: int = DEFAULT_COPY_MAX_WORKERS,
+        part_size: int = DEFAULT_COPY_PART_SIZE,
+        metadata: Optional[Dict[str, str]] = None):
+    '''
+    Copy object on server side, by copy_object if it is not larger than part_size, else by upload_part_copy of parts in max_workers threads.
+    Every part is retried by itself, and multipart upload is aborted if any part fails at last.
+    Metadata and headers (see copied_headers) of source are kept, metadata is replaced if given, e.g. to set metadata of an object by copying it to itself.
+    '''
+    resp = s3_client.head_object(Bucket=src_bucket, Key=src_key)
+    size = resp['ContentLength']
+    extra_args = {
+        header: resp[header] for header in copied_headers if header in resp
+    }
+    if size <= min(part_size, max_copy_part_size):
+        if metadata is not None:
+            # Headers are replaced with metadata, so they are given again
+            extra_args.update(Metadata=metadata, MetadataDirective='REPLACE')
+        else:
+            extra_args = {}
+        s3_client.copy_object(
+            Bucket=dst_bucket,
+            Key=dst_key,
+            CopySource={
+                'Bucket': src_bucket,
+                'Key': src_key
+            },
+            **extra_args)
+        if callback is not None:
+            callback(size)
+        return
+
+    # At most max_copy_parts parts
+    part_size = max(part_size, -(-size // max_copy_parts))
+    part_size = min(part_size, max_copy_part_size)
+    if metadata is None:
+        metadata = resp.get('Metadata', {})
+    upload_id = s3_client.create_multipart_upload(
+        Bucket=dst_bucket, Key=dst_key, Metadata=metadata,
+        **extra_args)['UploadId']
+    copy_part = patch_method(
+        _copy_part, max_retries=max_retries, should_retry=s3_should_retry)
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {}
+            for part_number, start in enumerate(range(0, size, part_size),
+                                                start=1):
+                stop = min(start + part_size, size)
+                future = executor.submit(
+                    copy_part, s3_client, src_bucket, src_key, resp['ETag'],
+                    dst_bucket, dst_key, upload_id, part_number, start, stop)
+                futures[future] = stop - start
+            parts = []
+            try:
+                for future in as_completed(futures):
+                    parts.append(future.result())
+                    if callback is not None:
+                        callback(futures[future])
+            finally:
+                for future in futures:
+                    future.cancel()
+        parts.sort(key=lambda part: part['PartNumber'])
+        s3_client.complete_multipart_upload(
+            Bucket=dst_bucket,
+            Key=dst_key,
+            UploadId=upload_id,
+            MultipartUpload={'Parts': parts})
+    except BaseException:
+        # Failure of abort is logged, the original error is raised
+        try:
+            s3_client.abort_multipart_upload(
+                Bucket=dst_bucket, Key=dst_key, UploadId=upload_id)
+        except Exception as error:
+            _logger.warning(
+                'failed to abort multipart upload: %r, upload id: %s, error: %r'
+                % ('s3://%s/%s' % (dst_bucket, dst_key), upload_id, error))
+        raise
+
+
+def _stream_object(
+        src_client,
+        src_bucket: str,
+        src_key: str,
+        dst_client,
+        dst_bucket: str,
+        dst_key: str,
+        callback: Optional[Callable[[int], None]] = None,
+        max_workers: int = DEFAULT_COPY_MAX_WORKERS):
+    '''
+    Copy object between endpoints by streaming, content is read by blocks in max_workers threads and written by parts in max_workers threads concurrently.
+    Metadata of source is kept. If reading source fails, nothing is written to destination.
+    '''
+    resp = src_client.head_object(Bucket=src_bucket, Key=src_key)
+    with S3PrefetchReader(src_bucket, src_key, s3_client=src_client,
+                          max_retries=max_retries, max_workers=max_workers,
+                          content_size=resp['ContentLength'],
+                          content_etag=resp['ETag']) as reader:
+        writer = S3BufferedWriter(
+            dst_bucket,
+            dst_key,
+            s3_client=dst_client,
+            max_workers=max_workers,
+            metadata=resp.get('Metadata'))
+        try:
+            for chunk in iter(lambda: reader.read(DEFAULT_BLOCK_SIZE), b''):
+                writer.write(chunk)
+                if callback is not None:
+                    callback(len(chunk))
+        except Exception:
+            writer.abort()
+            raise
+        writer.close()
+
+
 def s3_copy(
         src_url: MegfilePathLike,
         dst_url: MegfilePathLike,
-        callback: Optional[Callable[[int], None]] = None) -> None:
+        callback: Optional[Callable[[int], None]] = None,
+        max_workers: int = DEFAULT_COPY_MAX_WORKERS,
+        part_size: int = DEFAULT_COPY_PART_SIZE) -> None:
     ''' File copy on S3
     Copy content of file on `src_path` to `dst_path`.
     It's caller's responsebility to ensure the s3_isfile(src_url) == True
 
+    Content is copied on server side, file larger than part_size is copied by parts in max_workers threads, and metadata of source is kept.
+    If buckets are of different routes (see s3_add_route), content is streamed through the process instead, since it can't be copied on server side.
+
     :param src_path: Source file path
     :param dst_path: Target file path
     :param callback: Called periodically during copy, and the input parameter is the data size (in bytes) of copy since the last call
+    :param max_workers: Number of parts copied concurrently, 8 by default
+    :param part_size: Size of parts, 64MB by default, increased if there would be more than 10000 parts
     '''
     src_bucket, src_key = parse_s3_url(src_url)
     dst_bucket, dst_key = parse_s3_url(dst_url)
@@ -268,23 +572,35 @@ def s3_copy(
     if not dst_key or dst_key.endswith('/'):
         raise S3IsADirectoryError('Is a directory: %r' % dst_url)
 
-    client = get_s3_client()
     try:
-        client.copy(
-            {
-                'Bucket': src_bucket,
-                'Key': src_key,
-            },
-            Bucket=dst_bucket,
-            Key=dst_key,
-            Callback=callback)
+        if get_s3_route(src_bucket) == get_s3_route(dst_bucket):
+            _copy_object(
+                get_s3_client(bucket=src_bucket),
+                src_bucket,
+                src_key,
+                dst_bucket,
+                dst_key,
+                callback=callback,
+                max_workers=max_workers,
+                part_size=part_size)
+        else:
+            _stream_object(
+                get_s3_client(bucket=src_bucket),
+                src_bucket,
+                src_key,
+                get_s3_client(bucket=dst_bucket),
+                dst_bucket,
+                dst_key,
+                callback=callback,
+                max_workers=max_workers)
+        invalidate_metadata('s3://%s/%s' % (dst_bucket, dst_key))
     except Exception as error:
         error = translate_s3_error(error, dst_url)
         # Error can't help tell which is problematic
-        if isinstance(error, S3BucketNotFoundError):
+        if isinstance(error, (S3BucketNotFoundError, S3FileNotFoundError)):
             if not s3_hasbucket(src_url):
                 raise S3BucketNotFoundError('No such bucket: %r' % src_url)
-        elif isinstance(error, S3FileNotFoundError):
+        if isinstance(error, S3FileNotFoundError):
             if not s3_isfile(src_url):
                 if s3_isdir(src_url):
                     raise S3IsADirectoryError('Is a directory: %r' % src_url)
@@ -307,48 +623,62 @@ def s3_isdir(s3_url: MegfilePathLike) -> bool:
         return not key
 
     prefix = _become_prefix(key)
-    client = get_s3_client()
-    try:
-        resp = client.list_objects_v2(
-            Bucket=bucket, Prefix=prefix, Delimiter='/', MaxKeys=1)
-    except Exception as error:
-        error = translate_s3_error(error, s3_url)
-        if isinstance(error, (S3UnknownError, S3ConfigError)):
-            raise error
-        return False
 
-    if not key:  # bucket is accessible
-        return True
+    def load() -> bool:
+        client = get_s3_client(bucket=bucket)
+        try:
+            resp = client.list_objects_v2(
+                Bucket=bucket, Prefix=prefix, Delimiter='/', MaxKeys=1)
+        except Exception as error:
+            error = translate_s3_error(error, s3_url)
+            if isinstance(error, (S3UnknownError, S3ConfigError)):
+                raise error
+            return False
 
-    if 'KeyCount' in resp:
-        return resp['KeyCount'] > 0
+        if not key:  # bucket is accessible
+            return True
 
-    return len(resp.get('Contents', [])) > 0 or \
-        len(resp.get('CommonPrefixes', [])) > 0
+        if 'KeyCount' in resp:
+            return resp['KeyCount'] > 0
 
+        return len(resp.get('Contents', [])) > 0 or \
+            len(resp.get('CommonPrefixes', [])) > 0
 
-def s3_isfile(s3_url: MegfilePathLike) -> bool:
+    return cached_metadata(DIR, 's3://%s/%s' % (bucket, key), load)
+
+
+def _s3_head_object(s3_url: MegfilePathLike) -> Optional[dict]:
     '''
-    Test if an s3_url is file
+    Get response of head_object of s3_url, None if s3_url is not a file
 
-    :param s3_url: Path to be tested
-    :returns: True if path is s3 file, else False
+    :raises: S3UnknownError, S3ConfigError
     '''
     bucket, key = parse_s3_url(s3_url)
     if not bucket or not key or key.endswith('/'):
         # s3://, s3:///key, s3://bucket, s3://bucket/prefix/
-        return False
+        return None
 
-    client = get_s3_client()
-    try:
-        client.head_object(Bucket=bucket, Key=key)
-    except Exception as error:
-        error = translate_s3_error(error, s3_url)
-        if isinstance(error, (S3UnknownError, S3ConfigError)):
-            raise error
-        return False
+    def load() -> Optional[dict]:
+        client = get_s3_client(bucket=bucket)
+        try:
+            return client.head_object(Bucket=bucket, Key=key)
+        except Exception as error:
+            error = translate_s3_error(error, s3_url)
+            if isinstance(error, (S3UnknownError, S3ConfigError)):
+                raise error
+            return None
 
-    return True
+    return cached_metadata(HEAD, 's3://%s/%s' % (bucket, key), load)
+
+
+def s3_isfile(s3_url: MegfilePathLike) -> bool:
+    '''
+    Test if an s3_url is file
+
+    :param s3_url: Path to be tested
+    :returns: True if path is s3 file, else False
+    '''
+    return _s3_head_object(s3_url) is not None
 
 
 def s3_access(s3_url: MegfilePathLike, mode: Access = Access.READ) -> bool:
@@ -369,17 +699,32 @@ def s3_access(s3_url: MegfilePathLike, mode: Access = Access.READ) -> bool:
             .format(mode, ', '.join([str(a) for a in Access])))
     if mode not in (Access.READ, Access.WRITE):
         raise TypeError('Unsupported mode: {}'.format(mode))
-    client = get_s3_client()
-    try:
-        client.head_bucket(Bucket=bucket)
-    except Exception as error:
-        error = translate_s3_error(error, s3_url)
-        if isinstance(
-                error,
-            (S3PermissionError, S3FileNotFoundError, S3BucketNotFoundError)):
-            return False
-        raise error
-    return True
+    return _s3_bucket_status(s3_url) == BUCKET_OK
+
+
+def _s3_bucket_status(s3_url: MegfilePathLike) -> str:
+    '''
+    Get status of the bucket of s3_url by head_bucket, status is cached by bucket, see s3_set_bucket_cache_ttl
+
+    :returns: BUCKET_OK, BUCKET_MISSING or BUCKET_DENIED
+    :raises: S3UnknownError, S3ConfigError
+    '''
+    bucket, _ = parse_s3_url(s3_url)
+
+    def load() -> str:
+        client = get_s3_client(bucket=bucket)
+        try:
+            client.head_bucket(Bucket=bucket)
+        except Exception as error:
+            error = translate_s3_error(error, s3_url)
+            if isinstance(error, S3FileNotFoundError):
+                return BUCKET_MISSING
+            if isinstance(error, S3PermissionError):
+                return BUCKET_DENIED
+            raise error
+        return BUCKET_OK
+
+    return cached_bucket_status('s3://%s' % bucket, load)
 
 
 def s3_hasbucket(s3_url: MegfilePathLike) -> bool:
@@ -393,17 +738,71 @@ def s3_hasbucket(s3_url: MegfilePathLike) -> bool:
     if not bucket:
         return False
 
-    client = get_s3_client()
-    try:
-        client.head_bucket(Bucket=bucket)
-    except Exception as error:
-        error = translate_s3_error(error, s3_url)
-        if isinstance(error, (S3UnknownError, S3ConfigError)):
-            raise error
-        if isinstance(error, S3FileNotFoundError):
-            return False
+    # Bucket exists even if it is not accessible
+    return _s3_bucket_status(s3_url) != BUCKET_MISSING
+
+
+def s3_set_bucket_cache_ttl(ttl: float) -> None:
+    '''
+    Set ttl of bucket status cache of current process, status of buckets (exists, missing or not accessible) cached before are dropped
+
+    Bucket status cache is enabled by default, so that s3_hasbucket and s3_access, which are called on every file opened for writing and s3_makedirs,
+    send head_bucket once per bucket in ttl seconds. Bucket created or deleted by others may be visible after ttl.
+
+    :param ttl: Seconds before a cached status expires, 60 by default, 0 to disable the cache
+    '''
+    set_bucket_cache_ttl(ttl)
+
+
+def s3_enable_metadata_cache(
+        ttl: float = DEFAULT_METADATA_CACHE_TTL,
+        max_size: int = DEFAULT_METADATA_CACHE_SIZE) -> None:
+    '''
+    Enable metadata cache of s3 in current process, which is disabled by default
+
+    Results of s3_isfile, s3_isdir and s3_stat (of file) are cached for ttl seconds, including negative results,
+    so that functions calling them repeatedly for the same path, e.g. s3_stat, s3_remove, s3_scandir and s3_open, send one request instead of several.
+    Cached metadata of a path is invalidated when megfile writes or deletes it, changes made by others are visible after ttl at most.
+
+    :param ttl: Seconds before a cached entry expires, 60 by default
+    :param max_size: Max number of cached entries, 100000 by default
+    '''
+    enable_metadata_cache(ttl, max_size)
 
-    return True
+
+def s3_disable_metadata_cache() -> None:
+    '''Disable metadata cache of s3 in current process, cached entries are dropped'''
+    disable_metadata_cache()
+
+
+def s3_enable_metrics(*sinks: MetricsSink) -> None:
+    '''
+    Enable metrics of s3 in current process, which is disabled by default
+
+    Recorded metrics (see megfile.lib.s3_metrics), labeled by bucket:
+    requests, latency, sent / received bytes, retries and errors of every operation (e.g. GetObject, UploadPart),
+    block hits / misses / wasted prefetch of readers, and stall time of writers waiting for buffer.
+
+    :param sinks: Receivers of recorded values, e.g. MemorySink, PrometheusSink, StatsdSink, former sinks are replaced
+    '''
+    enable_metrics(*sinks)
+
+
+def s3_disable_metrics() -> None:
+    '''Disable metrics of s3 in current process'''
+    disable_metrics()
+
+
+def s3_set_global_buffer_size(max_bytes: Optional[int]) -> None:
+    '''
+    Bound memory of parts being uploaded by all writers in current process, e.g. opened by s3_buffered_open, which is unbounded by default
+
+    Every writer is bounded by its own max_buffer_size as well, writers block when either budget is used up, until parts of any writer are uploaded.
+    Only writers opened after the call share the budget.
+
+    :param max_bytes: Size of budget shared by writers, None to disable it
+    '''
+    set_global_buffer_size(max_bytes)
 
 
 def s3_exists(s3_url: MegfilePathLike) -> bool:
@@ -445,6 +844,143 @@ def _list_objects_recursive(
             MaxKeys=max_keys)
 
 
+# Partitions are expanded until there are max_workers * PARTITION_FACTOR of them, for load balance between workers
+PARTITION_FACTOR = 4
+# Max levels of directories expanded when looking for partitions
+PARTITION_MAX_DEPTH = 3
+# Directories of more pages are not expanded but listed as a whole partition, so that a flat prefix is streamed instead of loaded into memory
+PARTITION_MAX_PAGES = 4
+# Max pages listed ahead of the consumer for each partition (or for all partitions if not ordered, multiplied by max_workers)
+PARTITION_BUFFER_PAGES = 4
+
+
+def _list_directory(s3_client, bucket: str, prefix: str):
+    '''List one level of prefix, return contents and common prefixes, or None if it has more than PARTITION_MAX_PAGES pages'''
+    contents, prefixes = [], []
+    pages = 0
+    for resp in _list_objects_recursive(s3_client, bucket, prefix, '/'):
+        pages += 1
+        if resp['IsTruncated'] and pages >= PARTITION_MAX_PAGES:
+            return None
+        contents.extend(resp.get('Contents', []))
+        prefixes.extend(
+            common_prefix['Prefix']
+            for common_prefix in resp.get('CommonPrefixes', []))
+    return contents, prefixes
+
+
+def _list_partitions(
+        s3_client, executor: ThreadPoolExecutor, bucket: str, prefix: str,
+        min_partitions: int):
+    '''
+    Split prefix into partitions by common prefixes, directories are expanded level by level until there are min_partitions partitions.
+
+    Returns contents of files found in expanded directories, and partitions (common prefixes) which are not expanded yet, or too large to be expanded.
+    All keys of a partition share its prefix, so they are adjacent in alphabetical order, and partitions are ordered by their prefixes.
+    '''
+    contents, large_partitions, partitions = [], [], [prefix]
+    for _ in range(PARTITION_MAX_DEPTH):
+        if not partitions or len(large_partitions) + len(
+                partitions) >= min_partitions:
+            break
+        results = executor.map(
+            partial(_list_directory, s3_client, bucket), partitions)
+        expanded, partitions = partitions, []
+        for partition, result in zip(expanded, results):
+            if result is None:
+                large_partitions.append(partition)
+                continue
+            sub_contents, sub_prefixes = result
+            contents.extend(sub_contents)
+            partitions.extend(sub_prefixes)
+    return contents, large_partitions + partitions
+
+
+def _list_partition(
+        s3_client, bucket: str, prefix: str, output: Queue, stop: Event):
+    '''List partition into output page by page, None is put at the end, or error if listing failed, gives up when stop is set'''
+    if stop.is_set():
+        return
+    try:
+        for resp in _list_objects_recursive(s3_client, bucket, prefix):
+            if not put_unless_stopped(output, resp.get('Contents', []), stop):
+                return
+    except Exception as error:
+        put_unless_stopped(output, error, stop)
+        return
+    put_unless_stopped(output, None, stop)
+
+
+def _iter_partition(output: Queue) -> Iterator[List[dict]]:
+    while True:
+        contents = output.get()
+        if contents is None:
+            return
+        if isinstance(contents, Exception):
+            raise contents
+        yield contents
+
+
+def _list_objects_parallel(
+        s3_client, bucket: str, prefix: str, max_workers: int,
+        ordered: bool = True) -> Iterator[dict]:
+    '''
+    List all objects under prefix with max_workers threads, yield contents of objects.
+
+    Prefix is split into partitions by common prefixes, and partitions are listed concurrently.
+    If ordered, objects are yielded in alphabetical order, the partition being yielded and the following max_workers partitions are listed ahead.
+    Otherwise objects are yielded as soon as their pages are listed, which is faster when partitions are of uneven size.
+    Pages listed ahead of the consumer are bounded by PARTITION_BUFFER_PAGES, listing waits for the consumer.
+    '''
+    stop = Event()
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        contents, partitions = _list_partitions(
+            s3_client, executor, bucket, prefix, max_workers * PARTITION_FACTOR)
+
+        def submit(prefix: str, output: Queue) -> Queue:
+            executor.submit(
+                _list_partition, s3_client, bucket, prefix, output, stop)
+            return output
+
+        if not ordered:
+            yield from contents
+            output = Queue(max_workers * PARTITION_BUFFER_PAGES)
+            for partition in partitions:
+                submit(partition, output)
+            finished = 0
+            while finished < len(partitions):
+                page = output.get()
+                if page is None:
+                    finished += 1
+                elif isinstance(page, Exception):
+                    raise page
+                else:
+                    yield from page
+            return
+
+        items = [(content['Key'], content) for content in contents]
+        items.extend((partition, None) for partition in partitions)
+        items.sort(key=lambda item: item[0])
+        partitions = deque(key for key, content in items if content is None)
+        outputs = {}
+        for key, content in items:
+            if content is not None:
+                yield content
+                continue
+            # Keep max_workers partitions listed ahead
+            while partitions and len(outputs) <= max_workers:
+                partition = partitions.popleft()
+                outputs[partition] = submit(
+                    partition, Queue(PARTITION_BUFFER_PAGES))
+            for page in _iter_partition(outputs.pop(key)):
+                yield from page
+    finally:
+        # Workers give up when stop is set, they are not waited for, since generator may be closed (or collected) in any thread, even a worker
+        stop.set()
+        executor.shutdown(wait=False)
+
+
 def s3_scandir(s3_url: MegfilePathLike) -> Iterator[FileEntry]:
     '''
     Get all contents of given s3_url, the order of result is not guaranteed.
@@ -462,7 +998,7 @@ def s3_scandir(s3_url: MegfilePathLike) -> Iterator[FileEntry]:
     elif not s3_isdir(s3_url):
         raise S3FileNotFoundError('No such directory: %r' % s3_url)
     prefix = _become_prefix(key)
-    client = get_s3_client()
+    client = get_s3_client(bucket=bucket)
 
     # In order to do check on creation,
     # we need to wrap the iterator in another function
@@ -520,7 +1056,7 @@ def _s3_getdirstat(s3_dir_url: str) -> StatResult:
 
     bucket, key = parse_s3_url(s3_dir_url)
     prefix = _become_prefix(key)
-    client = get_s3_client()
+    client = get_s3_client(bucket=bucket)
     size = 0
     mtime = 0.0
     with raise_s3_error(s3_dir_url):
@@ -551,20 +1087,14 @@ def s3_stat(s3_url: MegfilePathLike) -> StatResult:
             raise UnsupportedError('Get stat of whole s3', s3_url)
         raise S3BucketNotFoundError('Empty bucket name: %r' % s3_url)
 
-    if not s3_isfile(s3_url):
+    content = _s3_head_object(s3_url)
+    if content is None:
         return _s3_getdirstat(s3_url)
 
-    if not key or key.endswith('/'):
-        raise S3FileNotFoundError('No such directory: %r' % s3_url)
-
-    client = get_s3_client()
-    with raise_s3_error(s3_url):
-        content = client.head_object(Bucket=bucket, Key=key)
-        stat_record = StatResult(
-            size=content['ContentLength'],
-            mtime=content['LastModified'].timestamp(),
-            extra=content)
-    return stat_record
+    return StatResult(
+        size=content['ContentLength'],
+        mtime=content['LastModified'].timestamp(),
+        extra=content)
 
 
 def s3_getsize(s3_url: MegfilePathLike) -> int:
@@ -596,15 +1126,54 @@ def s3_getmtime(s3_url: MegfilePathLike) -> float:
     return s3_stat(s3_url).mtime
 
 
+def _s3_stream_upload(
+        src: BinaryIO, client, dst_bucket: str, dst_key: str,
+        journal_path: Optional[str], callback: Optional[Callable[[int], None]],
+        metadata: Dict[str, str]) -> str:
+    '''
+    Upload src by parts, metadata is set when the multipart upload is created
+
+    If journal_path is given, committed parts of a resumed upload are skipped, they are only read for md5 but not uploaded again.
+    The upload is resumed only if metadata is unchanged, so a changed src (of another size or mtime) is uploaded from the beginning.
+
+    :returns: Md5 of src, computed while it's uploaded
+    '''
+    hash_md5 = hashlib.md5()
+    with S3BufferedWriter(dst_bucket, dst_key, s3_client=client,
+                          block_size=DEFAULT_BLOCK_SIZE, metadata=metadata,
+                          journal_path=journal_path) as writer:
+        offset = writer.skip_committed()
+        while src.tell() < offset:
+            chunk = src.read(min(DEFAULT_BLOCK_SIZE, offset - src.tell()))
+            if not chunk:
+                break
+            hash_md5.update(chunk)
+        if offset > 0 and callback is not None:
+            callback(offset)
+        for chunk in iter(lambda: src.read(DEFAULT_BLOCK_SIZE), b''):
+            hash_md5.update(chunk)
+            writer.write(chunk)
+            if callback is not None:
+                callback(len(chunk))
+    return hash_md5.hexdigest()
+
+
 def s3_upload(
         src_url: MegfilePathLike,
         dst_url: MegfilePathLike,
-        callback: Optional[Callable[[int], None]] = None) -> None:
+        callback: Optional[Callable[[int], None]] = None,
+        journal_path: Optional[str] = None) -> None:
     '''
     Uploads a file from local filesystem to s3.
+
+    Md5 of the file is saved in metadata as megfile-content-md5, and the file is read only once.
+    File not larger than a block is put by one request with its md5.
+    Larger file is uploaded by parts, md5 is computed while parts are read, and set by copying the object to itself with replaced metadata after upload.
+
     :param src_url: source fs path
     :param dst_url: target s3 path
     :param callback: Called periodically during copy, and the input parameter is the data size (in bytes) of copy since the last call
+    :param journal_path: Local path or s3 url of upload journal, None by default. If given, upload is resumable, parts uploaded by a failed s3_upload with the same journal_path are not uploaded again, see S3BufferedWriter
     '''
     dst_bucket, dst_key = parse_s3_url(dst_url)
     if not dst_bucket:
@@ -612,36 +1181,61 @@ def s3_upload(
     if not dst_key or dst_key.endswith('/'):
         raise S3IsADirectoryError('Is a directory: %r' % dst_url)
 
-    client = get_s3_client()
+    client = get_s3_client(bucket=dst_bucket)
     with open(src_url, 'rb') as src:
-        # TODO: when have the 2nd md5 use case, extract this.
-        hash_md5 = hashlib.md5()
-        for chunk in iter(lambda: src.read(4096), b''):
-            hash_md5.update(chunk)
-        md5 = hash_md5.hexdigest()
-        src.seek(0)
+        stat = os.fstat(src.fileno())
+        if stat.st_size <= DEFAULT_BLOCK_SIZE:
+            content = src.read()
+            with raise_s3_error(dst_url):
+                # TODO: better design for metadata scheme when we have another metadata field.
+                client.put_object(
+                    Bucket=dst_bucket,
+                    Key=dst_key,
+                    Body=content,
+                    Metadata={
+                        content_md5_header: hashlib.md5(content).hexdigest()
+                    })
+            invalidate_metadata('s3://%s/%s' % (dst_bucket, dst_key))
+            if callback is not None:
+                callback(len(content))
+            return
 
+        metadata = {
+            source_version_header: '%d-%d' % (stat.st_size, stat.st_mtime_ns)
+        }
         with raise_s3_error(dst_url):
-            # TODO: better design for metadata scheme when we have another metadata field.
-            client.upload_fileobj(
-                src,
-                Bucket=dst_bucket,
-                Key=dst_key,
-                ExtraArgs={'Metadata': {
-                    content_md5_header: md5,
-                }},
-                Callback=callback)
+            content_md5 = _s3_stream_upload(
+                src, client, dst_bucket, dst_key, journal_path, callback,
+                metadata)
+            # Object larger than max_copy_part_size is copied by parts
+            _copy_object(
+                client,
+                dst_bucket,
+                dst_key,
+                dst_bucket,
+                dst_key,
+                part_size=max_copy_part_size,
+                metadata={content_md5_header: content_md5})
+        invalidate_metadata('s3://%s/%s' % (dst_bucket, dst_key))
 
 
 def s3_download(
         src_url: MegfilePathLike,
         dst_url: MegfilePathLike,
-        callback: Optional[Callable[[int], None]] = None) -> None:
+        callback: Optional[Callable[[int], None]] = None,
+        max_workers: int = DEFAULT_DOWNLOAD_MAX_WORKERS,
+        range_size: int = DEFAULT_DOWNLOAD_RANGE_SIZE) -> None:
     '''
     Downloads a file from s3 to local filesystem.
+
+    File larger than range_size is downloaded by ranges in max_workers threads, completed ranges are recorded in a sidecar next to dst_url,
+    so that download again after interrupted only fetches missing ranges. S3FileChangedError is raised if the file is changed during download.
+
     :param src_url: source s3 path
     :param dst_url: target fs path
     :param callback: Called periodically during copy, and the input parameter is the data size (in bytes) of copy since the last call
+    :param max_workers: Number of ranges downloaded concurrently, 8 by default
+    :param range_size: Size of ranges, 16MB by default
     '''
     src_bucket, src_key = parse_s3_url(src_url)
     if not src_bucket:
@@ -657,24 +1251,162 @@ def s3_download(
     if dst_directory != '':
         os.makedirs(dst_directory, exist_ok=True)
 
-    client = get_s3_client()
+    downloader = S3RangeDownloader(
+        src_bucket,
+        src_key,
+        dst_url,
+        s3_client=get_s3_client(bucket=src_bucket),
+        max_workers=max_workers,
+        range_size=range_size,
+        max_retries=max_retries,
+        callback=callback)
     try:
-        client.download_file(src_bucket, src_key, dst_url, Callback=callback)
+        downloader.download()
     except Exception as error:
         error = translate_fs_error(error, dst_url)
         error = translate_s3_error(error, src_url)
-        if isinstance(error, S3FileNotFoundError) and s3_isdir(src_url):
-            raise S3IsADirectoryError('Is a directory: %r' % src_url)
+        if isinstance(error, S3FileNotFoundError) and \
+                not isinstance(error, S3BucketNotFoundError):
+            if not s3_hasbucket(src_url):
+                raise S3BucketNotFoundError('No such bucket: %r' % src_url)
+            if s3_isdir(src_url):
+                raise S3IsADirectoryError('Is a directory: %r' % src_url)
         raise error
 
 
-def s3_remove(s3_url: MegfilePathLike, missing_ok: bool = False) -> None:
+max_delete_keys = 1000  # Max number of keys in one delete_objects request
+# Error codes of keys in delete_objects response, which are retried
+delete_retry_codes = ('SlowDown', 'InternalError', 'ServiceUnavailable')
+
+S3RemoveFailure = NamedTuple(
+    'S3RemoveFailure', [('path', str), ('code', str), ('message', str)])
+
+
+class S3RemoveReport:
+    '''Result of s3_remove, number of deleted objects, and objects failed to be deleted'''
+
+    def __init__(self):
+        self.deleted = 0
+        self.failures = []  # type: List[S3RemoveFailure]
+
+    def __repr__(self) -> str:
+        return '%s(deleted=%d, failures=%d)' % (
+            type(self).__name__, self.deleted, len(self.failures))
+
+    def raise_for_failures(self) -> None:
+        '''Raise error of the first failure, if any object failed to be deleted
+
+        :raises: S3PermissionError, S3UnknownError
+        '''
+        if not self.failures:
+            return
+        failure = self.failures[0]
+        message = '%s, %d objects failed to be deleted' % (
+            failure.message, len(self.failures))
+        error = botocore.exceptions.ClientError(
+            {'Error': {
+                'Code': failure.code,
+                'Message': message
+            }}, 'DeleteObjects')
+        raise translate_s3_error(error, failure.path)
+
+
+def _delete_objects(s3_client, bucket: str,
+                    keys: List[str]) -> List[S3RemoveFailure]:
+    '''Delete keys by one delete_objects request, keys failed for throttling are retried, returns keys still failed'''
+    failures = []
+    for retries in range(1, max_retries + 1):
+        resp = s3_client.delete_objects(
+            Bucket=bucket,
+            Delete={
+                'Objects': [{
+                    'Key': key
+                } for key in keys],
+                'Quiet': True,
+            })
+        retry_keys = []
+        for error in resp.get('Errors', []):
+            if error.get('Code') in delete_retry_codes and \
+                    retries < max_retries:
+                retry_keys.append(error['Key'])
+                continue
+            failures.append(
+                S3RemoveFailure(
+                    s3_path_join('s3://', bucket, error['Key']),
+                    error.get('Code', ''), error.get('Message', '')))
+        if not retry_keys:
+            return failures
+        _logger.debug(
+            'retry deleting %d keys in bucket %r, with %d tries' %
+            (len(retry_keys), bucket, retries))
+        time.sleep(min(0.1 * 2**retries, 30))
+        keys = retry_keys
+
+
+def _iter_batches(iterable: Iterable, size: int) -> Iterator[list]:
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _remove_prefix(
+        s3_client, bucket: str, prefix: str,
+        max_workers: int) -> S3RemoveReport:
+    '''
+    Delete objects under prefix, listing is pipelined with deleting, at most 2 * max_workers delete_objects requests are in flight.
+    '''
+    report = S3RemoveReport()
+    if max_workers > 1:
+        contents = _list_objects_parallel(
+            s3_client, bucket, prefix, max_workers, ordered=False)
+    else:
+        contents = chain.from_iterable(
+            resp.get('Contents', [])
+            for resp in _list_objects_recursive(s3_client, bucket, prefix))
+    keys = (content['Key'] for content in contents)
+
+    def collect(num_keys: int, future: Future):
+        failures = future.result()
+        report.deleted += num_keys - len(failures)
+        report.failures.extend(failures)
+
+    futures = deque()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        try:
+            for batch in _iter_batches(keys, max_delete_keys):
+                if len(futures) >= max_workers * 2:
+                    collect(*futures.popleft())
+                futures.append(
+                    (
+                        len(batch),
+                        executor.submit(
+                            _delete_objects, s3_client, bucket, batch)))
+            while futures:
+                collect(*futures.popleft())
+        finally:
+            for _, future in futures:
+                future.cancel()
+    return report
+
+
+def s3_remove(
+        s3_url: MegfilePathLike,
+        missing_ok: bool = False,
+        max_workers: int = DEFAULT_MAX_WORKERS) -> S3RemoveReport:
     '''
     Remove the file or directory on s3, `s3://` and `s3://bucket` are not permitted to remove
 
+    Objects in directory are listed and deleted concurrently, by batches of 1000 keys, objects failed to be deleted for throttling are retried.
+    Objects still failed to be deleted (e.g. for permission) are reported in returned S3RemoveReport, instead of raising error.
+
     :param s3_url: Given path
     :param missing_ok: if False and target file/directory not exists, raise S3FileNotFoundError
+    :param max_workers: Number of threads listing and deleting concurrently, 16 by default
     :raises: S3PermissionError, S3FileNotFoundError, UnsupportedError
+    :returns: S3RemoveReport, number of deleted objects and failures
     '''
     bucket, key = parse_s3_url(s3_url)
     if not bucket:
@@ -685,19 +1417,22 @@ def s3_remove(s3_url: MegfilePathLike, missing_ok: bool = False) -> None:
         raise UnsupportedError('Remove bucket', s3_url)
     if not s3_exists(s3_url):
         if missing_ok:
-            return
+            return S3RemoveReport()
         raise S3FileNotFoundError('No such file or directory: %r' % s3_url)
 
-    client = get_s3_client()
+    client = get_s3_client(bucket=bucket)
     with raise_s3_error(s3_url):
         if s3_isfile(s3_url):
             client.delete_object(Bucket=bucket, Key=key)
-            return
-        prefix = _become_prefix(key)
-        for resp in _list_objects_recursive(client, bucket, prefix):
-            if 'Contents' in resp:
-                keys = [{'Key': content['Key']} for content in resp['Contents']]
-                client.delete_objects(Bucket=bucket, Delete={'Objects': keys})
+            invalidate_metadata('s3://%s/%s' % (bucket, key))
+            report = S3RemoveReport()
+            report.deleted = 1
+            return report
+        try:
+            return _remove_prefix(
+                client, bucket, _become_prefix(key), max_workers)
+        finally:
+            invalidate_metadata('s3://%s/%s' % (bucket, key), recursive=True)
 
 
 def s3_unlink(s3_url: MegfilePathLike, missing_ok: bool = False) -> None:
@@ -716,9 +1451,10 @@ def s3_unlink(s3_url: MegfilePathLike, missing_ok: bool = False) -> None:
             return
         raise S3FileNotFoundError('No such file: %r' % s3_url)
 
-    client = get_s3_client()
+    client = get_s3_client(bucket=bucket)
     with raise_s3_error(s3_url):
         client.delete_object(Bucket=bucket, Key=key)
+    invalidate_metadata('s3://%s/%s' % (bucket, key))
 
 
 def s3_makedirs(s3_url: MegfilePathLike, exist_ok: bool = False):
@@ -772,7 +1508,7 @@ def s3_walk(s3_url: MegfilePathLike
         return
 
     stack = [key]
-    client = get_s3_client()
+    client = get_s3_client(bucket=bucket)
     while len(stack) > 0:
         current = _become_prefix(stack.pop())
         dirs, files = [], []
@@ -791,7 +1527,11 @@ def s3_walk(s3_url: MegfilePathLike
         yield root, dirs, files
 
 
-def s3_scan(s3_url: MegfilePathLike, missing_ok: bool = True) -> Iterator[str]:
+def s3_scan(
+        s3_url: MegfilePathLike,
+        missing_ok: bool = True,
+        max_workers: Optional[int] = None,
+        ordered: bool = True) -> Iterator[str]:
     '''
     Iteratively traverse only files in given s3 directory, in alphabetical order.
     Every iteration on generator yields a path string.
@@ -804,10 +1544,13 @@ def s3_scan(s3_url: MegfilePathLike, missing_ok: bool = True) -> Iterator[str]:
 
     :param path: An s3 path
     :param missing_ok: If False and there's no file in the directory, raise FileNotFoundError
+    :param max_workers: Number of threads listing concurrently, see s3_scan_stat
+    :param ordered: If False, paths are not yielded in alphabetical order, see s3_scan_stat
     :raises: UnsupportedError
     :returns: A file path generator
     '''
-    scan_stat_iter = s3_scan_stat(s3_url)
+    scan_stat_iter = s3_scan_stat(
+        s3_url, max_workers=max_workers, ordered=ordered)
 
     def create_generator() -> Iterator[str]:
         for path, _ in scan_stat_iter:
@@ -816,14 +1559,22 @@ def s3_scan(s3_url: MegfilePathLike, missing_ok: bool = True) -> Iterator[str]:
     return create_generator()
 
 
-def s3_scan_stat(s3_url: MegfilePathLike,
-                 missing_ok: bool = True) -> Iterator[FileEntry]:
+def s3_scan_stat(
+        s3_url: MegfilePathLike,
+        missing_ok: bool = True,
+        max_workers: Optional[int] = None,
+        ordered: bool = True) -> Iterator[FileEntry]:
     '''
     Iteratively traverse only files in given directory, in alphabetical order.
     Every iteration on generator yields a tuple of path string and file stat
 
+    If max_workers is given, the directory is split into partitions by its subdirectories, and partitions are listed by max_workers threads concurrently.
+    Listing is faster for directories with many subdirectories, but files directly in one directory are still listed serially.
+
     :param path: Given s3_url
     :param missing_ok: If False and there's no file in the directory, raise FileNotFoundError
+    :param max_workers: Number of threads listing concurrently, None by default, which means listing serially
+    :param ordered: If False and max_workers is given, files are yielded as soon as they are listed, instead of in alphabetical order
     :raises: UnsupportedError
     :returns: A file path generator
     '''
@@ -842,12 +1593,18 @@ def s3_scan_stat(s3_url: MegfilePathLike,
             yield FileEntry(fspath(s3_url), s3_stat(s3_url))
 
         prefix = _become_prefix(key)
-        client = get_s3_client()
+        client = get_s3_client(bucket=bucket)
         with raise_s3_error(s3_url):
-            for resp in _list_objects_recursive(client, bucket, prefix):
-                for content in resp.get('Contents', []):
-                    full_path = s3_path_join('s3://', bucket, content['Key'])
-                    yield FileEntry(full_path, _make_stat(content))
+            if max_workers is not None and max_workers > 1:
+                contents = _list_objects_parallel(
+                    client, bucket, prefix, max_workers, ordered)
+            else:
+                contents = chain.from_iterable(
+                    resp.get('Contents', [])
+                    for resp in _list_objects_recursive(client, bucket, prefix))
+            for content in contents:
+                full_path = s3_path_join('s3://', bucket, content['Key'])
+                yield FileEntry(full_path, _make_stat(content))
 
     return _create_missing_ok_generator(
         create_generator(), missing_ok,
@@ -993,7 +1750,7 @@ def _s3_glob_stat_single_path(
         pattern = re.compile(translate(_s3_pathname))
         bucket, key = parse_s3_url(top_dir)
         prefix = _become_prefix(key)
-        client = get_s3_client()
+        client = get_s3_client(bucket=bucket)
         with raise_s3_error(_s3_pathname):
             for resp in _list_objects_recursive(client, bucket, prefix,
                                                 delimiter):
@@ -1095,9 +1852,9 @@ def s3_save_as(file_object: BinaryIO, s3_url: MegfilePathLike) -> None:
     if not key or key.endswith('/'):
         raise S3IsADirectoryError('Is a directory: %r' % s3_url)
 
-    client = get_s3_client()
+    client = get_s3_client(bucket=bucket)
     with raise_s3_error(s3_url):
-        client.upload_fileobj(file_object, Bucket=bucket, Key=key)
+        upload_fileobj(file_object, bucket, key, s3_client=client)
 
 
 def s3_load_from(s3_url: MegfilePathLike) -> BinaryIO:
@@ -1115,7 +1872,7 @@ def s3_load_from(s3_url: MegfilePathLike) -> BinaryIO:
         raise S3IsADirectoryError('Is a directory: %r' % s3_url)
 
     buffer = io.BytesIO()
-    client = get_s3_client()
+    client = get_s3_client(bucket=bucket)
     with raise_s3_error(s3_url):
         client.download_fileobj(bucket, key, buffer)
     buffer.seek(0)
@@ -1141,6 +1898,8 @@ def _s3_binary_mode(s3_open_func):
         if 'w' in mode or 'a' in mode:
             if not s3_hasbucket(s3_url):
                 raise S3BucketNotFoundError('No such bucket: %r' % s3_url)
+            # Writers invalidate metadata again after file is written
+            invalidate_metadata('s3://%s/%s' % (bucket, key))
 
         fileobj = s3_open_func(s3_url, get_binary_mode(mode), **kwargs)
         if 'b' not in mode:
@@ -1151,13 +1910,31 @@ def _s3_binary_mode(s3_open_func):
     return wrapper
 
 
+def _get_block_cache(cache_dir: Optional[str], cache_size: int):
+    if cache_dir is None:
+        return None
+    return get_file_block_cache(cache_dir, cache_size)
+
+
+def _get_content_info(stat: Optional[StatResult]
+                     ) -> Tuple[Optional[int], Optional[str]]:
+    '''Get size and etag of file from StatResult of s3_stat / s3_scan_stat'''
+    if stat is None:
+        return None, None
+    return stat.size, (stat.extra or {}).get('ETag')
+
+
 @_s3_binary_mode
 def s3_prefetch_open(
         s3_url: MegfilePathLike,
         mode: str = 'rb',
         *,
         max_concurrency: Optional[int] = None,
-        max_block_size: int = DEFAULT_BLOCK_SIZE) -> S3PrefetchReader:
+        max_block_size: int = DEFAULT_BLOCK_SIZE,
+        block_cache_dir: Optional[str] = None,
+        block_cache_size: int = DEFAULT_BLOCK_CACHE_SIZE,
+        auto_tune: bool = False,
+        stat: Optional[StatResult] = None) -> S3PrefetchReader:
     '''Open a asynchronous prefetch reader, to support fast sequential read and random read
 
     .. note ::
@@ -1170,6 +1947,10 @@ def s3_prefetch_open(
 
     :param max_concurrency: Max download thread number, None by default
     :param max_block_size: Max data size downloaded by each thread, in bytes, 8MB by default
+    :param block_cache_dir: Directory of on-disk block cache, e.g. on a NVMe disk. Downloaded blocks are kept there and reused by later opens of the same file (with the same etag) and the same block size. None by default, which means no disk cache
+    :param block_cache_size: Max total size of on-disk block cache, in bytes, 16GB by default
+    :param auto_tune: If True, block size is tuned between 1MB and 64MB according to measured latency and bandwidth, and max_block_size * 16 is kept as memory ceiling
+    :param stat: StatResult of file if known, e.g. from s3_scan_stat, then no HEAD request is needed to open the file
     :returns: An opened S3PrefetchReader object
     :raises: S3FileNotFoundError
     '''
@@ -1177,15 +1958,19 @@ def s3_prefetch_open(
         raise ValueError('unacceptable mode: %r' % mode)
 
     bucket, key = parse_s3_url(s3_url)
-    config = botocore.config.Config(max_pool_connections=max_pool_connections)
-    client = get_s3_client(config=config, cache_key='s3_filelike_client')
+    client = get_s3_client(bucket=bucket)
+    content_size, content_etag = _get_content_info(stat)
     return S3PrefetchReader(
         bucket,
         key,
         s3_client=client,
         max_retries=max_retries,
         max_workers=max_concurrency,
-        block_size=max_block_size)
+        block_size=max_block_size,
+        block_cache=_get_block_cache(block_cache_dir, block_cache_size),
+        auto_tune=auto_tune,
+        content_size=content_size,
+        content_etag=content_etag)
 
 
 @_s3_binary_mode
@@ -1195,7 +1980,11 @@ def s3_share_cache_open(
         *,
         cache_key: str = 'lru',
         max_concurrency: Optional[int] = None,
-        max_block_size: int = DEFAULT_BLOCK_SIZE) -> S3ShareCacheReader:
+        max_block_size: int = DEFAULT_BLOCK_SIZE,
+        shm_cache: bool = False,
+        shm_cache_dir: Optional[str] = None,
+        shm_cache_size: int = DEFAULT_SHM_CACHE_SIZE,
+        stat: Optional[StatResult] = None) -> S3ShareCacheReader:
     '''Open a asynchronous prefetch reader, to support fast sequential read and random read
 
     .. note ::
@@ -1208,6 +1997,10 @@ def s3_share_cache_open(
 
     :param max_concurrency: Max download thread number, None by default
     :param max_block_size: Max data size downloaded by each thread, in bytes, 8MB by default
+    :param shm_cache: If True, downloaded blocks are cached in shared memory, and shared by all processes on the node using the same max_block_size, e.g. DataLoader workers
+    :param shm_cache_dir: Directory of shared memory cache, a tmpfs directory is recommended, /dev/shm/megfile by default
+    :param shm_cache_size: Max total size of shared memory cache, in bytes, 1GB by default
+    :param stat: StatResult of file if known, e.g. from s3_scan_stat, then no HEAD request is needed to open the file
     :returns: An opened S3ShareCacheReader object
     :raises: S3FileNotFoundError
     '''
@@ -1215,8 +2008,12 @@ def s3_share_cache_open(
         raise ValueError('unacceptable mode: %r' % mode)
 
     bucket, key = parse_s3_url(s3_url)
-    config = botocore.config.Config(max_pool_connections=max_pool_connections)
-    client = get_s3_client(config=config, cache_key='s3_filelike_client')
+    client = get_s3_client(bucket=bucket)
+    if shm_cache:
+        block_cache = get_shm_block_cache(shm_cache_dir, shm_cache_size)
+    else:
+        block_cache = None
+    content_size, content_etag = _get_content_info(stat)
     return S3ShareCacheReader(
         bucket,
         key,
@@ -1224,13 +2021,20 @@ def s3_share_cache_open(
         s3_client=client,
         max_retries=max_retries,
         max_workers=max_concurrency,
-        block_size=max_block_size)
+        block_size=max_block_size,
+        shm_cache=block_cache,
+        content_size=content_size,
+        content_etag=content_etag)
 
 
 @_s3_binary_mode
 def s3_pipe_open(
-        s3_url: MegfilePathLike, mode: str, *,
-        join_thread: bool = True) -> S3PipeHandler:
+        s3_url: MegfilePathLike,
+        mode: str,
+        *,
+        join_thread: bool = True,
+        block_size: int = DEFAULT_BLOCK_SIZE,
+        max_concurrency: int = DEFAULT_PIPE_MAX_WORKERS) -> S3PipeHandler:
     '''Open a asynchronous read-write reader / writer, to support fast sequential read / write
 
     .. note ::
@@ -1243,21 +2047,37 @@ def s3_pipe_open(
         False doesn't affect read-handle, but this can speed up write-handle because file will be written asynchronously.
         But asynchronous behaviour can guarantee the file are successfully written, and frequent execution may cause thread and file handle exhaustion
 
+        Read-handle downloads ranges of block_size concurrently and reads them in order, it's for single-pass sequential reading, and doesn't support seek
+
     :param mode: Mode to open file, either "rb" or "wb"
     :param join_thread: If wait after function execution until s3 finishes writing
+    :param block_size: Size of ranges downloaded by read-handle
+    :param max_concurrency: Max number of ranges downloaded concurrently by read-handle
     :returns: An opened BufferedReader / BufferedWriter object
     '''
     if mode not in ('rb', 'wb'):
         raise ValueError('unacceptable mode: %r' % mode)
 
-    if mode[0] == 'r' and not s3_isfile(s3_url):
-        raise S3FileNotFoundError('No such file: %r' % s3_url)
+    content_size, content_etag = None, None
+    if mode[0] == 'r':
+        # Response of HEAD is passed to read-handle, so that it's not requested again
+        resp = _s3_head_object(s3_url)
+        if resp is None:
+            raise S3FileNotFoundError('No such file: %r' % s3_url)
+        content_size, content_etag = resp['ContentLength'], resp['ETag']
 
     bucket, key = parse_s3_url(s3_url)
-    config = botocore.config.Config(max_pool_connections=max_pool_connections)
-    client = get_s3_client(config=config, cache_key='s3_filelike_client')
+    client = get_s3_client(bucket=bucket)
     return S3PipeHandler(
-        bucket, key, mode, s3_client=client, join_thread=join_thread)
+        bucket,
+        key,
+        mode,
+        s3_client=client,
+        join_thread=join_thread,
+        block_size=block_size,
+        max_workers=max_concurrency,
+        content_size=content_size,
+        content_etag=content_etag)
 
 
 @_s3_binary_mode
@@ -1282,8 +2102,7 @@ def s3_cached_open(
         raise ValueError('unacceptable mode: %r' % mode)
 
     bucket, key = parse_s3_url(s3_url)
-    config = botocore.config.Config(max_pool_connections=max_pool_connections)
-    client = get_s3_client(config=config, cache_key='s3_filelike_client')
+    client = get_s3_client(bucket=bucket)
     return S3CachedHandler(
         bucket, key, mode, s3_client=client, cache_path=cache_path)
 
@@ -1299,7 +2118,12 @@ def s3_buffered_open(
         block_size: int = DEFAULT_BLOCK_SIZE,
         limited_seekable: bool = False,
         buffered: bool = True,
-        share_cache_key: Optional[str] = None
+        share_cache_key: Optional[str] = None,
+        block_cache_dir: Optional[str] = None,
+        block_cache_size: int = DEFAULT_BLOCK_CACHE_SIZE,
+        auto_tune: bool = False,
+        journal_path: Optional[str] = None,
+        size_hint: Optional[int] = None
 ) -> Union[S3PrefetchReader, S3BufferedWriter, io.BufferedReader, io.
            BufferedWriter]:
     '''Open an asynchronous prefetch reader, to support fast sequential read
@@ -1316,15 +2140,21 @@ def s3_buffered_open(
     :param max_buffer_size: Max cached buffer size in memory, 128MB by default
     :param block_size: Size of single block, 8MB by default. Each block will be uploaded or downloaded by single thread.
     :param limited_seekable: If write-handle supports limited seek (both file head part and tail part can seek block_size). Notes：This parameter are valid only for write-handle. Read-handle support arbitrary seek
+    :param block_cache_dir: Directory of on-disk block cache for read-handle, None by default, which means no disk cache
+    :param block_cache_size: Max total size of on-disk block cache, in bytes, 16GB by default
+    :param auto_tune: If True, block size of read-handle is tuned between 1MB and 64MB according to measured latency and bandwidth, and max_buffer_size is kept as memory ceiling
+    :param journal_path: Local path or s3 url of upload journal for write-handle, None by default. If given, upload is resumable, see S3BufferedWriter. Notes: This parameter can't be used with limited_seekable
+    :param size_hint: Expected size of file for write-handle, None by default. If given, part size is chosen to upload the file in at most 10000 parts
     :returns: An opened S3PrefetchReader object
     :raises: S3FileNotFoundError
     '''
     if mode not in ('rb', 'wb'):
         raise ValueError('unacceptable mode: %r' % mode)
+    if limited_seekable and journal_path is not None:
+        raise ValueError('limited_seekable writer is not resumable')
 
     bucket, key = parse_s3_url(s3_url)
-    config = botocore.config.Config(max_pool_connections=max_pool_connections)
-    client = get_s3_client(config=config, cache_key='s3_filelike_client')
+    client = get_s3_client(bucket=bucket)
     if mode == 'rb':
         # A rough conversion algorithm to align 2 types of Reader / Writer paremeters
         # TODO: Optimize the conversion algorithm
@@ -1352,7 +2182,9 @@ def s3_buffered_open(
                 max_workers=max_concurrency,
                 block_capacity=block_capacity,
                 block_forward=block_forward,
-                block_size=block_size)
+                block_size=block_size,
+                block_cache=_get_block_cache(block_cache_dir, block_cache_size),
+                auto_tune=auto_tune)
         if buffered:
             reader = io.BufferedReader(reader)  # pytype: disable=wrong-arg-types
         return reader
@@ -1364,7 +2196,8 @@ def s3_buffered_open(
             s3_client=client,
             max_workers=max_concurrency,
             max_buffer_size=max_buffer_size,
-            block_size=block_size)
+            block_size=block_size,
+            size_hint=size_hint)
     else:
         writer = S3BufferedWriter(
             bucket,
@@ -1372,8 +2205,11 @@ def s3_buffered_open(
             s3_client=client,
             max_workers=max_concurrency,
             max_buffer_size=max_buffer_size,
-            block_size=block_size)
-    if buffered:
+            block_size=block_size,
+            journal_path=journal_path,
+            size_hint=size_hint)
+    # BufferedWriter closes raw writer on error, which completes a resumable upload with partial content
+    if buffered and journal_path is None:
         writer = io.BufferedWriter(writer)  # pytype: disable=wrong-arg-types
     return writer
 
@@ -1394,16 +2230,14 @@ def s3_memory_open(s3_url: MegfilePathLike, mode: str) -> BinaryIO:
     buffer = io.BytesIO()
     close_buffer = buffer.close
     bucket, key = parse_s3_url(s3_url)
-    config = botocore.config.Config(max_pool_connections=max_pool_connections)
-    client = get_s3_client(config=config, cache_key='s3_filelike_client')
+    client = get_s3_client(bucket=bucket)
 
     def close():
         try:
             buffer.seek(0)
-            # File-like objects are closed after uploading
-            # https://github.com/boto/s3transfer/issues/80
+            # Content is uploaded only once, even if close() is called again
             buffer.close = close_buffer
-            client.upload_fileobj(buffer, bucket, key)
+            upload_fileobj(buffer, bucket, key, s3_client=client)
         except Exception as error:
             raise translate_s3_error(error, s3_url)
         finally:
@@ -1473,7 +2307,7 @@ def s3_getmd5(s3_url: MegfilePathLike) -> Optional[str]:
     if not key or key.endswith('/'):
         raise S3IsADirectoryError('Is a directory: %r' % s3_url)
 
-    client = get_s3_client()
+    client = get_s3_client(bucket=bucket)
     with raise_s3_error(s3_url):
         resp = client.head_object(Bucket=bucket, Key=key)
     # boto3 does not lower the key of metadata
@@ -1485,21 +2319,57 @@ def s3_getmd5(s3_url: MegfilePathLike) -> Optional[str]:
     return None
 
 
+def _range_needs_size(start: Optional[int], stop: Optional[int]) -> bool:
+    # Without stop, ranges relative to end of file are sent as suffix range
+    return stop is not None and ((start or 0) < 0 or stop < 0)
+
+
+def _get_range_str(
+        start: Optional[int], stop: Optional[int],
+        size: Optional[int] = None) -> Optional[str]:
+    '''Get Range header of [start, stop), returns None if range is empty'''
+    if start is None:
+        start = 0
+    if size is not None:
+        start, stop = get_content_offset(start, stop, size)
+    elif stop is not None and stop < start:
+        raise ValueError('read length must be positive')
+
+    if stop is None:
+        if start < 0:
+            return 'bytes=%d' % start  # Suffix range, last -start bytes
+        return 'bytes=%d-' % start
+    if stop == start:
+        return None
+    return 'bytes=%d-%d' % (start, stop - 1)
+
+
 def s3_load_content(
-        s3_url, start: Optional[int] = None,
-        stop: Optional[int] = None) -> bytes:
+        s3_url,
+        start: Optional[int] = None,
+        stop: Optional[int] = None,
+        size: Optional[int] = None) -> bytes:
     '''
     Get specified file from [start, stop) in bytes
 
+    Content is downloaded by a single ranged GET, file size is requested only if start or stop is negative and stop is given
+
     :param s3_url: Specified path
     :param start: start index
     :param stop: stop index
+    :param size: file size if known, e.g. from s3_scan_stat, then no HEAD request is needed at all
     :returns: bytes content in range [start, stop)
     '''
 
-    def _get_object(client, buckey, key, range_str):
-        return client.get_object(
-            Bucket=bucket, Key=key, Range=range_str)['Body'].read()
+    def _get_object(client, bucket, key, range_str):
+        try:
+            return client.get_object(
+                Bucket=bucket, Key=key, Range=range_str)['Body'].read()
+        except botocore.exceptions.ClientError as error:
+            # Range starts beyond end of file
+            if client_error_code(error) in ('416', 'InvalidRange'):
+                return b''
+            raise
 
     bucket, key = parse_s3_url(s3_url)
     if not bucket:
@@ -1507,10 +2377,13 @@ def s3_load_content(
     if not key or key.endswith('/'):
         raise S3IsADirectoryError('Is a directory: %r' % s3_url)
 
-    start, stop = get_content_offset(start, stop, s3_getsize(s3_url))
-    range_str = 'bytes=%d-%d' % (start, stop - 1)
+    if size is None and _range_needs_size(start, stop):
+        size = s3_getsize(s3_url)
+    range_str = _get_range_str(start, stop, size)
+    if range_str is None:
+        return b''
 
-    client = get_s3_client()
+    client = get_s3_client(bucket=bucket)
     with raise_s3_error(s3_url):
         return patch_method(
             _get_object,
@@ -1519,26 +2392,69 @@ def s3_load_content(
         )(client, bucket, key, range_str)
 
 
+def s3_load_ranges(
+        s3_url: MegfilePathLike,
+        ranges: List[Tuple[Optional[int], Optional[int]]]) -> List[memoryview]:
+    '''
+    Get specified ranges [start, stop) of file concurrently, nearby ranges are merged into one request
+
+    :param s3_url: Specified path
+    :param ranges: list of (start, stop), start and stop can be None or negative, like slice, file size is requested only if any stop is None or any of them is negative
+    :returns: memoryview of each range, in the order of ranges
+    '''
+    bucket, key = parse_s3_url(s3_url)
+    if not bucket:
+        raise S3BucketNotFoundError('Empty bucket name: %r' % s3_url)
+    if not key or key.endswith('/'):
+        raise S3IsADirectoryError('Is a directory: %r' % s3_url)
+
+    # File size is only needed by ranges relative to end of file, start of None is 0
+    size = None
+    ranges = [(0 if start is None else start, stop) for start, stop in ranges]
+    if any(start < 0 or stop is None or stop < 0 for start, stop in ranges):
+        size = s3_getsize(s3_url)
+        ranges = [
+            get_content_offset(start, stop, size) for start, stop in ranges
+        ]
+    for start, stop in ranges:
+        if stop < start:
+            raise ValueError('read length must be positive')
+
+    return read_ranges(
+        get_s3_client(bucket=bucket),
+        bucket,
+        key,
+        ranges,
+        executor=get_global_executor(),
+        size=size,
+        max_retries=max_retries)
+
+
 def s3_rename(src_url: MegfilePathLike, dst_url: MegfilePathLike) -> None:
     '''
     Move s3 file path from src_url to dst_url
 
     :param src_url: Given source path
     :param dst_url: Given destination path
+    :raises: S3PermissionError, S3UnknownError, if source failed to be removed
     '''
     s3_copy(src_url, dst_url)
-    s3_remove(src_url)
+    s3_remove(src_url).raise_for_failures()
+
+
+def _s3_dst_path(
+        src_url: MegfilePathLike, dst_url: MegfilePathLike,
+        src_file_path: str) -> MegfilePathLike:
+    content_path = src_file_path[len(src_url):]
+    if len(content_path) > 0:
+        return s3_path_join(dst_url, content_path)
+    return dst_url
 
 
 def _s3_scan_pairs(src_url: MegfilePathLike, dst_url: MegfilePathLike
                   ) -> Iterator[Tuple[MegfilePathLike, MegfilePathLike]]:
     for src_file_path in s3_scan(src_url):
-        content_path = src_file_path[len(src_url):]
-        if len(content_path) > 0:
-            dst_file_path = s3_path_join(dst_url, content_path)
-        else:
-            dst_file_path = dst_url
-        yield src_file_path, dst_file_path
+        yield src_file_path, _s3_dst_path(src_url, dst_url, src_file_path)
 
 
 def s3_move(src_url: MegfilePathLike, dst_url: MegfilePathLike) -> None:
@@ -1547,20 +2463,39 @@ def s3_move(src_url: MegfilePathLike, dst_url: MegfilePathLike) -> None:
 
     :param src_url: Given source path
     :param dst_url: Given destination path
+    :raises: S3PermissionError, S3UnknownError, if any source file failed to be removed
     '''
     for src_file_path, dst_file_path in _s3_scan_pairs(src_url, dst_url):
         s3_rename(src_file_path, dst_file_path)
 
 
-def s3_sync(src_url: MegfilePathLike, dst_url: MegfilePathLike) -> None:
+def s3_sync(
+        src_url: MegfilePathLike,
+        dst_url: MegfilePathLike,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        progress_callback: Optional[Callable[[TransferProgress], None]] = None
+) -> None:
     '''
     Copy file/directory on src_url to dst_url
 
+    Files are copied by max_workers threads concurrently, while src_url is still being listed by max_workers threads
+
     :param src_url: Given source path
     :param dst_url: Given destination path
+    :param max_workers: Number of files copied concurrently, 16 by default
+    :param progress_callback: Called periodically during sync, and the input parameter is TransferProgress, aggregate progress of all files
     '''
-    for src_file_path, dst_file_path in _s3_scan_pairs(src_url, dst_url):
-        s3_copy(src_file_path, dst_file_path)
+
+    def create_tasks():
+        scan_stat_iter = s3_scan_stat(
+            src_url, max_workers=max_workers, ordered=False)
+        for src_file_path, stat in scan_stat_iter:
+            dst_file_path = _s3_dst_path(src_url, dst_url, src_file_path)
+            yield src_file_path, dst_file_path, stat.size
+
+    TransferEngine(
+        s3_copy, max_workers=max_workers,
+        progress_callback=progress_callback).run(create_tasks())
 
 
 class S3Cacher(FileCacher):
@@ -0,0 +1,285 @@
+import asyncio
+import inspect
+from collections import deque
+from typing import AsyncIterator, Optional, Union
+from weakref import WeakKeyDictionary
+
+from botocore.exceptions import ClientError
+
+from megfile.errors import S3BucketNotFoundError, S3FileNotFoundError, S3IsADirectoryError, UnsupportedError, client_error_code, patch_async_method, raise_s3_error, s3_should_retry
+from megfile.interfaces import FileEntry, MegfilePathLike, StatResult
+from megfile.lib.compat import fspath
+from megfile.lib.s3_async_buffered_writer import AsyncS3BufferedWriter
+from megfile.lib.s3_async_prefetch_reader import AsyncS3PrefetchReader
+from megfile.lib.s3_buffered_writer import DEFAULT_MAX_BUFFER_SIZE
+from megfile.lib.s3_client_registry import config_key
+from megfile.lib.s3_prefetch_reader import DEFAULT_BLOCK_SIZE
+from megfile.s3 import S3Route, _become_prefix, _get_content_info, _get_range_str, _make_stat, _range_needs_size, get_endpoint_url, get_s3_route, max_keys, max_retries, parse_s3_url, s3_path_join
+
+__all__ = [
+    'get_async_s3_client',
+    'close_async_s3_client',
+    'async_s3_load_content',
+    'async_s3_scan_stat',
+    'async_s3_open',
+]
+
+max_async_pool_connections = 128
+
+# Event loop -> {(endpoint_url, profile_name, config_key(config)): (client context, client)}, clients are bound to the loop they are created on
+_async_clients = WeakKeyDictionary()
+
+
+def _import_aiobotocore():
+    try:
+        import aiobotocore.config  # pytype: disable=import-error
+        import aiobotocore.session  # pytype: disable=import-error
+    except ImportError:  # pragma: no cover
+        raise ImportError(
+            inspect.cleandoc(
+                '''
+                Failed to import aiobotocore, which is required by async api of megfile, install it by:
+
+                    pip3 install "megfile[async]"
+                '''))
+    return aiobotocore
+
+
+def _async_should_retry(error: Exception) -> bool:
+    if s3_should_retry(error) or isinstance(error, asyncio.TimeoutError):
+        return True
+    try:
+        import aiohttp  # pytype: disable=import-error
+    except ImportError:  # pragma: no cover
+        return False
+    # e.g. connection reset while reading the body
+    return isinstance(
+        error, (aiohttp.ClientPayloadError, aiohttp.ClientConnectionError))
+
+
+async def get_async_s3_client(bucket: Optional[str] = None):
+    '''Get aiobotocore S3 client of the current event loop
+
+    The client is shared by all coroutines on the loop, so that connections are pooled and reused.
+    Like get_s3_client, endpoint / profile / config of the route of bucket are used, see s3_add_route, and buckets of the same route share a client.
+
+    :param bucket: Bucket to be accessed by client
+    returns: S3 client
+    '''
+    route = get_s3_route(bucket) if bucket else S3Route()
+    endpoint_url = route.endpoint_url or get_endpoint_url()
+    key = (endpoint_url, route.profile_name, config_key(route.config))
+    clients = _async_clients.setdefault(asyncio.get_event_loop(), {})
+    if key not in clients:
+        aiobotocore = _import_aiobotocore()
+        config = route.config
+        if not isinstance(config, aiobotocore.config.AioConfig):
+            default_config = aiobotocore.config.AioConfig(
+                max_pool_connections=max_async_pool_connections)
+            config = default_config if config is None else default_config.merge(
+                config)
+        context = aiobotocore.session.AioSession(
+            profile=route.profile_name).create_client(
+                's3', endpoint_url=endpoint_url, config=config)
+        client = await context.__aenter__()
+        if key in clients:  # Created by another coroutine meanwhile
+            await context.__aexit__(None, None, None)
+        else:
+            clients[key] = (context, client)
+    return clients[key][1]
+
+
+async def close_async_s3_client():
+    '''Close S3 clients of the current event loop, and their pooled connections'''
+    clients = _async_clients.pop(asyncio.get_event_loop(), {})
+    for context, _ in clients.values():
+        await context.__aexit__(None, None, None)
+
+
+async def async_s3_load_content(
+        s3_url: MegfilePathLike,
+        start: Optional[int] = None,
+        stop: Optional[int] = None,
+        size: Optional[int] = None) -> bytes:
+    '''
+    Get specified file from [start, stop) in bytes, asyncio version of s3_load_content
+
+    :param s3_url: Specified path
+    :param start: start index
+    :param stop: stop index
+    :param size: file size if known, e.g. from async_s3_scan_stat, then no HEAD request is needed at all
+    :returns: bytes content in range [start, stop)
+    '''
+
+    async def get_object(client, bucket, key, range_str):
+        try:
+            resp = await client.get_object(
+                Bucket=bucket, Key=key, Range=range_str)
+        except ClientError as error:
+            # Range starts beyond end of file
+            if client_error_code(error) in ('416', 'InvalidRange'):
+                return b''
+            raise
+        body = resp['Body']
+        try:
+            return await body.read()
+        finally:
+            body.close()
+
+    bucket, key = parse_s3_url(s3_url)
+    if not bucket:
+        raise S3BucketNotFoundError('Empty bucket name: %r' % s3_url)
+    if not key or key.endswith('/'):
+        raise S3IsADirectoryError('Is a directory: %r' % s3_url)
+
+    client = await get_async_s3_client(bucket)
+    if size is None and _range_needs_size(start, stop):
+        with raise_s3_error(s3_url):
+            resp = await client.head_object(Bucket=bucket, Key=key)
+        size = resp['ContentLength']
+    range_str = _get_range_str(start, stop, size)
+    if range_str is None:
+        return b''
+    with raise_s3_error(s3_url):
+        return await patch_async_method(
+            get_object,
+            max_retries=max_retries,
+            should_retry=_async_should_retry,
+        )(client, bucket, key, range_str)
+
+
+class _AsyncScanStatIterator:
+    '''
+    Async iterator of async_s3_scan_stat, files are listed page by page when entries of the former page are consumed
+
+    It's not an async generator, which is not supported by python 3.5
+    '''
+
+    def __init__(self, s3_url: MegfilePathLike, missing_ok: bool):
+        self._s3_url = s3_url
+        self._missing_ok = missing_ok
+        self._bucket, self._key = parse_s3_url(s3_url)
+        self._client = None
+        self._params = None  # Params of the next page, None if all pages are listed
+        self._entries = deque()
+        self._found = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> FileEntry:
+        while len(self._entries) == 0:
+            if self._client is not None and self._params is None:
+                if not self._found and not self._missing_ok:
+                    self._missing_ok = True  # Raise only once
+                    raise S3FileNotFoundError(
+                        'No match file: %r' % self._s3_url)
+                raise StopAsyncIteration
+            if self._client is None:
+                if not self._bucket:
+                    raise UnsupportedError('Scan whole s3', self._s3_url)
+                with raise_s3_error(self._s3_url):
+                    await self._start()
+                continue
+            with raise_s3_error(self._s3_url):
+                await self._list_page()
+        self._found = True
+        return self._entries.popleft()
+
+    async def _start(self):
+        client = await get_async_s3_client(self._bucket)
+        if self._key and not self._key.endswith('/'):
+            # On s3, file and directory may be of same name and level
+            try:
+                content = await client.head_object(
+                    Bucket=self._bucket, Key=self._key)
+            except ClientError as error:
+                if client_error_code(error) not in ('404', 'NoSuchKey'):
+                    raise
+            else:
+                self._entries.append(
+                    FileEntry(
+                        fspath(self._s3_url),
+                        StatResult(
+                            size=content['ContentLength'],
+                            mtime=content['LastModified'].timestamp(),
+                            extra=content)))
+        self._params = dict(
+            Bucket=self._bucket,
+            Prefix=_become_prefix(self._key),
+            MaxKeys=max_keys)
+        self._client = client
+
+    async def _list_page(self):
+        resp = await self._client.list_objects_v2(**self._params)
+        for content in resp.get('Contents', []):
+            full_path = s3_path_join('s3://', self._bucket, content['Key'])
+            self._entries.append(FileEntry(full_path, _make_stat(content)))
+        if resp['IsTruncated']:
+            self._params['ContinuationToken'] = resp['NextContinuationToken']
+        else:
+            self._params = None
+
+
+def async_s3_scan_stat(s3_url: MegfilePathLike,
+                       missing_ok: bool = True) -> AsyncIterator[FileEntry]:
+    '''
+    Iteratively traverse only files in given directory, in alphabetical order, asyncio version of s3_scan_stat.
+    Every iteration on async iterator yields a tuple of path string and file stat
+
+    :param s3_url: Given s3_url
+    :param missing_ok: If False and there's no file in the directory, raise FileNotFoundError
+    :raises: UnsupportedError
+    :returns: An async file entry iterator
+    '''
+    return _AsyncScanStatIterator(s3_url, missing_ok)
+
+
+async def async_s3_open(
+        s3_url: MegfilePathLike,
+        mode: str = 'rb',
+        *,
+        block_size: int = DEFAULT_BLOCK_SIZE,
+        max_buffer_size: int = DEFAULT_MAX_BUFFER_SIZE,
+        stat: Optional[StatResult] = None
+) -> Union[AsyncS3PrefetchReader, AsyncS3BufferedWriter]:
+    '''Open an asyncio reader / writer on the shared client of current event loop
+
+    .. note ::
+
+        User should make sure that reader / writer are closed correctly
+
+        Supports async context manager, e.g. ``async with await async_s3_open(path) as reader``
+
+    :param block_size: Size of single block, 8MB by default. Each block will be uploaded or downloaded by single task.
+    :param max_buffer_size: Max cached buffer size in memory, 128MB by default
+    :param stat: StatResult of file if known, e.g. from async_s3_scan_stat, then no request is needed to open the file for read
+    :returns: An opened AsyncS3PrefetchReader / AsyncS3BufferedWriter object
+    :raises: S3FileNotFoundError
+    '''
+    if mode not in ('rb', 'wb'):
+        raise ValueError('unacceptable mode: %r' % mode)
+
+    bucket, key = parse_s3_url(s3_url)
+    client = await get_async_s3_client(bucket)
+    if mode == 'rb':
+        content_size, content_etag = _get_content_info(stat)
+        reader = AsyncS3PrefetchReader(
+            bucket,
+            key,
+            s3_client=client,
+            should_retry=_async_should_retry,
+            block_size=block_size,
+            block_capacity=max(max_buffer_size // block_size, 2),
+            max_retries=max_retries,
+            content_size=content_size,
+            content_etag=content_etag)
+        return await reader.open()
+    return AsyncS3BufferedWriter(
+        bucket,
+        key,
+        s3_client=client,
+        block_size=block_size,
+        max_buffer_size=max_buffer_size,
+        max_retries=max_retries,
+        should_retry=_async_should_retry)
@@ -1,3 +1,4 @@
+import asyncio
 import io
 import os
 import sys
@@ -5,15 +6,18 @@ from collections import defaultdict
 from functools import partial
 from inspect import cleandoc
 from itertools import chain
+from threading import Lock
 from typing import IO, AnyStr, BinaryIO, Callable, Iterator, List, Optional, Tuple
 
 from megfile.fs import fs_copy, fs_getsize, fs_scandir
 from megfile.interfaces import Access, FileEntry, MegfilePathLike, NullCacher, StatResult
+from megfile.lib.async_handler import AsyncHandler
 from megfile.lib.combine_reader import CombineReader
 from megfile.lib.compat import fspath
 from megfile.lib.fakefs import FakefsCacher
 from megfile.lib.glob import globlize, ungloblize
-from megfile.s3 import is_s3, s3_copy, s3_download, s3_load_content, s3_open, s3_upload
+from megfile.lib.transfer_engine import DEFAULT_MAX_WORKERS, SyncDelta, TransferEngine, TransferProgress, iter_in_background, merge_join
+from megfile.s3 import S3RemoveReport, is_s3, s3_copy, s3_download, s3_load_content, s3_load_ranges, s3_open, s3_upload
 from megfile.smart_path import SmartPath, get_traditional_path
 from megfile.utils import combine, get_content_offset
 
@@ -33,12 +37,14 @@ __all__ = [
     'smart_islink',
     'smart_listdir',
     'smart_load_content',
+    'smart_load_ranges',
     'smart_save_content',
     'smart_load_from',
     'smart_load_text',
     'smart_save_text',
     'smart_makedirs',
     'smart_open',
+    'async_smart_open',
     'smart_path_join',
     'smart_remove',
     'smart_move',
@@ -230,7 +236,8 @@ def _default_copy_func(
 def smart_copy(
         src_path: MegfilePathLike,
         dst_path: MegfilePathLike,
-        callback: Optional[Callable[[int], None]] = None) -> None:
+        callback: Optional[Callable[[int], None]] = None,
+        **options) -> None:
     '''
     Copy file from source path to destination path
 
@@ -253,6 +260,7 @@ def smart_copy(
     :param src_path: Given source path
     :param dst_path: Given destination path
     :param callback: Called periodically during copy, and the input parameter is the data size (in bytes) of copy since the last call
+    :param options: Passed to the copy function, e.g. max_workers and part_size of s3_copy
     '''
     # this function contains plenty of mannual polymorphism
     if smart_islink(src_path) and is_s3(dst_path):
@@ -265,13 +273,52 @@ def smart_copy(
         copy_func = _copy_funcs[src_protocol][dst_protocol]
     except KeyError:
         copy_func = _default_copy_func
-    copy_func(src_path, dst_path, callback=callback)  # pytype: disable=wrong-keyword-args
+    copy_func(src_path, dst_path, callback=callback, **options)  # pytype: disable=wrong-keyword-args
+
+
+def _get_etag(stat: StatResult) -> Optional[str]:
+    # extra of s3 stat is the listed object, of fs stat is os.stat_result
+    if isinstance(stat.extra, dict):
+        return stat.extra.get('ETag')
+    return None
+
+
+def _content_md5(path: str, stat: StatResult) -> Optional[str]:
+    etag = (_get_etag(stat) or '').strip('"')
+    if etag and '-' not in etag:
+        # ETag of object not uploaded by multipart is md5 of content
+        return etag
+    return smart_getmd5(path)
+
+
+def _is_unchanged(
+        src_entry: FileEntry, dst_entry: Optional[FileEntry],
+        compare: str) -> Optional[bool]:
+    '''Compare by stat only, return None if md5 of content has to be compared by _is_same_content'''
+    if dst_entry is None or src_entry.stat.size != dst_entry.stat.size:
+        return False
+    if compare == 'mtime':
+        return dst_entry.stat.mtime >= src_entry.stat.mtime
+    src_etag = _get_etag(src_entry.stat)
+    if src_etag is not None and src_etag == _get_etag(dst_entry.stat):
+        return True
+    return None
+
+
+def _is_same_content(src_entry: FileEntry, dst_entry: FileEntry) -> bool:
+    src_md5 = _content_md5(*src_entry)
+    return src_md5 is not None and src_md5 == _content_md5(*dst_entry)
 
 
 def smart_sync(
         src_path: MegfilePathLike,
         dst_path: MegfilePathLike,
-        callback: Optional[Callable[[str, int], None]] = None) -> None:
+        callback: Optional[Callable[[str, int], None]] = None,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        progress_callback: Optional[Callable[[TransferProgress], None]] = None,
+        skip_unchanged: bool = False,
+        compare: str = 'mtime',
+        dry_run: bool = False) -> SyncDelta:
     '''
     Sync file or directory on s3 and fs
 
@@ -281,6 +328,16 @@ def smart_sync(
 
         If file and directory of same name and same level, sync consider it's file first.
 
+        Files are copied by max_workers threads concurrently while listing, so callback is called in multiple threads.
+
+        If skip_unchanged is True, destination is listed concurrently with source, and files already in destination are skipped if:
+
+            compare='mtime': they have the same size, and destination is not older than source
+
+            compare='etag': they have the same size, and the same etag or md5 (md5 of local file, or ``megfile-content-md5`` metadata of object uploaded by megfile)
+
+        Md5 of local file is computed by the copying threads rather than the listing, so that reading whole files won't stall submitting other files.
+
     Here are a few examples: ::
 
         >>> from tqdm import tqdm
@@ -309,30 +366,103 @@ def smart_sync(
     :param src_path: Given source path
     :param dst_path: Given destination path
     :param callback: Called periodically during copy, and the input parameter is the data size (in bytes) of copy since the last call
-    '''
+    :param max_workers: Number of files copied concurrently, 16 by default
+    :param progress_callback: Called periodically during sync, and the input parameter is TransferProgress, aggregate progress of all files
+    :param skip_unchanged: If True, skip files which are unchanged in destination
+    :param compare: How to tell if a file is unchanged, 'mtime' or 'etag'
+    :param dry_run: If True, copy nothing, and only report files to be copied in returned SyncDelta.files
+    :returns: SyncDelta, counts of files copied and skipped
+    '''
+    if compare not in ('mtime', 'etag'):
+        raise ValueError('unacceptable compare: %r' % compare)
     src_path, dst_path = get_traditional_path(src_path), get_traditional_path(
         dst_path)
-    for src_file_path in smart_scan(src_path):
-        content_path = src_file_path[len(src_path):]
-        if len(content_path):
-            content_path = content_path.lstrip('/')
-            dst_abs_file_path = smart_path_join(dst_path, content_path)
-        else:
-            # if content_path is empty, which means smart_isfile(src_path) is True, this function is equal to smart_copy
-            dst_abs_file_path = dst_path
-        copy_callback = partial(callback, src_file_path) if callback else None
-        smart_copy(src_file_path, dst_abs_file_path, callback=copy_callback)
 
-
-def smart_remove(path: MegfilePathLike, missing_ok: bool = False) -> None:
+    def relative_path(root: str, path: str) -> str:
+        # if relative path is empty, which means smart_isfile(src_path) is True, this function is equal to smart_copy
+        return path[len(root):].lstrip('/')
+
+    src_entries = smart_scan_stat(src_path)
+    if skip_unchanged:
+        # Both listings are sorted in ascending order of path
+        dst_entries = iter_in_background(smart_scan_stat(dst_path))
+        entries = merge_join(
+            (
+                (relative_path(src_path, entry.name), entry)
+                for entry in src_entries), (
+                    (relative_path(dst_path, entry.name), entry)
+                    for entry in dst_entries),
+            key=lambda item: item[0])
+    else:
+        entries = (
+            ((relative_path(src_path, entry.name), entry), None)
+            for entry in src_entries)
+
+    delta = SyncDelta()
+    delta_lock = Lock()
+    # Entries of which md5 is compared in copying threads, keyed by source path
+    unchecked = {}
+
+    def record(src_file_path: str, dst_file_path: str, size: int, copy: bool):
+        with delta_lock:
+            if not copy:
+                delta.skip_files += 1
+                delta.skip_bytes += size
+                return
+            delta.copy_files += 1
+            delta.copy_bytes += size
+            if dry_run:
+                delta.files.append((src_file_path, dst_file_path, size))
+
+    def create_tasks():
+        for (content_path, src_entry), dst_item in entries:
+            size = src_entry.stat.size
+            unchanged = dst_item is not None and _is_unchanged(
+                src_entry, dst_item[1], compare)
+            if content_path:
+                dst_abs_file_path = smart_path_join(dst_path, content_path)
+            else:
+                dst_abs_file_path = dst_path
+            if unchanged is None:
+                unchecked[src_entry.name] = (src_entry, dst_item[1])
+            else:
+                record(src_entry.name, dst_abs_file_path, size, not unchanged)
+                if unchanged or dry_run:
+                    continue
+            yield src_entry.name, dst_abs_file_path, size
+
+    def sync_file(src_file_path: str, dst_file_path: str, callback=None):
+        if src_file_path in unchecked:
+            src_entry, dst_entry = unchecked.pop(src_file_path)
+            unchanged = _is_same_content(src_entry, dst_entry)
+            record(
+                src_file_path, dst_file_path, src_entry.stat.size,
+                not unchanged)
+            if unchanged or dry_run:
+                return
+        smart_copy(src_file_path, dst_file_path, callback=callback)
+
+    TransferEngine(
+        sync_file,
+        max_workers=max_workers,
+        callback=callback,
+        progress_callback=progress_callback).run(create_tasks())
+    # Keep files in the order of listing, since some are appended by copying threads
+    delta.files.sort()
+    return delta
+
+
+def smart_remove(path: MegfilePathLike,
+                 missing_ok: bool = False) -> Optional[S3RemoveReport]:
     '''
     Remove the file or directory on s3 or fs, `s3://` and `s3://bucket` are not permitted to remove
 
     :param path: Given path
     :param missing_ok: if False and target file/directory not exists, raise FileNotFoundError
     :raises: PermissionError, FileNotFoundError
+    :returns: S3RemoveReport of objects failed to be deleted if path is on s3, else None
     '''
-    SmartPath(path).remove(missing_ok=missing_ok)
+    return SmartPath(path).remove(missing_ok=missing_ok)
 
 
 def smart_rename(src_path: MegfilePathLike, dst_path: MegfilePathLike) -> None:
@@ -366,7 +496,9 @@ def smart_move(src_path: MegfilePathLike, dst_path: MegfilePathLike) -> None:
         SmartPath(src_path).rename(dst_path)
         return
     smart_sync(src_path, dst_path)
-    smart_remove(src_path)
+    report = smart_remove(src_path)
+    if report is not None:
+        report.raise_for_failures()
 
 
 def smart_unlink(path: MegfilePathLike, missing_ok: bool = False) -> None:
@@ -438,6 +570,31 @@ def smart_open(
     return SmartPath(path).open(mode, **options)
 
 
+async def async_smart_open(path: MegfilePathLike, mode: str = 'rb', **options):
+    '''
+    Open a file on the path in a coroutine, asyncio version of smart_open
+
+    s3 files opened in 'rb' / 'wb' mode are read / written by tasks on the current event loop, see async_s3_open.
+    Other files are opened by smart_open, and their blocking calls run in the default executor of the event loop.
+    Here is an example: ::
+
+        >>> async with await async_smart_open('s3://bucket/key') as reader:
+        ...     content = await reader.read()
+
+    :param path: Given path
+    :param mode: Mode to open file, supports r'[rwa][tb]?\+?'
+    :returns: Async file-like object, whose read / write / seek / close are coroutines
+    :raises: FileNotFoundError, IsADirectoryError, ValueError
+    '''
+    if is_s3(path) and mode in ('rb', 'wb'):
+        # megfile.s3_async is imported only when it's used, it requires aiobotocore and python 3.6+
+        from megfile.s3_async import async_s3_open
+        return await async_s3_open(path, mode, **options)
+    file_object = await asyncio.get_event_loop().run_in_executor(
+        None, partial(smart_open, path, mode, **options))
+    return AsyncHandler(file_object)
+
+
 def smart_path_join(
         path: MegfilePathLike, *other_paths: MegfilePathLike) -> str:
     '''
@@ -692,6 +849,30 @@ def smart_load_content(
         return fd.read(stop - start)
 
 
+def smart_load_ranges(
+        path: MegfilePathLike,
+        ranges: List[Tuple[Optional[int], Optional[int]]]) -> List[memoryview]:
+    '''
+    Get specified ranges [start, stop) of file, s3 ranges are read concurrently, and nearby ranges are merged into one request
+
+    :param path: Specified path
+    :param ranges: list of (start, stop), start and stop can be None or negative, like slice
+    :returns: memoryview of each range, in the order of ranges
+    '''
+    if is_s3(path):
+        return s3_load_ranges(path, ranges)
+
+    size = fs_getsize(path)
+    ranges = [get_content_offset(start, stop, size) for start, stop in ranges]
+
+    views = []
+    with open(path, 'rb') as fd:
+        for start, stop in ranges:
+            fd.seek(start)
+            views.append(memoryview(fd.read(stop - start)))
+    return views
+
+
 def smart_save_content(path: MegfilePathLike, content: bytes) -> None:
     '''Save bytes content to specified path
 
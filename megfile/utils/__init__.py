@@ -7,7 +7,7 @@ from io import BufferedIOBase, BufferedRandom, BufferedReader, BufferedWriter, B
 from multiprocessing.util import register_after_fork
 from threading import RLock as _RLock
 from threading import local
-from typing import IO, Callable, Optional
+from typing import IO, Callable, List, Optional, Tuple
 
 from megfile.utils.mutex import ProcessLocal, ThreadLocal
 
@@ -80,6 +80,31 @@ def get_content_offset(start: Optional[int], stop: Optional[int], size: int):
     return start, stop
 
 
+def coalesce_ranges(ranges: List[Tuple[int, int]], gap: int,
+                    max_size: int) -> List[Tuple[int, int, List[int]]]:
+    '''
+    Merge ranges [start, stop) which are at most gap apart, a merged range grows up to max_size, but a single range larger than max_size is kept as is
+
+    :param ranges: list of (start, stop)
+    :param gap: max distance between merged ranges
+    :param max_size: max size of merged range
+    :returns: list of (start, stop, indexes of ranges merged into it), sorted by start
+    '''
+    merged_ranges = []
+    for index in sorted(range(len(ranges)), key=lambda index: ranges[index]):
+        start, stop = ranges[index]
+        if merged_ranges:
+            merged_range = merged_ranges[-1]
+            merged_stop = max(merged_range[1], stop)
+            if start <= merged_range[1] + gap and \
+                    merged_stop - merged_range[0] <= max_size:
+                merged_range[1] = merged_stop
+                merged_range[2].append(index)
+                continue
+        merged_ranges.append([start, stop, [index]])
+    return [tuple(merged_range) for merged_range in merged_ranges]
+
+
 def get_name(fileobj, default=None):
     return getattr(fileobj, 'name', default or repr(fileobj))
 
@@ -54,5 +54,8 @@ setup(
     },
     tests_require=test_requirements,
     install_requires=requirements,
+    extras_require={
+        'async': ['aiobotocore'],
+    },
     python_requires='>=3.5',
 )
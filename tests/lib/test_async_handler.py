@@ -0,0 +1,28 @@
+import os
+
+import pytest
+
+from megfile.lib.async_handler import AsyncHandler
+from tests.test_s3_async import pytestmark, run
+
+
+def test_async_handler(tmpdir):
+    path = str(tmpdir / 'file')
+
+    async def write_and_read():
+        async with AsyncHandler(open(path, 'wb')) as writer:
+            assert writer.name == path
+            assert writer.mode == 'wb'
+            assert await writer.write(b'block0\nblock1\n') == 14
+            await writer.flush()
+            assert writer.tell() == 14
+        assert writer.closed
+
+        async with AsyncHandler(open(path, 'rb')) as reader:
+            assert await reader.readline() == b'block0\n'
+            assert await reader.seek(-3, os.SEEK_END) == 11
+            assert await reader.read(2) == b'k1'
+            assert await reader.seek(0) == 0
+            return await reader.read()
+
+    assert run(write_and_read()) == b'block0\nblock1\n'
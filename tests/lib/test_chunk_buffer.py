@@ -0,0 +1,93 @@
+import os
+
+import pytest
+
+from megfile.lib.chunk_buffer import ChunkBuffer
+
+
+def test_chunk_buffer_write(mocker):
+    mocker.patch('megfile.lib.chunk_buffer.SMALL_WRITE_SIZE', 1)
+    buffer = ChunkBuffer()
+    data = b'abc'
+    assert buffer.write(data) == 3
+    assert buffer.write(b'') == 0
+    # bytes is kept by reference
+    assert buffer.getvalue() is data
+
+    caller_buffer = bytearray(b'def')
+    buffer.write(memoryview(caller_buffer))
+    caller_buffer[:] = b'xyz'
+    # Other bytes-like objects are copied
+    assert buffer.getvalue() == b'abcdef'
+    assert len(buffer) == 6
+    assert buffer.tell() == 6
+
+
+def test_chunk_buffer_small_writes(mocker):
+    mocker.patch('megfile.lib.chunk_buffer.SMALL_WRITE_SIZE', 4)
+    buffer = ChunkBuffer()
+    for _ in range(100):
+        buffer.write(b'abc')
+    # Small writes are coalesced into one chunk
+    assert len(buffer.chunks) == 1
+    assert len(buffer) == 300
+
+    large = b'large'
+    buffer.write(large)
+    buffer.write(b'de')
+    buffer.write(b'f')
+    assert len(buffer.chunks) == 3
+    assert buffer.chunks[1] is large
+    assert buffer.getvalue() == b'abc' * 100 + b'largedef'
+
+    # Tail is split by read_part, and following writes are still appended
+    assert buffer.read_part(302) == b'abc' * 100 + b'la'
+    assert buffer.read_part(4) == b'rged'
+    buffer.write(b'gh')
+    assert buffer.getvalue() == b'efgh'
+    buffer.seek(0)
+    buffer.write(b'EF')
+    assert buffer.getvalue() == b'EFgh'
+
+
+def test_chunk_buffer_read_part(mocker):
+    mocker.patch('megfile.lib.chunk_buffer.SMALL_WRITE_SIZE', 1)
+    buffer = ChunkBuffer()
+    first = b'abc'
+    buffer.write(first)
+    buffer.write(b'def')
+    buffer.write(b'ghi')
+
+    # A whole bytes chunk is not copied
+    assert buffer.read_part(3) is first
+    assert buffer.read_part(4) == b'defg'
+    assert len(buffer) == 2
+    assert buffer.tell() == 2
+    assert buffer.getvalue() == b'hi'
+    assert buffer.read_part(10) == b'hi'
+    assert len(buffer) == 0
+    assert buffer.read_part(1) == b''
+
+
+def test_chunk_buffer_overwrite():
+    buffer = ChunkBuffer()
+    buffer.write(b'abc')
+    buffer.write(b'def')
+    buffer.write(b'ghi')
+
+    assert buffer.seek(2) == 2
+    buffer.write(b'CDE')
+    assert buffer.tell() == 5
+    assert buffer.getvalue() == b'abCDEfghi'
+
+    buffer.seek(-1, os.SEEK_END)
+    buffer.write(b'IJ')
+    assert buffer.getvalue() == b'abCDEfghIJ'
+    assert len(buffer) == 10
+
+    buffer.seek(2, os.SEEK_CUR)
+    buffer.write(b'M')
+    assert buffer.getvalue() == b'abCDEfghIJ\x00\x00M'
+
+    with pytest.raises(ValueError):
+        buffer.seek(-1)
@@ -0,0 +1,145 @@
+import asyncio
+
+import moto
+import pytest
+
+from megfile.errors import S3UnknownError
+from megfile.lib.s3_async_buffered_writer import AsyncS3BufferedWriter
+from tests.test_s3 import s3_empty_client
+from tests.test_s3_async import AsyncClient, pytestmark, run
+
+BUCKET = 'bucket'
+KEY = 'key'
+
+CONTENT = b'block0\n block1\n block2'
+
+moto.s3.models.UPLOAD_PART_MIN_SIZE = 5
+
+
+@pytest.fixture
+def client(s3_empty_client):
+    s3_empty_client.create_bucket(Bucket=BUCKET)
+    return s3_empty_client
+
+
+def write(client, *chunks, **kwargs):
+
+    async def write_chunks():
+        async with AsyncS3BufferedWriter(BUCKET, KEY,
+                                         s3_client=AsyncClient(client),
+                                         **kwargs) as writer:
+            for chunk in chunks:
+                await writer.write(chunk)
+        return writer
+
+    return run(write_chunks())
+
+
+def read(client):
+    return client.get_object(Bucket=BUCKET, Key=KEY)['Body'].read()
+
+
+def test_s3_async_buffered_writer_close(client):
+
+    async def close():
+        writer = AsyncS3BufferedWriter(
+            BUCKET, KEY, s3_client=AsyncClient(client))
+        assert writer.closed is False
+        await writer.close()
+        assert writer.closed is True
+        await writer.write(b'')
+
+    with pytest.raises(IOError):
+        run(close())
+    assert read(client) == b''
+
+
+def test_s3_async_buffered_writer_write_put(client, mocker):
+    put_object = mocker.spy(client, 'put_object')
+
+    writer = write(client, CONTENT, b'\n', CONTENT)
+
+    assert writer.name == 's3://bucket/key'
+    assert writer.mode == 'wb'
+    assert writer.tell() == len(CONTENT) * 2 + 1
+    assert not writer._is_multipart
+    put_object.assert_called_once_with(
+        Bucket=BUCKET, Key=KEY, Body=CONTENT + b'\n' + CONTENT)
+    assert read(client) == CONTENT + b'\n' + CONTENT
+
+
+def test_s3_async_buffered_writer_write_multipart(client, mocker):
+    put_object = mocker.spy(client, 'put_object')
+    upload_part = mocker.spy(client, 'upload_part')
+    complete_multipart_upload = mocker.spy(client, 'complete_multipart_upload')
+
+    writer = write(client, CONTENT, b'\n', CONTENT, block_size=5)
+
+    assert writer._is_multipart
+    assert not put_object.called
+    assert upload_part.call_count == 2
+    assert complete_multipart_upload.call_count == 1
+    assert read(client) == CONTENT + b'\n' + CONTENT
+
+
+def test_s3_async_buffered_writer_write_large_bytes(client, mocker):
+    upload_part = mocker.spy(client, 'upload_part')
+
+    write(client, CONTENT * 10, block_size=5, max_block_size=8)
+
+    assert upload_part.call_count == len(CONTENT) * 10 // 8
+    assert read(client) == CONTENT * 10
+
+
+def test_s3_async_buffered_writer_max_buffer_size(client):
+    writer = write(client, *([CONTENT] * 10), block_size=5, max_buffer_size=30)
+
+    assert writer._uploading_size == 0
+    assert writer._uploading_tasks == []
+    assert read(client) == CONTENT * 10
+
+
+def test_s3_async_buffered_writer_abort(client, mocker):
+    mocker.patch.object(
+        client, 'complete_multipart_upload', side_effect=Exception('error'))
+    abort_multipart_upload = mocker.spy(client, 'abort_multipart_upload')
+
+    with pytest.raises(S3UnknownError):
+        write(client, CONTENT, CONTENT, block_size=5)
+
+    assert abort_multipart_upload.call_count == 1
+    assert client.list_multipart_uploads(Bucket=BUCKET).get('Uploads') is None
+
+
+def test_s3_async_buffered_writer_retry(client, mocker):
+    upload_part = client.upload_part
+    put_object = client.put_object
+    errors = [ConnectionError('reset')]
+
+    def flaky(method):
+
+        def wrapper(**kwargs):
+            if errors:
+                raise errors.pop()
+            return method(**kwargs)
+
+        return wrapper
+
+    mocker.patch.object(client, 'upload_part', side_effect=flaky(upload_part))
+    mocker.patch.object(client, 'put_object', side_effect=flaky(put_object))
+    sleep = asyncio.sleep
+    mocker.patch('asyncio.sleep', side_effect=lambda delay: sleep(0))
+    should_retry = lambda error: isinstance(error, ConnectionError)
+
+    write(client, CONTENT, CONTENT, block_size=5, should_retry=should_retry)
+    assert client.upload_part.call_count == 3
+    assert read(client) == CONTENT * 2
+
+    errors.append(ConnectionError('reset'))
+    write(client, CONTENT, should_retry=should_retry)
+    assert client.put_object.call_count == 2
+    assert read(client) == CONTENT
+
+    errors.append(ConnectionError('reset'))
+    with pytest.raises(S3UnknownError):
+        write(client, CONTENT, max_retries=1, should_retry=should_retry)
@@ -0,0 +1,184 @@
+import asyncio
+import os
+from io import BytesIO
+
+import pytest
+
+from megfile.errors import S3FileChangedError, S3FileNotFoundError, s3_should_retry
+from megfile.lib.s3_async_prefetch_reader import AsyncS3PrefetchReader
+from tests.test_s3 import s3_empty_client
+from tests.test_s3_async import AsyncClient, pytestmark, run
+
+BUCKET = 'bucket'
+KEY = 'key'
+CONTENT = b'block0 block1 block2 block3 block4 '
+
+
+@pytest.fixture
+def client(s3_empty_client):
+    s3_empty_client.create_bucket(Bucket=BUCKET)
+    s3_empty_client.put_object(Bucket=BUCKET, Key=KEY, Body=CONTENT)
+    return s3_empty_client
+
+
+def make_reader(client, key=KEY, **kwargs):
+    return AsyncS3PrefetchReader(
+        BUCKET,
+        key,
+        s3_client=AsyncClient(client),
+        should_retry=s3_should_retry,
+        **kwargs)
+
+
+def test_s3_async_prefetch_reader(client):
+
+    async def read():
+        async with make_reader(client, block_size=7,
+                               block_capacity=3) as reader:
+            assert reader.name == 's3://bucket/key'
+            assert reader.mode == 'rb'
+            assert reader.tell() == 0
+
+            assert await reader.read(0) == b''
+            assert await reader.read(6) == b'block0'
+            assert await reader.read(9) == b' block1 b'
+            assert reader.tell() == 15
+            assert len(reader._tasks) <= 3
+            assert await reader.read() == CONTENT[15:]
+            assert await reader.read(1) == b''
+        assert reader.closed
+        assert len(reader._tasks) == 0
+
+    run(read())
+
+
+def test_s3_async_prefetch_reader_readline(client):
+    client.put_object(Bucket=BUCKET, Key='lines', Body=b'1\n22\n333\n4444')
+
+    async def readlines():
+        async with make_reader(client, key='lines', block_size=3) as reader:
+            lines = [ await reader.readline(2)]
+            while True:
+                line = await reader.readline()
+                if not line:
+                    return lines
+                lines.append(line)
+
+    assert run(readlines()) == [b'1\n', b'22\n', b'333\n', b'4444']
+
+
+def test_s3_async_prefetch_reader_seek(client):
+
+    async def seek():
+        async with make_reader(client, block_size=7,
+                               block_capacity=2) as reader:
+            assert await reader.seek(21) == 21
+            assert await reader.read(6) == b'block3'
+            assert await reader.seek(-6, os.SEEK_END) == 29
+            assert await reader.read() == b'lock4 '
+            assert await reader.seek(-22, os.SEEK_CUR) == 13
+            assert await reader.read(7) == b' block2'
+            assert await reader.seek(100) == 100
+            assert await reader.read() == b''
+            with pytest.raises(ValueError):
+                await reader.seek(0, 3)
+
+    run(seek())
+
+
+def test_s3_async_prefetch_reader_open(client, mocker):
+    get_object = mocker.spy(client, 'get_object')
+    head_object = mocker.spy(client, 'head_object')
+
+    async def open_reader(**kwargs):
+        reader = make_reader(client, block_size=64, **kwargs)
+        await reader.open()
+        await reader.close()
+        return reader
+
+    # moto returns no ETag for ranged GET, so size and etag are requested by HEAD
+    reader = run(open_reader())
+    assert reader._content_size == len(CONTENT)
+    assert get_object.call_count == 1
+    assert head_object.call_count == 1
+
+    get_object.reset_mock()
+    head_object.reset_mock()
+    reader = run(open_reader(content_size=len(CONTENT), content_etag='etag'))
+    assert not head_object.called
+    assert reader._content_etag == 'etag'
+
+
+def test_s3_async_prefetch_reader_empty_file(client):
+    client.put_object(Bucket=BUCKET, Key='empty', Body=b'')
+
+    async def read():
+        async with make_reader(client, key='empty') as reader:
+            return await reader.read()
+
+    assert run(read()) == b''
+
+
+def test_s3_async_prefetch_reader_not_found(client):
+
+    async def read():
+        async with make_reader(client, key='not-found') as reader:
+            return await reader.read()
+
+    with pytest.raises(S3FileNotFoundError):
+        run(read())
+
+
+def test_s3_async_prefetch_reader_closed(client):
+
+    async def read():
+        reader = make_reader(client)
+        await reader.close()
+        await reader.read()
+
+    with pytest.raises(IOError):
+        run(read())
+
+
+def test_s3_async_prefetch_reader_file_changed(client, mocker):
+
+    async def read():
+        async with make_reader(client, block_size=2, content_size=len(CONTENT),
+                               content_etag='"origin"') as reader:
+            return await reader.read()
+
+    mocker.patch.object(
+        client,
+        'get_object',
+        side_effect=lambda **kwargs: {
+            'Body': BytesIO(b'ch'),
+            'ETag': '"changed"'
+        })
+    with pytest.raises(S3FileChangedError):
+        run(read())
+
+
+def test_s3_async_prefetch_reader_retry(client, mocker):
+    get_object = client.get_object
+    errors = [ConnectionError('reset')]
+
+    def flaky_get_object(**kwargs):
+        if errors:
+            raise errors.pop()
+        return get_object(**kwargs)
+
+    mocker.patch.object(client, 'get_object', side_effect=flaky_get_object)
+    sleep = asyncio.sleep
+    mocker.patch('asyncio.sleep', side_effect=lambda delay: sleep(0))
+
+    async def read():
+        reader = AsyncS3PrefetchReader(
+            BUCKET,
+            KEY,
+            s3_client=AsyncClient(client),
+            should_retry=lambda error: isinstance(error, ConnectionError),
+            content_size=len(CONTENT))
+        async with reader:
+            return await reader.read()
+
+    assert run(read()) == CONTENT
@@ -0,0 +1,67 @@
+import os
+
+from megfile.lib.s3_block_cache import BLOCK_SUFFIX, FileBlockCache, get_file_block_cache
+
+
+def list_blocks(cache_dir):
+    return sorted(
+        name for name in os.listdir(cache_dir) if name.endswith(BLOCK_SUFFIX))
+
+
+def test_file_block_cache(tmpdir):
+    cache = FileBlockCache(str(tmpdir), max_cache_size=10)
+    assert cache.get('bucket', 'key', 'etag', 0, 6) is None
+
+    assert cache.put('bucket', 'key', 'etag', 0, b'block0')
+    block = cache.get('bucket', 'key', 'etag', 0, 6)
+    assert len(block) == 6
+    assert block.read() == b'block0'
+
+    # etag and byte range are parts of cache key
+    assert cache.get('bucket', 'key', 'etag2', 0, 6) is None
+    assert cache.get('bucket', 'key', 'etag', 6, 6) is None
+    assert cache.get('bucket', 'key', 'etag', 0, 3) is None
+    assert cache.get('bucket', 'key', 'etag', 0, 12) is None
+
+    # block larger than budget is not cached
+    assert not cache.put('bucket', 'key', 'etag', 6, b'0123456789a')
+    assert cache.get('bucket', 'key', 'etag', 6, 11) is None
+    assert len(list_blocks(str(tmpdir))) == 1
+
+
+def test_file_block_cache_truncated(tmpdir):
+    cache = FileBlockCache(str(tmpdir))
+    assert cache.put('bucket', 'key', 'etag', 0, b'block0')
+    with open(cache._block_path('bucket', 'key', 'etag', 0, 6), 'wb') as f:
+        f.write(b'blo')
+    assert cache.get('bucket', 'key', 'etag', 0, 6) is None
+
+
+def test_file_block_cache_evict(tmpdir):
+    cache = FileBlockCache(str(tmpdir), max_cache_size=20)
+    for index in range(3):
+        cache.put('bucket', 'key', 'etag', index * 6, b'block%d' % index)
+        os.utime(
+            cache._block_path('bucket', 'key', 'etag', index * 6, 6),
+            (index, index))
+
+    # get() marks block as recently used
+    assert cache.get('bucket', 'key', 'etag', 0, 6).read() == b'block0'
+
+    # least recently used blocks are evicted, until 90% of max_cache_size
+    cache.put('bucket', 'key', 'etag', 18, b'block3')
+    assert cache.get('bucket', 'key', 'etag', 6, 6) is None
+    for index in (0, 2, 3):
+        block = cache.get('bucket', 'key', 'etag', index * 6, 6)
+        assert block.read() == b'block%d' % index
+    assert len(list_blocks(str(tmpdir))) == 3
+
+    cache.clear()
+    assert list_blocks(str(tmpdir)) == []
+
+
+def test_get_file_block_cache(tmpdir):
+    cache = get_file_block_cache(str(tmpdir), 10)
+    assert cache.cache_dir == str(tmpdir)
+    assert cache.max_cache_size == 10
+    assert get_file_block_cache(str(tmpdir), 10) is cache
@@ -1,13 +1,17 @@
 import os
+import time
 from concurrent.futures import wait
-from threading import Event
+from io import BytesIO
+from threading import Semaphore, Thread
 
 import boto3
 import moto
 import pytest
+from botocore.exceptions import ClientError
 from moto import mock_s3
 
-from megfile.lib.s3_buffered_writer import S3BufferedWriter
+from megfile.errors import S3UnknownError
+from megfile.lib.s3_buffered_writer import MAX_PART_SIZE, MAX_PARTS, S3BufferedWriter, set_global_buffer_size, upload_fileobj
 from tests.test_s3 import s3_empty_client
 
 BUCKET = 'bucket'
@@ -107,45 +111,329 @@ def test_s3_buffered_writer_write_multipart(client, mocker):
     assert content == CONTENT + b'\n' + CONTENT
 
 
+def wait_until(predicate, timeout: int = 5):
+    for _ in range(timeout * 100):
+        if predicate():
+            return
+        time.sleep(0.01)
+    raise TimeoutError
+
+
 def test_s3_buffered_writer_write_multipart_pending(client, mocker):
-    upload_part_event = Event()
+    upload_part_semaphore = Semaphore(0)
     upload_part_func = client.upload_part
 
-    writer = None
-
     def fake_upload_part(**kwargs):
-        upload_part_event.wait()
-        upload_part_event.clear()
+        upload_part_semaphore.acquire()
         return upload_part_func(**kwargs)
 
-    def fake_wait(futures, **kwargs):
-        if writer._buffer_size_before_wait is None:
-            writer._buffer_size_before_wait = writer._buffer_size
-        upload_part_event.set()
-        return wait(futures, **kwargs)
-
     mocker.patch.object(client, 'upload_part', side_effect=fake_upload_part)
-    mocker.patch('megfile.lib.s3_buffered_writer.wait', side_effect=fake_wait)
 
+    # CONTENT is divided into parts of 5, 5, 5 and 7 bytes
     with S3BufferedWriter(BUCKET, KEY, s3_client=client, block_size=5,
-                          max_buffer_size=10) as writer:
-        writer._buffer_size_before_wait = None
-
-        writer.write(CONTENT)
-        assert writer._buffer_size_before_wait == 22
-        writer._buffer_size_before_wait = None
+                          max_block_size=5, max_buffer_size=10,
+                          max_workers=4) as writer:
+        thread = Thread(target=writer.write, args=(CONTENT,))
+        thread.start()
+
+        # The third part waits for budget, until one of uploading parts is uploaded
+        wait_until(lambda: len(writer._futures) == 2)
+        time.sleep(0.1)
+        assert len(writer._futures) == 2
+        assert writer._buffer_size == 10
+        assert thread.is_alive()
+
+        upload_part_semaphore.release()
+        wait_until(lambda: len(writer._futures) == 3)
+        assert writer._buffer_size == 10
+
+        for _ in range(3):
+            upload_part_semaphore.release()
+        thread.join()
+        wait(writer._uploading_futures)
         assert writer._buffer_size == 0
 
-        writer.write(b'\n')
-        assert writer._buffer_size_before_wait is None
-        assert writer._buffer_size == 0
+    assert writer._is_multipart
 
-        writer.write(CONTENT)
-        assert writer._buffer_size_before_wait == 23
-        writer._buffer_size_before_wait = None
-        assert writer._buffer_size == 0
+    content = client.get_object(Bucket=BUCKET, Key=KEY)['Body'].read()
+    assert content == CONTENT
+
+
+def test_s3_buffered_writer_global_buffer_budget(client, mocker):
+    upload_part_semaphore = Semaphore(0)
+    upload_part_func = client.upload_part
 
+    def fake_upload_part(**kwargs):
+        upload_part_semaphore.acquire()
+        return upload_part_func(**kwargs)
+
+    mocker.patch.object(client, 'upload_part', side_effect=fake_upload_part)
+    set_global_buffer_size(8)
+    try:
+        writers = [
+            S3BufferedWriter(
+                BUCKET,
+                'key%d' % index,
+                s3_client=client,
+                block_size=5,
+                max_block_size=5,
+                max_buffer_size=10,
+                max_workers=4) for index in range(2)
+        ]
+    finally:
+        set_global_buffer_size(None)
+    assert writers[0]._global_budget is writers[1]._global_budget
+    assert S3BufferedWriter(
+        BUCKET, KEY, s3_client=client)._global_budget is None
+
+    threads = [
+        Thread(target=writer.write, args=(b'01234',)) for writer in writers
+    ]
+    for thread in threads:
+        thread.start()
+    # Only one part of 5 bytes fits in the global budget of 8 bytes
+    wait_until(lambda: sum(len(writer._futures) for writer in writers) == 1)
+    time.sleep(0.1)
+    assert sum(len(writer._futures) for writer in writers) == 1
+
+    for _ in range(2):
+        upload_part_semaphore.release()
+    for thread in threads:
+        thread.join()
+    for writer in writers:
+        writer.close()
+    for index in range(2):
+        assert client.get_object(
+            Bucket=BUCKET, Key='key%d' % index)['Body'].read() == b'01234'
+
+
+def write_until_error(client, upload_part, chunks, fail_part, **kwargs):
+    '''Write chunks, and uploading part fail_part fails as if process died'''
+
+    def failing_upload_part(**kwargs):
+        if kwargs['PartNumber'] == fail_part:
+            raise IOError('process died')
+        return upload_part(**kwargs)
+
+    client.upload_part.side_effect = failing_upload_part
+    with pytest.raises(S3UnknownError):
+        with S3BufferedWriter(BUCKET, KEY, s3_client=client, block_size=5,
+                              max_workers=1, **kwargs) as writer:
+            for chunk in chunks:
+                writer.write(chunk)
+                wait(writer._futures.values())
+                for future in writer._futures.values():
+                    future.result()
+    client.upload_part.side_effect = upload_part
+
+
+def test_s3_buffered_writer_part_size_growth(client, mocker):
+    mocker.patch('megfile.lib.s3_buffered_writer.PART_SIZE_GROWTH_INTERVAL', 2)
+    content = bytes(range(60))
+
+    with S3BufferedWriter(BUCKET, KEY, s3_client=client, block_size=5,
+                          max_block_size=5) as writer:
+        for index in range(len(content)):
+            writer.write(content[index:index + 1])
+
+    # Part size is doubled every 2 parts, and the last part holds the rest
+    assert [
+        future.result().content_size for future in writer._futures.values()
+    ] == [5, 5, 10, 10, 20, 10]
+    assert client.get_object(Bucket=BUCKET, Key=KEY)['Body'].read() == content
+
+
+def test_s3_buffered_writer_size_hint(client, mocker):
+    writer = S3BufferedWriter(
+        BUCKET, KEY, s3_client=client, block_size=5, size_hint=10)
+    assert writer._block_size == 5
+
+    writer = S3BufferedWriter(
+        BUCKET,
+        KEY,
+        s3_client=client,
+        block_size=5,
+        max_block_size=5,
+        size_hint=MAX_PARTS * 7 + 1)
+    assert writer._block_size == 8
+    assert writer._max_block_size == 8
+
+    writer = S3BufferedWriter(
+        BUCKET, KEY, s3_client=client, size_hint=MAX_PARTS * MAX_PART_SIZE * 2)
+    assert writer._block_size == MAX_PART_SIZE
+
+
+def test_s3_buffered_writer_too_many_parts(client, mocker):
+    mocker.patch('megfile.lib.s3_buffered_writer.MAX_PARTS', 2)
+
+    with pytest.raises(IOError) as error:
+        with S3BufferedWriter(BUCKET, KEY, s3_client=client,
+                              block_size=5) as writer:
+            for _ in range(3):
+                writer.write(b'01234')
+    assert 'too many parts' in str(error.value)
+
+
+def test_s3_buffered_writer_abort(client):
+    writer = S3BufferedWriter(BUCKET, KEY, s3_client=client, block_size=5)
+    writer.write(CONTENT)
     assert writer._is_multipart
+    writer.abort()
+    writer.abort()
+    assert writer.closed is True
 
-    content = client.get_object(Bucket=BUCKET, Key=KEY)['Body'].read()
-    assert content == CONTENT + b'\n' + CONTENT
+    assert client.list_multipart_uploads(Bucket=BUCKET).get('Uploads') is None
+    assert 'Contents' not in client.list_objects_v2(Bucket=BUCKET)
+
+
+def test_upload_fileobj(client, mocker):
+    put_object = mocker.spy(client, 'put_object')
+    create_multipart_upload = mocker.spy(client, 'create_multipart_upload')
+
+    fileobj = BytesIO(b'skipped' + CONTENT)
+    fileobj.seek(7)
+    assert upload_fileobj(fileobj, BUCKET, KEY, s3_client=client) == 22
+    assert fileobj.closed is False
+    assert put_object.call_count == 1
+    assert create_multipart_upload.call_count == 0
+    assert client.get_object(Bucket=BUCKET, Key=KEY)['Body'].read() == CONTENT
+
+    # Promoted to multipart upload when content is larger than block_size
+    assert upload_fileobj(
+        BytesIO(CONTENT), BUCKET, 'multipart', s3_client=client,
+        block_size=5) == 22
+    assert put_object.call_count == 1
+    assert create_multipart_upload.call_count == 1
+    assert client.get_object(
+        Bucket=BUCKET, Key='multipart')['Body'].read() == CONTENT
+
+
+def test_upload_fileobj_read_error(client, mocker):
+    fileobj = BytesIO(CONTENT)
+    read = fileobj.read
+    mocker.patch.object(
+        fileobj, 'read', side_effect=[read(5),
+                                      read(5),
+                                      OSError('read error')])
+
+    with pytest.raises(OSError):
+        upload_fileobj(fileobj, BUCKET, KEY, s3_client=client, block_size=5)
+    # Partial content is not uploaded
+    assert 'Contents' not in client.list_objects_v2(Bucket=BUCKET)
+    assert client.list_multipart_uploads(Bucket=BUCKET).get('Uploads') is None
+
+
+@pytest.mark.parametrize('journal_path', ['/journal', 's3://bucket/journal'])
+def test_s3_buffered_writer_resume(client, mocker, journal_path):
+    chunks = [b'block0', b'block1', b'block2', b'block3']
+    upload_part = mocker.patch.object(
+        client, 'upload_part', side_effect=client.upload_part)
+    write_until_error(
+        client, upload_part.side_effect, chunks, 3, journal_path=journal_path)
+
+    assert not client.list_objects_v2(Bucket=BUCKET, Prefix=KEY).get('Contents')
+    assert len(client.list_multipart_uploads(Bucket=BUCKET)['Uploads']) == 1
+
+    upload_part.reset_mock()
+    with S3BufferedWriter(BUCKET, KEY, s3_client=client, block_size=5,
+                          journal_path=journal_path) as writer:
+        assert writer.committed_size == 12
+        # Committed content is discarded when it is written again
+        for chunk in chunks:
+            writer.write(chunk)
+        assert writer.tell() == 24
+
+    assert [call[1]['PartNumber'] for call in upload_part.call_args_list
+           ] == [3, 4]
+    assert client.get_object(
+        Bucket=BUCKET, Key=KEY)['Body'].read() == b''.join(chunks)
+    if journal_path.startswith('s3://'):
+        assert not client.list_objects_v2(
+            Bucket=BUCKET, Prefix='journal').get('Contents')
+    else:
+        assert not os.path.exists(journal_path)
+
+
+def test_s3_buffered_writer_s3_journal_batched(client, mocker):
+    chunks = [b'block%d' % index for index in range(6)]
+    upload_part = mocker.patch.object(
+        client, 'upload_part', side_effect=client.upload_part)
+    put_object = mocker.spy(client, 'put_object')
+    write_until_error(
+        client,
+        upload_part.side_effect,
+        chunks,
+        6,
+        journal_path='s3://bucket/journal')
+
+    # Journal is put when upload is created, and flushed when writer fails, not once per part
+    assert [call[1]['Key'] for call in put_object.call_args_list
+           ] == ['journal', 'journal']
+    with S3BufferedWriter(BUCKET, KEY, s3_client=client, block_size=5,
+                          journal_path='s3://bucket/journal') as writer:
+        assert writer.skip_committed() == 30
+        writer.write(chunks[-1])
+    assert client.get_object(
+        Bucket=BUCKET, Key=KEY)['Body'].read() == b''.join(chunks)
+
+
+def test_s3_buffered_writer_resume_skip_committed(client, mocker):
+    chunks = [b'block0', b'block1', b'block2']
+    upload_part = mocker.patch.object(
+        client, 'upload_part', side_effect=client.upload_part)
+    write_until_error(
+        client,
+        upload_part.side_effect,
+        chunks,
+        2,
+        journal_path='/journal',
+        metadata={'key': 'value'})
+
+    # Metadata changed, upload is not resumed, and the stale upload is aborted
+    with S3BufferedWriter(BUCKET, KEY, s3_client=client,
+                          journal_path='/journal') as writer:
+        assert writer.committed_size == 0
+        assert writer.skip_committed() == 0
+        writer.write(b'changed')
+    assert client.get_object(
+        Bucket=BUCKET, Key=KEY)['Body'].read() == b'changed'
+    assert not client.list_multipart_uploads(Bucket=BUCKET).get('Uploads')
+
+    write_until_error(
+        client, upload_part.side_effect, chunks, 2, journal_path='/journal')
+    with S3BufferedWriter(BUCKET, KEY, s3_client=client, block_size=5,
+                          journal_path='/journal') as writer:
+        assert writer.skip_committed() == 6
+        writer.write(b''.join(chunks)[6:])
+    assert client.get_object(
+        Bucket=BUCKET, Key=KEY)['Body'].read() == b''.join(chunks)
+
+
+def test_s3_buffered_writer_resume_invalid(client, mocker):
+    chunks = [b'block0', b'block1', b'block2']
+    upload_part = mocker.patch.object(
+        client, 'upload_part', side_effect=client.upload_part)
+    write_until_error(
+        client, upload_part.side_effect, chunks, 3, journal_path='/journal')
+
+    # Content shorter than committed parts
+    writer = S3BufferedWriter(
+        BUCKET, KEY, s3_client=client, block_size=5, journal_path='/journal')
+    writer.write(b'block0')
+    with pytest.raises(IOError):
+        writer.close()
+
+    # Upload in journal is aborted, and upload starts again
+    mocker.patch.object(
+        client,
+        'list_parts',
+        side_effect=ClientError(
+            {'Error': {
+                'Code': 'NoSuchUpload'
+            }}, 'ListParts'))
+    with S3BufferedWriter(BUCKET, KEY, s3_client=client, block_size=5,
+                          journal_path='/journal') as writer:
+        assert writer.committed_size == 0
+        writer.write(b''.join(chunks))
+    assert client.get_object(
+        Bucket=BUCKET, Key=KEY)['Body'].read() == b''.join(chunks)
@@ -0,0 +1,52 @@
+import logging
+
+import botocore
+
+from megfile.lib.s3_client_registry import S3ClientRegistry, config_key
+
+
+def test_config_key():
+    assert config_key(None) is None
+    assert config_key(
+        botocore.config.Config(max_pool_connections=10)) == config_key(
+            botocore.config.Config(max_pool_connections=10))
+    assert config_key(
+        botocore.config.Config(max_pool_connections=10)) != config_key(
+            botocore.config.Config(max_pool_connections=20))
+
+
+def test_s3_client_registry(mocker):
+    registry = S3ClientRegistry()
+    create = mocker.Mock(side_effect=lambda: mocker.Mock())
+
+    client = registry.get('key', create)
+    assert registry.get('key', create) is client
+    assert create.call_count == 1
+    assert registry.get('another', create) is not client
+    assert len(registry) == 2
+
+    registry.clear()
+    assert len(registry) == 0
+    assert registry.get('key', create) is not client
+
+
+def test_s3_client_registry_stats(mocker):
+    registry = S3ClientRegistry()
+    client = mocker.Mock()
+    pool = mocker.Mock(num_requests=10, num_connections=3)
+    client._endpoint.http_session._manager.pools = {'host': pool}
+    client._endpoint.http_session._proxy_managers = {}
+    registry.get('key', lambda: client)
+
+    discarded = registry.stats().discarded_connections
+    logging.getLogger('urllib3.connectionpool').warning(
+        'Connection pool is full, discarding connection: %s', 'host')
+
+    stats = registry.stats()
+    assert stats.clients == 1
+    assert stats.pools == 1
+    assert stats.requests == 10
+    assert stats.new_connections == 3
+    assert stats.hits == 7
+    assert stats.discarded_connections == discarded + 1
+    assert 'hits=7' in repr(stats)
@@ -0,0 +1,129 @@
+import pytest
+
+from megfile.lib.s3_metadata_cache import BUCKET, BUCKET_OK, DEFAULT_BUCKET_CACHE_TTL, DIR, HEAD, S3MetadataCache, cached_bucket_status, disable_metadata_cache, enable_metadata_cache, get_bucket_cache, get_metadata_cache, set_bucket_cache_ttl
+
+
+def test_s3_metadata_cache(mocker):
+    cache = S3MetadataCache(ttl=10, max_size=10)
+    load = mocker.Mock(return_value=None)
+
+    assert cache.get_or_load(HEAD, 's3://bucket/key', load) is None
+    # Negative result is cached
+    assert cache.get_or_load(HEAD, 's3://bucket/key', load) is None
+    assert load.call_count == 1
+
+    # s3://bucket/dir and s3://bucket/dir/ are the same directory
+    assert cache.get_or_load(DIR, 's3://bucket/dir/', lambda: True) is True
+    assert cache.get_or_load(DIR, 's3://bucket/dir', load) is True
+    assert load.call_count == 1
+
+    # Error is not cached
+    with pytest.raises(IOError):
+        cache.get_or_load(
+            HEAD, 's3://bucket/error', mocker.Mock(side_effect=IOError()))
+    assert cache.get_or_load(HEAD, 's3://bucket/error', lambda: {}) == {}
+
+
+def test_s3_metadata_cache_expire(mocker):
+    monotonic = mocker.patch(
+        'megfile.lib.s3_metadata_cache.monotonic', return_value=0)
+    cache = S3MetadataCache(ttl=10, max_size=10)
+    load = mocker.Mock(return_value=True)
+
+    cache.get_or_load(BUCKET, 's3://bucket', load)
+    monotonic.return_value = 9
+    cache.get_or_load(BUCKET, 's3://bucket', load)
+    assert load.call_count == 1
+    monotonic.return_value = 10
+    cache.get_or_load(BUCKET, 's3://bucket', load)
+    assert load.call_count == 2
+
+
+def test_s3_metadata_cache_max_size():
+    cache = S3MetadataCache(ttl=10, max_size=2)
+    cache.set(HEAD, 's3://bucket/a', {})
+    cache.set(HEAD, 's3://bucket/b', {})
+    # Get marks entry as recently used
+    cache.get_or_load(HEAD, 's3://bucket/a', lambda: None)
+    cache.set(HEAD, 's3://bucket/c', {})
+
+    assert len(cache) == 2
+    assert cache.get_or_load(HEAD, 's3://bucket/a', lambda: None) == {}
+    assert cache.get_or_load(HEAD, 's3://bucket/b', lambda: None) is None
+
+
+def test_s3_metadata_cache_invalidate():
+    cache = S3MetadataCache(ttl=10, max_size=10)
+    cache.set(BUCKET, 's3://bucket', True)
+    cache.set(DIR, 's3://bucket', True)
+    cache.set(DIR, 's3://bucket/a', False)
+    cache.set(DIR, 's3://bucket/a/b', False)
+    cache.set(HEAD, 's3://bucket/a/b/c', None)
+    cache.set(HEAD, 's3://bucket/a/d', None)
+    cache.set(HEAD, 's3://bucket/e', None)
+
+    cache.invalidate('s3://bucket/a/b/c')
+
+    # The file and its parent directories are invalidated
+    assert sorted(cache._entries) == [
+        (BUCKET, 's3://bucket'),
+        (HEAD, 's3://bucket/a/d'),
+        (HEAD, 's3://bucket/e'),
+    ]
+
+    cache.invalidate('s3://bucket/a/', recursive=True)
+    assert sorted(cache._entries) == [
+        (BUCKET, 's3://bucket'),
+        (HEAD, 's3://bucket/e'),
+    ]
+
+
+def test_s3_metadata_cache_invalidate_loading():
+    cache = S3MetadataCache(ttl=10, max_size=10)
+
+    def load():
+        # Invalidated while loading, the loaded value may be stale
+        cache.invalidate('s3://bucket/key')
+        return None
+
+    assert cache.get_or_load(HEAD, 's3://bucket/key', load) is None
+    assert len(cache) == 0
+
+
+def test_enable_metadata_cache():
+    assert get_metadata_cache() is None
+    enable_metadata_cache(ttl=10, max_size=10)
+    try:
+        cache = get_metadata_cache()
+        cache.set(HEAD, 's3://bucket/key', None)
+        assert get_metadata_cache() is cache
+    finally:
+        disable_metadata_cache()
+    assert get_metadata_cache() is None
+    assert len(cache) == 0
+
+
+def test_bucket_cache(mocker):
+    set_bucket_cache_ttl(DEFAULT_BUCKET_CACHE_TTL)
+    cache = get_bucket_cache()
+    load = mocker.Mock(return_value=BUCKET_OK)
+
+    # Status is cached by bucket
+    assert cached_bucket_status('s3://bucket/a', load) == BUCKET_OK
+    assert cached_bucket_status('s3://bucket/b', load) == BUCKET_OK
+    assert load.call_count == 1
+
+    # Object writes don't invalidate bucket status
+    cache.invalidate('s3://bucket/a')
+    cache.invalidate('s3://bucket/', recursive=True)
+    assert cached_bucket_status('s3://bucket', load) == BUCKET_OK
+    assert load.call_count == 1
+
+    set_bucket_cache_ttl(0)
+    try:
+        assert get_bucket_cache() is None
+        cached_bucket_status('s3://bucket', load)
+        assert load.call_count == 2
+    finally:
+        set_bucket_cache_ttl(DEFAULT_BUCKET_CACHE_TTL)
+    assert len(cache) == 0
@@ -0,0 +1,156 @@
+import time
+
+import moto
+import pytest
+
+from megfile.lib import s3_metrics
+from megfile.lib.s3_buffered_writer import S3BufferedWriter
+from megfile.lib.s3_metrics import ERRORS, READER_BLOCK_HITS, READER_BLOCK_MISSES, READER_WASTED_BLOCKS, READER_WASTED_BYTES, REQUEST_SECONDS, REQUESTS, WRITER_STALL_SECONDS, Histogram, MemorySink, PrometheusSink, StatsdSink, disable_metrics, enable_metrics, get_metrics
+from megfile.lib.s3_prefetch_reader import S3PrefetchReader
+from tests.lib.test_s3_prefetch_reader import sleep_until_downloaded
+from tests.test_s3 import s3_empty_client
+
+BUCKET = 'bucket'
+KEY = 'key'
+CONTENT = b'block0 block1 block2 block3 block4 '
+
+LABELS = (('bucket', 'bucket'), ('operation', 'GetObject'))
+
+
+@pytest.fixture
+def sink():
+    sink = MemorySink()
+    enable_metrics(sink)
+    yield sink
+    disable_metrics()
+
+
+def test_metrics_disabled():
+    assert get_metrics() is None
+    metrics = enable_metrics(MemorySink())
+    assert get_metrics() is metrics
+    disable_metrics()
+    assert get_metrics() is None
+
+
+def test_memory_sink(sink):
+    get_metrics().inc(REQUESTS, operation='GetObject', bucket='bucket')
+    get_metrics().inc(REQUESTS, 2, operation='GetObject', bucket='bucket')
+    get_metrics().observe(
+        REQUEST_SECONDS, 0.01, operation='GetObject', bucket='bucket')
+    get_metrics().observe(
+        REQUEST_SECONDS, 100, operation='GetObject', bucket='bucket')
+
+    snapshot = sink.snapshot()
+    assert snapshot[(REQUESTS, LABELS)] == 3
+    histogram = snapshot[(REQUEST_SECONDS, LABELS)]
+    assert histogram.count == 2
+    assert histogram.sum == 100.01
+    # Upper bound of bucket is inclusive, and the last bucket is +Inf
+    assert histogram.counts[1] == 1
+    assert histogram.counts[-1] == 1
+
+    # Snapshot is a copy
+    get_metrics().inc(REQUESTS, operation='GetObject', bucket='bucket')
+    assert snapshot[(REQUESTS, LABELS)] == 3
+
+    sink.clear()
+    assert sink.snapshot() == {}
+
+
+def test_prometheus_sink():
+    sink = PrometheusSink(buckets=(0.1, 1))
+    sink.record(s3_metrics.COUNTER, REQUESTS, 2, LABELS)
+    sink.record(s3_metrics.COUNTER, ERRORS, 1, (('code', 'a"b'),))
+    sink.record(s3_metrics.HISTOGRAM, REQUEST_SECONDS, 0.5, LABELS)
+    sink.record(s3_metrics.HISTOGRAM, REQUEST_SECONDS, 0.05, LABELS)
+
+    assert sink.render() == '\n'.join(
+        [
+            '# TYPE s3_errors_total counter',
+            's3_errors_total{code="a\\"b"} 1',
+            '# TYPE s3_request_seconds histogram',
+            's3_request_seconds_bucket{bucket="bucket",operation="GetObject",le="0.1"} 1',
+            's3_request_seconds_bucket{bucket="bucket",operation="GetObject",le="1"} 2',
+            's3_request_seconds_bucket{bucket="bucket",operation="GetObject",le="+Inf"} 2',
+            's3_request_seconds_sum{bucket="bucket",operation="GetObject"} 0.55',
+            's3_request_seconds_count{bucket="bucket",operation="GetObject"} 2',
+            '# TYPE s3_requests_total counter',
+            's3_requests_total{bucket="bucket",operation="GetObject"} 2',
+            '',
+        ])
+
+
+def test_statsd_sink(mocker):
+    callback = mocker.Mock()
+    metrics = enable_metrics(StatsdSink(callback))
+    try:
+        metrics.inc(REQUESTS, operation='GetObject', bucket='bucket')
+        metrics.observe(WRITER_STALL_SECONDS, 0.5, bucket='bucket')
+    finally:
+        disable_metrics()
+
+    assert callback.call_args_list == [
+        mocker.call(
+            REQUESTS, 1, 'c', {
+                'operation': 'GetObject',
+                'bucket': 'bucket'
+            }),
+        mocker.call(WRITER_STALL_SECONDS, 0.5, 'h', {'bucket': 'bucket'}),
+    ]
+
+
+def test_metrics_sink_abstract():
+    with pytest.raises(TypeError):
+        s3_metrics.MetricsSink()
+
+
+def test_histogram_repr():
+    histogram = Histogram()
+    histogram.observe(1)
+    assert repr(histogram) == 'Histogram(count=1, sum=1.000)'
+
+
+def test_prefetch_reader_metrics(s3_empty_client, sink):
+    s3_empty_client.create_bucket(Bucket=BUCKET)
+    s3_empty_client.put_object(Bucket=BUCKET, Key=KEY, Body=CONTENT)
+
+    with S3PrefetchReader(BUCKET, KEY, s3_client=s3_empty_client, max_workers=2,
+                          block_size=7, block_capacity=3,
+                          block_forward=2) as reader:
+        assert reader.read(7) == b'block0 '
+        sleep_until_downloaded(reader)
+        reader.seek(28)
+        assert reader.read(7) == b'block4 '
+
+    snapshot = sink.snapshot()
+    labels = (('bucket', BUCKET),)
+    # The first block is downloaded when reader is opened
+    assert snapshot[(READER_BLOCK_HITS, labels)] >= 1
+    assert snapshot[(READER_BLOCK_HITS, labels)] + snapshot.get(
+        (READER_BLOCK_MISSES, labels), 0) == 2
+    # block1 is prefetched but never read
+    assert snapshot[(READER_WASTED_BLOCKS, labels)] == 1
+    assert snapshot[(READER_WASTED_BYTES, labels)] == 7
+
+
+def test_buffered_writer_stall_metrics(s3_empty_client, sink, mocker):
+    mocker.patch.object(moto.s3.models, 'UPLOAD_PART_MIN_SIZE', 5)
+    s3_empty_client.create_bucket(Bucket=BUCKET)
+    upload_part = s3_empty_client.upload_part
+
+    def slow_upload_part(**kwargs):
+        time.sleep(0.01)
+        return upload_part(**kwargs)
+
+    mocker.patch.object(
+        s3_empty_client, 'upload_part', side_effect=slow_upload_part)
+
+    with S3BufferedWriter(BUCKET, KEY, s3_client=s3_empty_client, block_size=7,
+                          max_buffer_size=7) as writer:
+        for _ in range(3):
+            writer.write(b'block0 block1 ')
+
+    histogram = sink.snapshot()[(WRITER_STALL_SECONDS, (('bucket', BUCKET),))]
+    assert histogram.count >= 1
+    assert histogram.sum > 0
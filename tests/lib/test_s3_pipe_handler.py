@@ -1,12 +1,16 @@
 import os
 import sys
+from io import BytesIO
 from subprocess import TimeoutExpired, check_call
 
 import boto3
 import pytest
+from botocore.exceptions import ClientError
 from moto import mock_s3
 
+from megfile.errors import S3FileChangedError
 from megfile.lib.s3_pipe_handler import S3PipeHandler
+from megfile.lib.s3_prefetch_reader import BlockPool
 from tests.test_s3 import s3_empty_client
 
 BUCKET = 'bucket'
@@ -48,7 +52,115 @@ def test_s3_pipe_handler_read(client):
         assert reader.read() == b''
 
 
-def test_s3_pipe_handler_write(client):
+def test_s3_pipe_handler_read_ranges(client, mocker):
+    client.put_object(Bucket=BUCKET, Key=KEY, Body=CONTENT)
+    get_object = mocker.spy(client, 'get_object')
+
+    with S3PipeHandler(BUCKET, KEY, 'rb', s3_client=client, block_size=5,
+                       max_workers=2) as reader:
+        assert reader.read(3) == b'blo'
+        # Line across ranges is joined in order
+        assert reader.readline() == b'ck0\n'
+        assert reader.tell() == 7
+        assert reader.read(10) == b' block1\n b'
+        assert reader.readline(2) == b'lo'
+        assert reader.read() == b'ck2'
+        assert reader.read() == b''
+        assert reader.readline() == b''
+        assert reader.tell() == 22
+
+    # Every range is downloaded once
+    assert get_object.call_count == 5
+
+
+def test_s3_pipe_handler_readinto(client):
+    client.put_object(Bucket=BUCKET, Key=KEY, Body=CONTENT)
+
+    with S3PipeHandler(BUCKET, KEY, 'rb', s3_client=client, block_size=5,
+                       max_workers=2) as reader:
+        buffer = bytearray(8)
+        assert reader.readinto(buffer) == 8
+        assert buffer == b'block0\n '
+        assert reader.readinto(memoryview(buffer)[2:]) == 6
+        assert buffer == b'blblock1'
+        assert reader.readinto(buffer) == 8
+        assert buffer == b'\n block2'
+        assert reader.readinto(buffer) == 0
+        assert reader.tell() == 22
+
+
+def test_s3_pipe_handler_read_empty(client):
+    client.put_object(Bucket=BUCKET, Key=KEY, Body=b'')
+
+    with S3PipeHandler(BUCKET, KEY, 'rb', s3_client=client) as reader:
+        assert reader.read() == b''
+        assert reader.readinto(bytearray(1)) == 0
+
+
+def test_s3_pipe_handler_read_file_changed(client, mocker):
+    client.put_object(Bucket=BUCKET, Key=KEY, Body=CONTENT)
+    mocker.patch.object(
+        client,
+        'get_object',
+        side_effect=lambda **kwargs: {
+            'Body': BytesIO(b'12345'),
+            'ETag': '"changed"'
+        })
+
+    with S3PipeHandler(BUCKET, KEY, 'rb', s3_client=client,
+                       block_size=5) as reader:
+        with pytest.raises(S3FileChangedError):
+            reader.read()
+
+    mocker.patch.object(
+        client,
+        'get_object',
+        side_effect=ClientError(
+            {'Error': {
+                'Code': 'PreconditionFailed'
+            }}, 'GetObject'))
+    with S3PipeHandler(BUCKET, KEY, 'rb', s3_client=client,
+                       block_size=5) as reader:
+        with pytest.raises(S3FileChangedError):
+            reader.read()
+
+
+def test_s3_pipe_handler_read_body_error(client, mocker):
+    client.put_object(Bucket=BUCKET, Key=KEY, Body=CONTENT)
+    mocker.patch('time.sleep')
+    mocker.patch(
+        'megfile.lib.s3_pipe_handler.read_body_into',
+        side_effect=IOError('connection reset'))
+    acquire = mocker.spy(BlockPool, 'acquire')
+    release = mocker.spy(BlockPool, 'release')
+
+    with S3PipeHandler(BUCKET, KEY, 'rb', s3_client=client, block_size=5,
+                       max_workers=2, max_retries=2) as reader:
+        with pytest.raises(Exception):
+            reader.read()
+    # Blocks are returned to pool though body is not read
+    released = [
+        args[1] for args, _ in release.call_args_list if len(args[1]) == 5
+    ]
+    assert acquire.call_count > 0
+    assert len(released) == acquire.call_count
+
+
+def test_s3_pipe_handler_content_size(client, mocker):
+    client.put_object(Bucket=BUCKET, Key=KEY, Body=CONTENT)
+    etag = client.head_object(Bucket=BUCKET, Key=KEY)['ETag']
+    head_object = mocker.spy(client, 'head_object')
+
+    with S3PipeHandler(BUCKET, KEY, 'rb', s3_client=client, block_size=5,
+                       content_size=len(CONTENT), content_etag=etag) as reader:
+        assert reader.read() == CONTENT
+    assert head_object.call_count == 0
+
+
+def test_s3_pipe_handler_write(client, mocker):
+    put_object = mocker.spy(client, 'put_object')
+    create_multipart_upload = mocker.spy(client, 'create_multipart_upload')
+
     with S3PipeHandler(BUCKET, KEY, 'wb', s3_client=client) as writer:
         assert writer.name == 's3://bucket/key'
         assert writer.mode == 'wb'
@@ -60,6 +172,9 @@ def test_s3_pipe_handler_write(client):
 
     content = client.get_object(Bucket=BUCKET, Key=KEY)['Body'].read()
     assert content == CONTENT
+    # Small file is uploaded by a single request
+    assert put_object.call_count == 1
+    assert create_multipart_upload.call_count == 0
 
 
 def assert_no_timeout(filename, timeout=60):
@@ -1,11 +1,15 @@
 import os
 import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
 
 import boto3
 import pytest
 from moto import mock_s3
 
-from megfile.lib.s3_prefetch_reader import S3PrefetchReader
+from megfile.errors import S3FileChangedError
+from megfile.lib.s3_block_cache import FileBlockCache
+from megfile.lib.s3_prefetch_reader import MIN_BLOCK_SIZE, BlockBuffer, BlockPool, S3PrefetchReader, ThroughputStats, read_ranges
 from tests.test_s3 import s3_empty_client
 
 BUCKET = 'bucket'
@@ -126,6 +130,61 @@ def test_s3_prefetch_reader_seek_out_of_range(s3_empty_client):
         assert reader.read(2) == b''
 
 
+def test_s3_prefetch_reader_open_without_head(client, mocker):
+    etag = client.head_object(Bucket=BUCKET, Key=KEY)['ETag']
+    get_object = client.get_object
+
+    def get_object_with_etag(**kwargs):
+        return dict(get_object(**kwargs), ETag=etag)
+
+    mocker.patch.object(client, 'get_object', side_effect=get_object_with_etag)
+    head_object_func = mocker.spy(client, 'head_object')
+    with S3PrefetchReader(BUCKET, KEY, s3_client=client, max_workers=2,
+                          block_size=7) as reader:
+        # file size and etag are learned from the response of block0
+        assert reader._content_size == len(CONTENT)
+        assert reader._content_etag == etag
+        assert reader.read() == CONTENT
+    assert head_object_func.call_count == 0
+
+
+def test_s3_prefetch_reader_open_first_range(client, mocker):
+    mocker.patch('megfile.lib.s3_prefetch_reader.FIRST_RANGE_SIZE', 3)
+    get_object_func = mocker.spy(client, 'get_object')
+    with S3PrefetchReader(BUCKET, KEY, s3_client=client, max_workers=2,
+                          block_size=7) as reader:
+        # Only the head of file is requested when opened, not the whole block
+        assert get_object_func.call_args_list[0][1]['Range'] == 'bytes=0-2'
+        assert reader._content_size == len(CONTENT)
+        assert reader.read() == CONTENT
+
+
+def test_s3_prefetch_reader_content_size(client, mocker):
+    head_object_func = mocker.spy(client, 'head_object')
+    get_object_func = mocker.spy(client, 'get_object')
+    with S3PrefetchReader(BUCKET, KEY, s3_client=client, max_workers=2,
+                          block_size=7, content_size=len(CONTENT),
+                          content_etag='"etag"') as reader:
+        assert get_object_func.call_count == 0
+        assert reader.read(3) == CONTENT[:3]
+    assert head_object_func.call_count == 0
+
+
+def test_s3_prefetch_reader_empty_file(s3_empty_client):
+    s3_empty_client.create_bucket(Bucket=BUCKET)
+    s3_empty_client.put_object(Bucket=BUCKET, Key=KEY, Body=b'')
+    with S3PrefetchReader(BUCKET, KEY, s3_client=s3_empty_client, max_workers=2,
+                          block_size=7) as reader:
+        assert reader._content_size == 0
+        assert reader.read() == b''
+
+
+def test_s3_prefetch_reader_not_found(s3_empty_client):
+    s3_empty_client.create_bucket(Bucket=BUCKET)
+    with pytest.raises(FileNotFoundError):
+        S3PrefetchReader(BUCKET, KEY, s3_client=s3_empty_client, max_workers=2)
+
+
 def test_s3_prefetch_reader_fetch(client, mocker):
     get_object_func = mocker.spy(client, 'get_object')
     with S3PrefetchReader(
@@ -137,9 +196,9 @@ def test_s3_prefetch_reader_fetch(client, mocker):
             block_capacity=4,
             block_forward=2,
     ) as reader:
-        # 打开 reader，_executor 没有执行
-        # get_object_func.assert_not_called() in Python 3.6+
-        assert get_object_func.call_count == 0
+        # 打开 reader 时下载 block0 以获得文件大小，_executor 没有执行
+        get_object_func.assert_called_once_with(
+            Bucket=BUCKET, Key=KEY, Range='bytes=0-6')
 
         reader._buffer
         # 调用 _buffer 会导致 _executor 开始执行
@@ -238,7 +297,7 @@ def test_s3_prefetch_reader_backward_seek_and_the_target_in_remains(
     with S3PrefetchReader(BUCKET, KEY, s3_client=client, max_workers=2,
                           block_size=3, block_capacity=3,
                           block_forward=2) as reader:
-        assert reader._cached_blocks == []
+        assert reader._cached_blocks == [0]
 
         reader._buffer
         sleep_until_downloaded(reader)
@@ -261,7 +320,7 @@ def test_s3_prefetch_reader_backward_seek_and_the_target_out_of_remains(
     with S3PrefetchReader(BUCKET, KEY, s3_client=client, max_workers=2,
                           block_size=3, block_capacity=3,
                           block_forward=2) as reader:  # buffer 最大为 6B
-        assert reader._cached_blocks == []
+        assert reader._cached_blocks == [0]
 
         reader._buffer
         sleep_until_downloaded(reader)
@@ -285,7 +344,7 @@ def test_s3_prefetch_reader_seek_and_the_target_in_buffer(client, mocker):
     with S3PrefetchReader(BUCKET, KEY, s3_client=client, max_workers=3,
                           block_size=3, block_capacity=3,
                           block_forward=2) as reader:  # buffer 最长为 9B
-        assert reader._cached_blocks == []
+        assert reader._cached_blocks == [0]
 
         reader._buffer
         sleep_until_downloaded(reader)
@@ -312,7 +371,7 @@ def test_s3_prefetch_reader_seek_and_the_target_out_of_buffer(client, mocker):
     with S3PrefetchReader(BUCKET, KEY, s3_client=client, max_workers=2,
                           block_size=3, block_capacity=3,
                           block_forward=2) as reader:  # buffer 最大为 6B
-        assert reader._cached_blocks == []
+        assert reader._cached_blocks == [0]
 
         reader._buffer
         sleep_until_downloaded(reader)
@@ -380,3 +439,294 @@ def test_s3_prefetch_reader_tell_after_seek(client):
         assert reader.tell() == 13
         reader.seek(0, os.SEEK_END)
         assert reader.tell() == 35
+
+
+def test_s3_prefetch_reader_readinto(client):
+    with S3PrefetchReader(BUCKET, KEY, s3_client=client, max_workers=2,
+                          block_size=7) as reader:
+        buffer = bytearray(4)
+        assert reader.readinto(buffer) == 4
+        assert buffer == b'bloc'
+
+        # cross block
+        buffer = bytearray(12)
+        assert reader.readinto(memoryview(buffer)) == 12
+        assert buffer == b'k0 block1 bl'
+
+        # size is larger than remaining data
+        buffer = bytearray(40)
+        assert reader.readinto(buffer) == 19
+        assert buffer[:19] == b'ock2 block3 block4 '
+        assert reader.tell() == 35
+        assert reader.readinto(buffer) == 0
+
+
+def test_s3_prefetch_reader_read_ranges(client, mocker):
+    with S3PrefetchReader(BUCKET, KEY, s3_client=client, max_workers=2,
+                          block_size=7) as reader:
+        reader.seek(3)
+        get_object_func = mocker.spy(client, 'get_object')
+        views = reader.read_ranges(
+            [(28, 34), (0, 6), (7, 13), (-6, None), (30, 40), (3, 3)],
+            range_gap=1)
+        assert [bytes(view) for view in views
+               ] == [b'block4', b'block0', b'block1', b'lock4 ', b'ock4 ', b'']
+        assert all(isinstance(view, memoryview) for view in views)
+        # (0, 6) and (7, 13) are merged, (28, 34), (-6, None) and (30, 40) are merged
+        assert get_object_func.call_count == 2
+        assert reader.tell() == 3
+
+        get_object_func.reset_mock()
+        views = reader.read_ranges([(0, 6), (7, 13)], range_gap=0)
+        assert [bytes(view) for view in views] == [b'block0', b'block1']
+        assert get_object_func.call_count == 2
+
+        # Ranges beyond end of file are truncated without requests
+        get_object_func.reset_mock()
+        views = reader.read_ranges([(35, 40), (100, 200)])
+        assert [bytes(view) for view in views] == [b'', b'']
+        assert get_object_func.call_count == 0
+
+        # Large range is split into requests of max_range_size
+        views = reader.read_ranges([(2, 30)], max_range_size=10)
+        assert [bytes(view) for view in views] == [CONTENT[2:30]]
+        assert get_object_func.call_count == 3
+
+        with pytest.raises(ValueError):
+            reader.read_ranges([(5, 2)])
+
+    with pytest.raises(IOError):
+        reader.read_ranges([(0, 1)])
+
+
+def test_read_ranges_beyond_end_of_file(client, mocker):
+    get_object_func = mocker.spy(client, 'get_object')
+    executor = ThreadPoolExecutor(max_workers=2)
+    # Size is unknown, responses tell where the file ends
+    views = read_ranges(
+        client,
+        BUCKET,
+        KEY, [(30, 40), (40, 50), (0, 3)],
+        executor=executor,
+        range_gap=0,
+        max_range_size=4)
+    executor.shutdown()
+    assert [bytes(view) for view in views] == [b'ock4 ', b'', b'blo']
+    # (30, 40) is split into 3 requests, (40, 50) into 3 requests of 416
+    assert get_object_func.call_count == 7
+
+
+def test_s3_prefetch_reader_read_ranges_file_changed(client, mocker):
+    with S3PrefetchReader(BUCKET, KEY, s3_client=client, max_workers=2,
+                          block_size=7) as reader:
+        mocker.patch.object(
+            client,
+            'get_object',
+            return_value={
+                'Body': BytesIO(b'ch'),
+                'ETag': '"changed"'
+            })
+        with pytest.raises(S3FileChangedError):
+            reader.read_ranges([(0, 2)])
+
+
+def test_block_pool():
+    pool = BlockPool(4, capacity=1)
+    block = pool.acquire()
+    assert len(block) == 4
+    assert len(pool) == 0
+
+    pool.release(block)
+    assert len(pool) == 1
+    assert pool.acquire() is block
+
+    # blocks of other size are not reused
+    pool.release(bytearray(3))
+    assert len(pool) == 0
+
+    # idle blocks are bounded by capacity
+    pool.release(bytearray(4))
+    pool.release(bytearray(4))
+    assert len(pool) == 1
+
+
+def test_block_buffer():
+    buffer = BlockBuffer(bytearray(b'12\n45\n78'), 7)
+    assert len(buffer) == 7
+    assert buffer.readline() == b'12\n'
+    assert buffer.readline(1) == b'4'
+    assert buffer.read(2) == b'5\n'
+
+    data = bytearray(3)
+    assert buffer.readinto(data) == 1
+    assert data[:1] == b'7'
+    assert buffer.read() == b''
+
+    buffer.seek(1)
+    assert buffer.tell() == 1
+    assert buffer.read() == b'2\n45\n7'
+
+
+def test_s3_prefetch_reader_reuse_blocks(client):
+    with S3PrefetchReader(BUCKET, KEY, s3_client=client, max_workers=2,
+                          block_size=7, block_capacity=3,
+                          block_forward=2) as reader:
+        pool = reader._block_pool
+        while len(pool) > 0:
+            pool.acquire()
+
+        assert reader.read() == CONTENT
+        sleep_until_downloaded(reader)
+        blocks = [future.result().block for future in reader._futures.values()]
+
+    # blocks are returned to pool when reader is closed
+    assert len(pool) == len(blocks)
+    assert all(any(block is item for item in pool._blocks) for block in blocks)
+
+    # and reused by the next reader
+    with S3PrefetchReader(BUCKET, KEY, s3_client=client, max_workers=2,
+                          block_size=7, block_capacity=3,
+                          block_forward=2) as reader:
+        assert reader.read(7) == b'block0 '
+        assert any(reader._buffer.block is block for block in blocks)
+
+
+def test_s3_prefetch_reader_block_cache(client, mocker, tmpdir):
+    block_cache = FileBlockCache(str(tmpdir))
+    get_object_func = mocker.spy(client, 'get_object')
+    with S3PrefetchReader(BUCKET, KEY, s3_client=client, max_workers=2,
+                          block_size=7, block_cache=block_cache) as reader:
+        assert reader.read() == CONTENT
+    assert get_object_func.call_count == 5
+    get_object_func.reset_mock()
+
+    # blocks are read from block cache after reopen, except the first block, which tells file size and etag
+    with S3PrefetchReader(BUCKET, KEY, s3_client=client, max_workers=2,
+                          block_size=7, block_cache=block_cache) as reader:
+        assert reader.read() == CONTENT
+        buffer = bytearray(7)
+        reader.seek(7)
+        assert reader.readinto(buffer) == 7
+        assert buffer == b'block1 '
+    assert get_object_func.call_count == 1
+    get_object_func.reset_mock()
+
+    # blocks of changed file are not hit
+    client.put_object(Bucket=BUCKET, Key=KEY, Body=CONTENT[::-1])
+    with S3PrefetchReader(BUCKET, KEY, s3_client=client, max_workers=2,
+                          block_size=7, block_cache=block_cache) as reader:
+        assert reader.read() == CONTENT[::-1]
+    assert get_object_func.call_count == 5
+
+
+def test_s3_prefetch_reader_block_cache_block_size(client, mocker, tmpdir):
+    block_cache = FileBlockCache(str(tmpdir))
+    with S3PrefetchReader(BUCKET, KEY, s3_client=client, max_workers=2,
+                          block_size=14, block_cache=block_cache) as reader:
+        assert reader.read() == CONTENT
+
+    # Blocks of another block size are not hit, except the last block of the same range
+    get_object_func = mocker.spy(client, 'get_object')
+    with S3PrefetchReader(BUCKET, KEY, s3_client=client, max_workers=2,
+                          block_size=7, block_cache=block_cache) as reader:
+        reader.seek(7)
+        assert reader.read(7) == b'block1 '
+        reader.seek(0)
+        assert reader.read() == CONTENT
+    assert get_object_func.call_count == 4
+
+    # Both block sizes are cached, and hit by readers of the same block size
+    get_object_func.reset_mock()
+    for block_size in (7, 14):
+        with S3PrefetchReader(BUCKET, KEY, s3_client=client, max_workers=2,
+                              block_size=block_size,
+                              block_cache=block_cache) as reader:
+            reader.seek(21)
+            assert reader.read() == CONTENT[21:]
+    assert get_object_func.call_count == 2
+
+
+def test_throughput_stats():
+    stats = ThroughputStats(alpha=0.5)
+    # not enough samples, use default block size
+    assert stats.suggest_block_size(2**30, 8 * 2**20) == 8 * 2**20
+    # no need to use blocks larger than file
+    assert stats.suggest_block_size(100, 8 * 2**20) == MIN_BLOCK_SIZE
+
+    for _ in range(4):
+        stats.record(0.01, 2**20, 0.01)  # 100MB/s per request, 10ms latency
+    assert stats.latency == pytest.approx(0.01)
+    assert stats.bandwidth == pytest.approx(100 * 2**20)
+    # 100MB/s * 10ms * 4 = 4MB
+    assert stats.suggest_block_size(2**30) == 4 * 2**20
+    assert stats.suggest_block_size(
+        2**30, min_block_size=8 * 2**20) == 8 * 2**20
+    assert stats.suggest_block_size(
+        2**30, max_block_size=2 * 2**20) == 2 * 2**20
+
+    # small samples are not used for bandwidth
+    stats.record(0.01, 1, 1)
+    assert stats.bandwidth == pytest.approx(100 * 2**20)
+    assert stats.count == 5
+
+
+def test_s3_prefetch_reader_auto_tune(client, mocker):
+    stats = ThroughputStats()
+    for _ in range(4):
+        stats.record(1, 2**20, 1)  # 1MB/s per request, 1s latency
+    mocker.patch(
+        'megfile.lib.s3_prefetch_reader.get_throughput_stats',
+        return_value=stats)
+    with S3PrefetchReader(BUCKET, KEY, s3_client=client, max_workers=2,
+                          block_size=16, block_capacity=4, auto_tune=True,
+                          min_block_size=4, max_block_size=32) as reader:
+        # block size is limited by file size, memory ceiling is kept
+        assert reader._block_size == 32
+        assert reader._block_capacity == 2
+        assert reader._block_forward == 1
+        assert reader.read() == CONTENT
+
+    with S3PrefetchReader(BUCKET, KEY, s3_client=client, max_workers=2,
+                          block_size=16, block_capacity=4, auto_tune=True,
+                          min_block_size=4, max_block_size=8) as reader:
+        assert reader._block_size == 8
+        assert reader._block_capacity == 8
+        assert reader._block_forward == 7
+        assert reader.read() == CONTENT
+    # downloads are recorded
+    assert stats.count > 4
+
+
+def test_s3_prefetch_reader_auto_tune_block_cache(client, mocker, tmpdir):
+    block_cache = FileBlockCache(str(tmpdir))
+    stats = ThroughputStats()
+    mocker.patch.object(stats, 'suggest_block_size', side_effect=[14, 7, 14])
+    mocker.patch(
+        'megfile.lib.s3_prefetch_reader.get_throughput_stats',
+        return_value=stats)
+
+    def open_reader():
+        return S3PrefetchReader(
+            BUCKET,
+            KEY,
+            s3_client=client,
+            max_workers=2,
+            block_cache=block_cache,
+            auto_tune=True)
+
+    with open_reader() as reader:
+        assert reader._block_size == 14
+        assert reader.read() == CONTENT
+
+    # Tuned block size is changed, blocks cached by the last reader are not mixed up
+    with open_reader() as reader:
+        assert reader._block_size == 7
+        reader.seek(7)
+        assert reader.read(7) == b'block1 '
+        reader.seek(0)
+        assert reader.read() == CONTENT
+
+    with open_reader() as reader:
+        assert reader._block_size == 14
+        reader.seek(14)
+        assert reader.read(14) == CONTENT[14:28]
@@ -7,6 +7,7 @@ from moto import mock_s3
 
 from megfile.lib import s3_share_cache_reader
 from megfile.lib.s3_share_cache_reader import S3ShareCacheReader
+from megfile.lib.s3_shm_cache import ShmBlockCache
 from megfile.utils import thread_local
 from tests.test_s3 import s3_empty_client
 
@@ -16,6 +17,7 @@ KEY = 'key'
 
 def setup_function():
     s3_share_cache_reader.max_buffer_cache_size = 128 * 2**20
+    s3_share_cache_reader.DEFAULT_BLOCK_CAPACITY = 32
     if 'S3ShareCacheReader.lru' in thread_local:
         del thread_local['S3ShareCacheReader.lru']
 
@@ -412,3 +414,36 @@ def test_s3_share_cache_reader_read_large_amount_of_files(s3_empty_client):
 
     for reader in readers:
         assert reader.read() == b''
+
+
+def test_s3_share_cache_reader_shm_cache(client, mocker, tmpdir):
+    shm_cache = ShmBlockCache(str(tmpdir))
+    get_object_func = mocker.spy(client, 'get_object')
+    with S3ShareCacheReader(BUCKET, KEY, s3_client=client, max_workers=2,
+                            block_size=7, shm_cache=shm_cache) as reader:
+        assert reader.read() == b'block0 block1 block2 block3 block4 '
+    assert get_object_func.call_count == 5
+    get_object_func.reset_mock()
+
+    # blocks downloaded by other process are read from shm cache, except the first block
+    del thread_local['S3ShareCacheReader.lru']
+    with S3ShareCacheReader(BUCKET, KEY, s3_client=client, max_workers=2,
+                            block_size=7, shm_cache=shm_cache) as reader:
+        assert reader.read() == b'block0 block1 block2 block3 block4 '
+    assert get_object_func.call_count == 1
+
+
+def test_s3_share_cache_reader_shm_cache_block_size(client, mocker, tmpdir):
+    shm_cache = ShmBlockCache(str(tmpdir))
+    with S3ShareCacheReader(BUCKET, KEY, s3_client=client, max_workers=2,
+                            block_size=14, shm_cache=shm_cache) as reader:
+        assert reader.read() == b'block0 block1 block2 block3 block4 '
+
+    # other process reading by another block size never hits blocks of the same index
+    del thread_local['S3ShareCacheReader.lru']
+    with S3ShareCacheReader(BUCKET, KEY, s3_client=client, max_workers=2,
+                            block_size=7, shm_cache=shm_cache) as reader:
+        reader.seek(7)
+        assert reader.read(7) == b'block1 '
+        reader.seek(14)
+        assert reader.read(14) == b'block2 block3 '
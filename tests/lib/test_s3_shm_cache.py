@@ -0,0 +1,17 @@
+from megfile.lib.s3_shm_cache import DEFAULT_SHM_CACHE_SIZE, ShmBlockCache, get_default_shm_cache_dir, get_shm_block_cache
+
+
+def test_shm_block_cache(tmpdir):
+    cache = ShmBlockCache(str(tmpdir))
+    assert cache.max_cache_size == DEFAULT_SHM_CACHE_SIZE
+    assert cache.put('bucket', 'key', 'etag', 0, b'block0')
+    assert cache.get('bucket', 'key', 'etag', 0, 6).read() == b'block0'
+    # processes reading by another block size never hit the block
+    assert cache.get('bucket', 'key', 'etag', 0, 3) is None
+
+
+def test_get_shm_block_cache(tmpdir):
+    cache = get_shm_block_cache(str(tmpdir), 10)
+    assert cache.cache_dir == str(tmpdir)
+    assert get_shm_block_cache(str(tmpdir), 10) is cache
+    assert get_default_shm_cache_dir().endswith('megfile')
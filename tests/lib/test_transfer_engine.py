@@ -0,0 +1,173 @@
+import time
+from threading import Event, Lock, Thread
+from threading import enumerate as enumerate_threads
+
+import pytest
+
+from megfile.lib.transfer_engine import ByteBudget, TransferEngine, iter_in_background, merge_join
+
+
+class Recorder:
+
+    def __init__(self, delay: float = 0):
+        self.delay = delay
+        self.copied = []
+        self.inflight = 0
+        self.max_inflight = 0
+        self._lock = Lock()
+
+    def __call__(self, src_path, dst_path, callback=None):
+        with self._lock:
+            self.inflight += 1
+            self.max_inflight = max(self.max_inflight, self.inflight)
+        time.sleep(self.delay)
+        if src_path == 'error':
+            raise IOError('failed to copy')
+        if callback is not None:
+            callback(len(src_path))
+        with self._lock:
+            self.inflight -= 1
+            self.copied.append((src_path, dst_path))
+
+
+def test_transfer_engine():
+    copy_func = Recorder(delay=0.01)
+    tasks = [('src/%d' % index, 'dst/%d' % index, 5) for index in range(20)]
+
+    progress = TransferEngine(copy_func, max_workers=4).run(iter(tasks))
+
+    assert sorted(copy_func.copied) == sorted(task[:2] for task in tasks)
+    assert 1 < copy_func.max_inflight <= 4
+    assert progress.listing_finished
+    assert progress.listed_files == progress.copied_files == 20
+    assert progress.listed_bytes == progress.copied_bytes == 100
+
+
+def test_transfer_engine_progress():
+    copied, progresses = [], []
+    engine = TransferEngine(
+        Recorder(),
+        max_workers=2,
+        callback=lambda path, num_bytes: copied.append((path, num_bytes)),
+        progress_callback=lambda progress: progresses.append(
+            progress.copied_bytes))
+
+    engine.run([('a', 'b', 1), ('abc', 'd', 3)])
+
+    assert sorted(copied) == [('a', 1), ('abc', 3)]
+    assert progresses[-1] == 4
+    assert engine.progress.copied_files == 2
+
+
+def test_transfer_engine_inflight_bytes():
+    copy_func = Recorder(delay=0.01)
+    tasks = [('src/%d' % index, 'dst', 10) for index in range(10)]
+
+    TransferEngine(copy_func, max_workers=8, max_inflight_bytes=20).run(tasks)
+    assert copy_func.max_inflight <= 2
+
+    copy_func = Recorder(delay=0.01)
+    TransferEngine(copy_func, max_workers=8, max_inflight_files=3).run(tasks)
+    assert copy_func.max_inflight <= 3
+
+
+def test_transfer_engine_large_files():
+    copy_func = Recorder(delay=0.01)
+    tasks = [('src/%d' % index, 'dst', 100) for index in range(6)]
+
+    TransferEngine(
+        copy_func, max_workers=8, max_large_workers=1,
+        large_file_size=100).run(tasks)
+    assert copy_func.max_inflight == 1
+    assert len(copy_func.copied) == 6
+
+
+def test_transfer_engine_error():
+    copy_func = Recorder()
+    listed = []
+
+    def tasks():
+        for path in ('a', 'error', 'b', 'c', 'd'):
+            listed.append(path)
+            yield path, 'dst', 1
+            time.sleep(0.05)
+
+    with pytest.raises(IOError):
+        TransferEngine(copy_func, max_workers=2).run(tasks())
+    assert len(listed) < 5
+
+
+def test_byte_budget():
+    budget = ByteBudget(10)
+    # Size larger than the whole budget is acquired as the whole budget
+    assert budget.acquire(100) == 10
+
+    acquired = []
+    thread = Thread(target=lambda: acquired.append(budget.acquire(4)))
+    thread.start()
+    thread.join(0.05)
+    assert acquired == []
+
+    budget.release(10)
+    thread.join()
+    assert acquired == [4]
+
+    assert budget.try_acquire(7) is None
+    assert budget.try_acquire(100) is None
+    assert budget.try_acquire(6) == 6
+
+
+def test_merge_join():
+    left = ['a', 'a-b', 'a/c', 'b', 'd']
+    right = ['a-b', 'a/c', 'a/d', 'c', 'd', 'e']
+    assert list(merge_join(left, right, key=lambda item: item)) == [
+        ('a', None),
+        ('a-b', 'a-b'),
+        ('a/c', 'a/c'),
+        ('b', None),
+        ('d', 'd'),
+    ]
+    assert list(merge_join(left, [], key=lambda item: item)) == [
+        (item, None) for item in left
+    ]
+    assert list(merge_join([], right, key=lambda item: item)) == []
+
+
+def test_iter_in_background():
+    assert list(iter_in_background(range(100), max_size=3)) == list(range(100))
+
+    def error_iterable():
+        yield 1
+        raise IOError('listing failed')
+
+    iterator = iter_in_background(error_iterable())
+    assert next(iterator) == 1
+    with pytest.raises(IOError):
+        next(iterator)
+
+    # Stop consuming in the middle, worker is not blocked forever
+    iterator = iter_in_background(range(100), max_size=3)
+    assert next(iterator) == 0
+    iterator.close()
+
+
+def test_iter_in_background_close_before_sentinel():
+    finished = Event()
+
+    def iterable():
+        try:
+            yield from range(2)
+        finally:
+            finished.set()
+
+    # Queue is full when the last item is consumed, worker blocks at putting sentinel
+    threads = set(enumerate_threads())
+    iterator = iter_in_background(iterable(), max_size=1)
+    assert next(iterator) == 0
+    assert finished.wait(timeout=5)
+    threads = set(enumerate_threads()) - threads
+    assert len(threads) == 1
+    iterator.close()
+    for thread in threads:
+        thread.join(timeout=5)
+        assert not thread.is_alive()
@@ -1,4 +1,6 @@
 import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO
 
 import pytest
@@ -498,6 +500,15 @@ def test_fs_scan(filesystem):
         list(fs.fs_scan('/A/folder3', missing_ok=False))
 
 
+def test_fs_scan_order(filesystem):
+    for path in ('A/b', 'A/a-b', 'A/a/c', 'A/a/b/d', 'A/a0'):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write('')
+    # Same order as keys listed by s3
+    assert list(fs.fs_scan('A')) == ['A/a-b', 'A/a/b/d', 'A/a/c', 'A/a0', 'A/b']
+
+
 def test_fs_scan_stat(filesystem, mocker):
     '''
     /A/
@@ -722,6 +733,33 @@ def test_fs_copy(filesystem):
     fs.fs_copy('/file', '/file1')
 
 
+def test_fs_copy_concurrent(filesystem):
+    sizes = [16 * 1024 * index + 1 for index in range(8)]
+    for index, size in enumerate(sizes):
+        with open('file%d' % index, 'wb') as f:
+            f.write(b'0' * size)
+
+    os.makedirs('/dst')
+    copied = [0] * len(sizes)
+
+    def copy(index):
+
+        def callback(length):
+            copied[index] += length
+
+        fs.fs_copy('/file%d' % index, '/dst/file%d' % index, callback=callback)
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        list(executor.map(copy, range(len(sizes))))
+
+    assert copied == sizes
+    for index, size in enumerate(sizes):
+        assert os.path.getsize('/dst/file%d' % index) == size
+
+    with pytest.raises(shutil.SameFileError):
+        fs.fs_copy('/file0', '/file0', callback=lambda length: None)
+
+
 def test_fs_rename(filesystem):
     src = 'file'
     dst = 'file1'
@@ -1,3 +1,4 @@
+import hashlib
 import os
 import sys
 import threading
@@ -14,8 +15,11 @@ import pytest
 from moto import mock_s3
 
 from megfile import s3, smart
-from megfile.errors import UnknownError, UnsupportedError, translate_s3_error
+from megfile.errors import S3FileChangedError, S3PermissionError, S3UnknownError, UnknownError, UnsupportedError, translate_s3_error
 from megfile.interfaces import Access, FileEntry, StatResult
+from megfile.lib.s3_client_registry import get_client_registry
+from megfile.lib.s3_metadata_cache import DEFAULT_BUCKET_CACHE_TTL
+from megfile.lib.s3_metrics import MemorySink
 from megfile.s3 import content_md5_header
 
 from . import Any, FakeStatResult, Now
@@ -132,6 +136,8 @@ def s3_empty_client(mocker):
     with mock_s3():
         client = boto3.client('s3')
         mocker.patch('megfile.s3.get_s3_client', return_value=client)
+        # Buckets of former tests are gone
+        s3.s3_set_bucket_cache_ttl(DEFAULT_BUCKET_CACHE_TTL)
         yield client
 
 
@@ -179,6 +185,96 @@ def test_retry(s3_empty_client, mocker):
     assert sleep.call_count == s3.max_retries - 1
 
 
+def test_s3_metrics(s3_empty_client, mocker):
+    sink = MemorySink()
+    s3.s3_enable_metrics(sink)
+    client = s3.get_s3_client()
+    s3._patch_make_request(client)
+    make_request = client._endpoint.make_request
+    errors = []
+
+    def flaky_make_request(*args, **kwargs):
+        if errors:
+            raise errors.pop()
+        return make_request(*args, **kwargs)
+
+    mocker.patch.object(
+        client._endpoint, 'make_request', side_effect=flaky_make_request)
+    mocker.patch.object(time, 'sleep')
+    try:
+        client.create_bucket(Bucket='bucket')
+        errors.append(
+            botocore.exceptions.IncompleteReadError(
+                actual_bytes=0, expected_bytes=1))
+        client.put_object(Bucket='bucket', Key='key', Body=b'value')
+        assert client.get_object(
+            Bucket='bucket', Key='key')['Body'].read() == b'value'
+        with pytest.raises(botocore.exceptions.ClientError):
+            client.head_object(Bucket='bucket', Key='notExist')
+    finally:
+        s3.s3_disable_metrics()
+    client.head_object(Bucket='bucket', Key='key')
+
+    snapshot = sink.snapshot()
+    labels = lambda operation, **kwargs: tuple(
+        sorted(dict(operation=operation, bucket='bucket', **kwargs).items()))
+    assert snapshot[('s3_requests_total', labels('PutObject'))] == 2
+    assert snapshot[('s3_retries_total', labels('PutObject'))] == 1
+    assert snapshot[(
+        's3_errors_total', labels('PutObject',
+                                  code='IncompleteReadError'))] == 1
+    assert snapshot[('s3_sent_bytes_total', labels('PutObject'))] == 10
+    assert snapshot[('s3_received_bytes_total', labels('GetObject'))] == 5
+    assert snapshot[('s3_request_seconds', labels('GetObject'))].count == 1
+    assert snapshot[('s3_errors_total', labels('HeadObject', code='404'))] == 1
+    # Nothing is recorded after metrics is disabled
+    assert snapshot[('s3_requests_total', labels('HeadObject'))] == 1
+
+
+class FakeRawResponse:
+
+    def stream(self):
+        return [b'']
+
+
+def test_s3_metrics_botocore_retry(s3_empty_client, mocker):
+    sink = MemorySink()
+    s3.s3_enable_metrics(sink)
+    client = s3.get_s3_client()
+    s3._patch_make_request(client)
+    statuses = [500, 200]
+
+    def respond(request, **kwargs):
+        status = statuses.pop(0)
+        if status != 200:
+            return botocore.awsrequest.AWSResponse(
+                request.url, status, {}, FakeRawResponse())
+
+    mocker.patch.object(time, 'sleep')
+    try:
+        client.create_bucket(Bucket='bucket')
+        client.meta.events.register('before-send.s3.PutObject', respond)
+        client.meta.events.register('before-send.s3.HeadObject', respond)
+        client.put_object(Bucket='bucket', Key='key', Body=b'value')
+        statuses[:] = [304]
+        with pytest.raises(botocore.exceptions.ClientError):
+            client.head_object(Bucket='bucket', Key='key', IfNoneMatch='*')
+    finally:
+        s3.s3_disable_metrics()
+
+    snapshot = sink.snapshot()
+    labels = lambda operation, **kwargs: tuple(
+        sorted(dict(operation=operation, bucket='bucket', **kwargs).items()))
+    # Attempt retried by botocore itself is counted
+    assert snapshot[('s3_requests_total', labels('PutObject'))] == 2
+    assert snapshot[('s3_retries_total', labels('PutObject'))] == 1
+    # Redirection is not an error
+    assert snapshot[('s3_requests_total', labels('HeadObject'))] == 1
+    assert not any(
+        name == 's3_errors_total' and dict(labels)['operation'] == 'HeadObject'
+        for name, labels in snapshot)
+
+
 def test_get_endpoint_url():
     assert s3.get_endpoint_url() == 'https://s3.amazonaws.com'
 
@@ -189,7 +285,15 @@ def test_get_endpoint_url_from_env(mocker):
     assert s3.get_endpoint_url() == 'oss-endpoint'
 
 
-def test_get_s3_client(mocker):
+@pytest.fixture
+def client_registry():
+    registry = get_client_registry()
+    registry.clear()
+    yield registry
+    registry.clear()
+
+
+def test_get_s3_client(mocker, client_registry):
     mock_session = mocker.Mock(spec=boto3.session.Session)
     mocker.patch('megfile.s3.get_s3_session', return_value=mock_session)
 
@@ -199,7 +303,7 @@ def test_get_s3_client(mocker):
         's3', endpoint_url='https://s3.amazonaws.com', config=Any())
 
 
-def test_get_s3_client_from_env(mocker):
+def test_get_s3_client_from_env(mocker, client_registry):
     mock_session = mocker.Mock(spec=boto3.session.Session)
     mocker.patch('megfile.s3.get_s3_session', return_value=mock_session)
     mocker.patch.dict(os.environ, {'OSS_ENDPOINT': 'oss-endpoint'})
@@ -210,7 +314,7 @@ def test_get_s3_client_from_env(mocker):
         's3', endpoint_url='oss-endpoint', config=Any())
 
 
-def test_get_s3_client_with_config(mocker):
+def test_get_s3_client_with_config(mocker, client_registry):
     mock_session = mocker.Mock(spec=boto3.session.Session)
     mocker.patch('megfile.s3.get_s3_session', return_value=mock_session)
 
@@ -222,6 +326,83 @@ def test_get_s3_client_with_config(mocker):
         's3', endpoint_url='https://s3.amazonaws.com', config=config)
 
 
+def test_get_s3_client_shared(mocker, client_registry):
+    get_s3_session = mocker.patch('megfile.s3.get_s3_session')
+    get_s3_session.return_value.client.side_effect = lambda *args, **kwargs: mocker.Mock(
+    )
+
+    clients = []
+    threads = [
+        threading.Thread(target=lambda: clients.append(s3.get_s3_client()))
+        for _ in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Client is shared by threads, and its pool is as large as the global executors
+    assert len(set(map(id, clients))) == 1
+    config = get_s3_session.return_value.client.call_args[1]['config']
+    assert config.max_pool_connections == s3.max_pool_connections
+    assert s3.get_s3_client(
+        botocore.config.Config(
+            max_pool_connections=s3.max_pool_connections)) is clients[0]
+
+    # Different config / profile / endpoint has its own client
+    assert s3.get_s3_client(
+        botocore.config.Config(max_pool_connections=20)) is not clients[0]
+    assert s3.get_s3_client(profile_name='other') is not clients[0]
+    get_s3_session.assert_called_with('other')
+    mocker.patch.dict(os.environ, {'OSS_ENDPOINT': 'oss-endpoint'})
+    assert s3.get_s3_client() is not clients[0]
+    assert len(client_registry) == 4
+
+
+@pytest.fixture
+def s3_routes():
+    s3.s3_clear_routes()
+    yield
+    s3.s3_clear_routes()
+
+
+def test_get_s3_client_route(mocker, client_registry, s3_routes):
+    get_s3_session = mocker.patch('megfile.s3.get_s3_session')
+    config = botocore.config.Config(max_pool_connections=4)
+    s3.s3_add_route(
+        'onprem-*',
+        endpoint_url='http://onprem',
+        profile_name='onprem',
+        config=config)
+    s3.s3_add_route('onprem-public', endpoint_url='http://public')
+
+    assert s3.get_s3_route('onprem-data') == s3.S3Route(
+        'http://onprem', 'onprem', config)
+    # The first matched route wins
+    assert s3.get_s3_route('onprem-public').endpoint_url == 'http://onprem'
+    assert s3.get_s3_route('bucket') == s3.S3Route()
+
+    s3.get_s3_client(bucket='onprem-data')
+    get_s3_session.assert_called_with('onprem')
+    get_s3_session.return_value.client.assert_called_with(
+        's3', endpoint_url='http://onprem', config=config)
+
+    s3.get_s3_client(bucket='bucket')
+    get_s3_session.assert_called_with(None)
+    get_s3_session.return_value.client.assert_called_with(
+        's3', endpoint_url='https://s3.amazonaws.com', config=Any())
+    assert len(client_registry) == 2
+
+
+def test_get_s3_session_profile(mocker):
+    session_call = mocker.patch('boto3.session.Session')
+
+    s3.get_s3_session('profile')
+    s3.get_s3_session('profile')
+
+    session_call.assert_called_once_with(profile_name='profile')
+
+
 def test_get_s3_session_threading(mocker):
     session_call = mocker.patch('boto3.session.Session')
     for i in range(2):
@@ -246,6 +427,26 @@ def test_get_s3_session_threading_reuse(mocker):
     assert session_call.call_count == 1
 
 
+def test_s3_clear_client_cache(mocker, client_registry):
+    session_call = mocker.patch('boto3.session.Session')
+    mocker.patch('megfile.s3._patch_make_request', side_effect=lambda c: c)
+
+    try:
+        client = s3.get_s3_client()
+        assert s3.get_s3_client() is client
+        assert session_call.call_count == 1
+
+        # Clients and sessions are created again, so that credentials are resolved again
+        s3.s3_clear_client_cache()
+        assert len(client_registry) == 0
+        s3.get_s3_client()
+        assert session_call.call_count == 2
+        assert len(client_registry) == 1
+    finally:
+        # Mocked session of this thread is not used by following tests
+        s3.s3_clear_client_cache()
+
+
 def test_is_s3():
     # 不以 s3:// 开头
     assert s3.is_s3('') == False
@@ -523,6 +724,133 @@ def test_s3_copy(s3_empty_client):
     assert body == 'value'
 
 
+def test_s3_copy_between_routes(s3_empty_client, s3_routes, mocker):
+    s3_empty_client.create_bucket(Bucket='bucket')
+    s3_empty_client.create_bucket(Bucket='onprem-bucket')
+    s3_empty_client.put_object(
+        Bucket='bucket', Key='key', Body=b'value', Metadata={'a': 'b'})
+    s3.s3_add_route('onprem-*', endpoint_url='http://onprem')
+    copy_object = mocker.spy(s3_empty_client, 'copy_object')
+    callback = mocker.Mock()
+
+    s3.s3_copy(
+        's3://bucket/key', 's3://onprem-bucket/result', callback=callback)
+
+    # Content can't be copied on server side between endpoints, it's streamed
+    assert copy_object.call_count == 0
+    resp = s3_empty_client.get_object(Bucket='onprem-bucket', Key='result')
+    assert resp['Body'].read() == b'value'
+    assert resp['Metadata'] == {'a': 'b'}
+    assert sum(args[0] for args, _ in callback.call_args_list) == 5
+
+
+def test_s3_copy_between_routes_read_error(s3_empty_client, s3_routes, mocker):
+    s3_empty_client.create_bucket(Bucket='bucket')
+    s3_empty_client.create_bucket(Bucket='onprem-bucket')
+    s3_empty_client.put_object(Bucket='bucket', Key='key', Body=b'value')
+    s3.s3_add_route('onprem-*', endpoint_url='http://onprem')
+    mocker.patch.object(
+        s3.S3PrefetchReader,
+        'read',
+        side_effect=[b'val', IOError('read error')])
+
+    with pytest.raises(UnknownError):
+        s3.s3_copy('s3://bucket/key', 's3://onprem-bucket/result')
+    # Truncated content is not written
+    assert 'Contents' not in s3_empty_client.list_objects_v2(
+        Bucket='onprem-bucket')
+
+
+def test_s3_copy_multipart(s3_empty_client, mocker):
+    mocker.patch('moto.s3.models.UPLOAD_PART_MIN_SIZE', 1)
+    content = b'0123456789' * 10
+    s3_empty_client.create_bucket(Bucket='bucket')
+    s3_empty_client.put_object(
+        Bucket='bucket',
+        Key='key',
+        Body=content,
+        ContentType='text/plain',
+        CacheControl='no-cache',
+        ContentDisposition='attachment',
+        ContentEncoding='gzip',
+        ContentLanguage='en',
+        Metadata={content_md5_header: 'md5'})
+    copy_object = mocker.spy(s3_empty_client, 'copy_object')
+    upload_part_copy = mocker.spy(s3_empty_client, 'upload_part_copy')
+    copied = []
+
+    s3.s3_copy(
+        's3://bucket/key',
+        's3://bucket/result',
+        callback=copied.append,
+        max_workers=3,
+        part_size=30)
+
+    assert not copy_object.called
+    assert upload_part_copy.call_count == 4
+    assert sorted(copied) == [10, 30, 30, 30]
+    resp = s3_empty_client.get_object(Bucket='bucket', Key='result')
+    assert resp['Body'].read() == content
+    assert resp['ContentType'] == 'text/plain'
+    assert resp['CacheControl'] == 'no-cache'
+    assert resp['ContentDisposition'] == 'attachment'
+    assert resp['ContentEncoding'] == 'gzip'
+    assert resp['ContentLanguage'] == 'en'
+    assert resp['Metadata'] == {content_md5_header: 'md5'}
+
+    # At most 10000 parts
+    mocker.patch('megfile.s3.max_copy_parts', 2)
+    upload_part_copy.reset_mock()
+    s3.s3_copy('s3://bucket/key', 's3://bucket/result', part_size=30)
+    assert upload_part_copy.call_count == 2
+
+    s3.s3_copy('s3://bucket/key', 's3://bucket/small', part_size=100)
+    assert copy_object.call_count == 1
+    assert s3.s3_load_content('s3://bucket/small') == content
+
+
+def test_s3_copy_multipart_retry(s3_empty_client, mocker):
+    mocker.patch('moto.s3.models.UPLOAD_PART_MIN_SIZE', 1)
+    mocker.patch('time.sleep')
+    content = b'0123456789' * 10
+    s3_empty_client.create_bucket(Bucket='bucket')
+    s3_empty_client.put_object(Bucket='bucket', Key='key', Body=content)
+    upload_part_copy = s3_empty_client.upload_part_copy
+    errors = [botocore.exceptions.EndpointConnectionError(endpoint_url='')]
+
+    def flaky_upload_part_copy(**kwargs):
+        if kwargs['PartNumber'] == 2 and errors:
+            raise errors.pop()
+        return upload_part_copy(**kwargs)
+
+    mocker.patch.object(
+        s3_empty_client, 'upload_part_copy', side_effect=flaky_upload_part_copy)
+    s3.s3_copy('s3://bucket/key', 's3://bucket/result', part_size=30)
+    assert s3_empty_client.upload_part_copy.call_count == 5
+    assert s3.s3_load_content('s3://bucket/result') == content
+
+    # Multipart upload is aborted when a part fails
+    abort_multipart_upload = mocker.spy(
+        s3_empty_client, 'abort_multipart_upload')
+    s3_empty_client.upload_part_copy.side_effect = botocore.exceptions.ClientError(
+        {'Error': {
+            'Code': 'AccessDenied'
+        }}, 'UploadPartCopy')
+    with pytest.raises(S3PermissionError):
+        s3.s3_copy('s3://bucket/key', 's3://bucket/failed', part_size=30)
+    assert abort_multipart_upload.call_count == 1
+    assert not s3.s3_exists('s3://bucket/failed')
+
+    # Failure of abort doesn't mask the error of part
+    mocker.patch.object(
+        s3_empty_client,
+        'abort_multipart_upload',
+        side_effect=botocore.exceptions.EndpointConnectionError(
+            endpoint_url=''))
+    with pytest.raises(S3PermissionError):
+        s3.s3_copy('s3://bucket/key', 's3://bucket/failed', part_size=30)
+
+
 @pytest.mark.skipif(sys.version_info < (3, 6), reason="Python3.6+")
 def test_s3_copy_invalid(s3_empty_client):
     s3_empty_client.create_bucket(Bucket='bucket')
@@ -597,6 +925,87 @@ def test_s3_getmtime(truncating_client):
         s3.s3_getmtime('s3:///notExistFile')
 
 
+@pytest.fixture
+def metadata_cache():
+    s3.s3_enable_metadata_cache(ttl=60)
+    yield
+    s3.s3_disable_metadata_cache()
+
+
+def test_s3_metadata_cache(s3_setup, metadata_cache, mocker):
+    head_object = mocker.spy(s3_setup, 'head_object')
+    head_bucket = mocker.spy(s3_setup, 'head_bucket')
+    list_objects_v2 = mocker.spy(s3_setup, 'list_objects_v2')
+
+    assert s3.s3_stat('s3://bucketA/fileAA').size == 6
+    assert s3.s3_isfile('s3://bucketA/fileAA') is True
+    assert head_object.call_count == 1
+
+    # Negative results are cached
+    assert s3.s3_isfile('s3://bucketA/newFile') is False
+    assert s3.s3_exists('s3://bucketA/newFile') is False
+    assert head_object.call_count == 2
+    assert s3.s3_isdir('s3://bucketA/folderAB/') is True
+    assert s3.s3_isdir('s3://bucketA/folderAB') is True
+    assert list_objects_v2.call_count == 2  # newFile/ and folderAB/
+
+    # Opening files in the same bucket checks the bucket once
+    for _ in range(3):
+        with s3.s3_open('s3://bucketA/newFile', 'w') as f:
+            f.write('new')
+    assert head_bucket.call_count == 1
+
+    # Written file is invalidated
+    assert s3.s3_isfile('s3://bucketA/newFile') is True
+    assert s3.s3_exists('s3://bucketA/newFile') is True
+
+    # Removed files and directories are invalidated
+    s3.s3_remove('s3://bucketA/newFile')
+    assert s3.s3_isfile('s3://bucketA/newFile') is False
+    assert s3.s3_isfile('s3://bucketA/folderAB/fileAB') is True
+    s3.s3_remove('s3://bucketA/folderAB')
+    assert s3.s3_isdir('s3://bucketA/folderAB') is False
+    assert s3.s3_isfile('s3://bucketA/folderAB/fileAB') is False
+
+    s3.s3_disable_metadata_cache()
+    head_object.reset_mock()
+    s3.s3_isfile('s3://bucketA/fileAA')
+    s3.s3_isfile('s3://bucketA/fileAA')
+    assert head_object.call_count == 2
+
+
+def test_s3_bucket_cache(s3_setup, mocker):
+    head_bucket = mocker.spy(s3_setup, 'head_bucket')
+
+    for index in range(3):
+        with s3.s3_open('s3://bucketA/file%d' % index, 'w') as f:
+            f.write('content')
+    s3.s3_makedirs('s3://bucketA/newFolder', exist_ok=True)
+    assert s3.s3_access('s3://bucketA/fileAA', Access.WRITE) is True
+    assert s3.s3_hasbucket('s3://bucketA') is True
+    assert head_bucket.call_count == 1
+
+    # Missing bucket is cached as well
+    assert s3.s3_hasbucket('s3://notExistBucket') is False
+    assert s3.s3_access('s3://notExistBucket') is False
+    assert head_bucket.call_count == 2
+
+    # Permission denied is cached, bucket exists but is not accessible
+    head_bucket.side_effect = botocore.exceptions.ClientError(
+        {'Error': {
+            'Code': '403'
+        }}, 'HeadBucket')
+    assert s3.s3_access('s3://deniedBucket') is False
+    assert s3.s3_hasbucket('s3://deniedBucket') is True
+    assert head_bucket.call_count == 3
+
+    s3.s3_set_bucket_cache_ttl(0)
+    head_bucket.reset_mock()
+    assert s3.s3_hasbucket('s3://deniedBucket') is True
+    assert s3.s3_hasbucket('s3://deniedBucket') is True
+    assert head_bucket.call_count == 2
+
+
 def test_s3_stat(truncating_client, mocker):
     mocker.patch('megfile.s3.StatResult', side_effect=FakeStatResult)
 
@@ -642,6 +1051,184 @@ def test_s3_upload(fs, s3_empty_client):
     assert md5 == '2063c1608d6e0baf80249c42e2be5804'  # md5('value').hexdigest()
 
 
+def test_s3_upload_multipart(fs, s3_empty_client, mocker):
+    mocker.patch('moto.s3.models.UPLOAD_PART_MIN_SIZE', 1)
+    mocker.patch('megfile.s3.DEFAULT_BLOCK_SIZE', 6)
+    fs.create_file('/file', contents='block0block1block2')
+    fs.create_file('/small', contents='block0')
+    s3_empty_client.create_bucket(Bucket='bucket')
+    upload_part = mocker.spy(s3_empty_client, 'upload_part')
+    copy_object = mocker.spy(s3_empty_client, 'copy_object')
+    create_multipart_upload = mocker.spy(
+        s3_empty_client, 'create_multipart_upload')
+    copied = []
+
+    s3.s3_upload('/file', 's3://bucket/result', callback=copied.append)
+
+    assert copied == [6, 6, 6]
+    assert upload_part.call_count == 3
+    # md5 is computed while uploading, and set by copying object to itself
+    assert s3.source_version_header in create_multipart_upload.call_args[1][
+        'Metadata']
+    assert copy_object.call_count == 1
+    assert copy_object.call_args[1]['MetadataDirective'] == 'REPLACE'
+    assert s3.s3_load_content('s3://bucket/result') == b'block0block1block2'
+    assert s3_empty_client.head_object(
+        Bucket='bucket', Key='result')['Metadata'] == {
+            content_md5_header: hashlib.md5(b'block0block1block2').hexdigest()
+        }
+
+    upload_part.reset_mock()
+    copy_object.reset_mock()
+    s3.s3_upload('/small', 's3://bucket/small')
+
+    assert not upload_part.called
+    assert not copy_object.called
+    assert s3.s3_getmd5('s3://bucket/small') == hashlib.md5(
+        b'block0').hexdigest()
+
+
+class CountingFile:
+
+    def __init__(self, fileobj):
+        self._fileobj = fileobj
+        self.read_size = 0
+
+    def read(self, size=-1):
+        data = self._fileobj.read(size)
+        self.read_size += len(data)
+        return data
+
+    def __getattr__(self, name):
+        return getattr(self._fileobj, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self._fileobj.close()
+
+
+def open_counting(mocker):
+    files = []
+    real_open = open
+
+    def counting_open(path, mode='r'):
+        files.append(CountingFile(real_open(path, mode)))
+        return files[-1]
+
+    mocker.patch('megfile.s3.open', side_effect=counting_open, create=True)
+    return files
+
+
+def test_s3_upload_read_once(fs, s3_empty_client, mocker):
+    mocker.patch('moto.s3.models.UPLOAD_PART_MIN_SIZE', 1)
+    mocker.patch('megfile.s3.DEFAULT_BLOCK_SIZE', 6)
+    fs.create_file('/file', contents='block0block1block2')
+    s3_empty_client.create_bucket(Bucket='bucket')
+    files = open_counting(mocker)
+
+    s3.s3_upload('/file', 's3://bucket/result')
+    assert [f.read_size for f in files] == [18]
+    assert s3.s3_getmd5('s3://bucket/result') == hashlib.md5(
+        b'block0block1block2').hexdigest()
+
+
+def test_s3_upload_large_md5(fs, s3_empty_client, mocker):
+    mocker.patch('moto.s3.models.UPLOAD_PART_MIN_SIZE', 1)
+    mocker.patch('megfile.s3.DEFAULT_BLOCK_SIZE', 6)
+    # Object larger than max_copy_part_size is copied to itself by parts
+    mocker.patch('megfile.s3.max_copy_part_size', 10)
+    fs.create_file('/file', contents='block0block1block2')
+    s3_empty_client.create_bucket(Bucket='bucket')
+    copy_object = mocker.spy(s3_empty_client, 'copy_object')
+    upload_part_copy = mocker.spy(s3_empty_client, 'upload_part_copy')
+
+    s3.s3_upload('/file', 's3://bucket/result')
+    assert not copy_object.called
+    assert upload_part_copy.call_count == 2
+    assert s3.s3_load_content('s3://bucket/result') == b'block0block1block2'
+    assert s3_empty_client.head_object(
+        Bucket='bucket', Key='result')['Metadata'] == {
+            content_md5_header: hashlib.md5(b'block0block1block2').hexdigest()
+        }
+
+
+def test_s3_upload_resume(fs, s3_empty_client, mocker):
+    mocker.patch('moto.s3.models.UPLOAD_PART_MIN_SIZE', 1)
+    mocker.patch('megfile.s3.DEFAULT_BLOCK_SIZE', 6)
+    fs.create_file('/file', contents='block0block1block2')
+    s3_empty_client.create_bucket(Bucket='bucket')
+    upload_part = s3_empty_client.upload_part
+
+    def failing_upload_part(**kwargs):
+        if kwargs['PartNumber'] == 2:
+            raise IOError('process died')
+        return upload_part(**kwargs)
+
+    mocker.patch.object(
+        s3_empty_client, 'upload_part', side_effect=failing_upload_part)
+    with pytest.raises(Exception):
+        s3.s3_upload('/file', 's3://bucket/result', journal_path='/journal')
+    assert s3.s3_exists('s3://bucket/result') is False
+    assert os.path.exists('/journal')
+
+    s3_empty_client.upload_part.reset_mock()
+    s3_empty_client.upload_part.side_effect = upload_part
+    copied = []
+    files = open_counting(mocker)
+    s3.s3_upload(
+        '/file',
+        's3://bucket/result',
+        callback=copied.append,
+        journal_path='/journal')
+
+    assert copied == [6, 6, 6]
+    # Committed part is read only for md5
+    assert [f.read_size for f in files] == [18]
+    assert [
+        call[1]['PartNumber']
+        for call in s3_empty_client.upload_part.call_args_list
+    ] == [2, 3]
+    assert s3.s3_load_content('s3://bucket/result') == b'block0block1block2'
+    assert s3.s3_getmd5('s3://bucket/result') == hashlib.md5(
+        b'block0block1block2').hexdigest()
+    assert not os.path.exists('/journal')
+
+
+def test_s3_upload_resume_changed_file(fs, s3_empty_client, mocker):
+    mocker.patch('moto.s3.models.UPLOAD_PART_MIN_SIZE', 1)
+    mocker.patch('megfile.s3.DEFAULT_BLOCK_SIZE', 6)
+    fs.create_file('/file', contents='block0block1block2')
+    s3_empty_client.create_bucket(Bucket='bucket')
+    upload_part = s3_empty_client.upload_part
+
+    def failing_upload_part(**kwargs):
+        if kwargs['PartNumber'] == 2:
+            raise IOError('process died')
+        return upload_part(**kwargs)
+
+    mocker.patch.object(
+        s3_empty_client, 'upload_part', side_effect=failing_upload_part)
+    with pytest.raises(Exception):
+        s3.s3_upload('/file', 's3://bucket/result', journal_path='/journal')
+
+    # mtime of changed file doesn't match the journal, upload is not resumed
+    with open('/file', 'wb') as f:
+        f.write(b'BLOCK0block1block2')
+    s3_empty_client.upload_part.reset_mock()
+    s3_empty_client.upload_part.side_effect = upload_part
+    s3.s3_upload('/file', 's3://bucket/result', journal_path='/journal')
+
+    assert [
+        call[1]['PartNumber']
+        for call in s3_empty_client.upload_part.call_args_list
+    ] == [1, 2, 3]
+    assert s3.s3_load_content('s3://bucket/result') == b'BLOCK0block1block2'
+    assert s3.s3_getmd5('s3://bucket/result') == hashlib.md5(
+        b'BLOCK0block1block2').hexdigest()
+
+
 def test_s3_upload_invalid(fs, s3_empty_client):
     s3_empty_client.create_bucket(Bucket='bucket')
 
@@ -757,6 +1344,103 @@ def test_s3_download_invalid(fs, s3_setup):
     assert 's3://bucket/notExistFile' in str(error.value)
 
 
+def test_s3_download_ranges(s3_empty_client, tmpdir, mocker):
+    content = os.urandom(100)
+    s3_empty_client.create_bucket(Bucket='bucket')
+    s3_empty_client.put_object(Bucket='bucket', Key='key', Body=content)
+    get_object = mocker.spy(s3_empty_client, 'get_object')
+    callback = mocker.Mock()
+    dst_url = str(tmpdir.join('file'))
+
+    s3.s3_download(
+        's3://bucket/key',
+        dst_url,
+        callback=callback,
+        max_workers=4,
+        range_size=16)
+
+    with open(dst_url, 'rb') as f:
+        assert f.read() == content
+    assert get_object.call_count == 7
+    assert sum(call[0][0] for call in callback.call_args_list) == 100
+    assert os.listdir(str(tmpdir)) == ['file']
+
+
+def test_s3_download_resume(s3_empty_client, tmpdir, mocker):
+    content = os.urandom(100)
+    s3_empty_client.create_bucket(Bucket='bucket')
+    s3_empty_client.put_object(Bucket='bucket', Key='key', Body=content)
+    get_object = s3_empty_client.get_object
+    dst_url = str(tmpdir.join('file'))
+
+    def failing_get_object(**kwargs):
+        if kwargs['Range'] == 'bytes=48-63':
+            raise Exception('interrupted')
+        return get_object(**kwargs)
+
+    mocker.patch.object(
+        s3_empty_client, 'get_object', side_effect=failing_get_object)
+    with pytest.raises(UnknownError):
+        s3.s3_download('s3://bucket/key', dst_url, max_workers=1, range_size=16)
+    assert not os.path.exists(dst_url)
+    assert os.path.getsize(dst_url + '.megfile-download') == 100
+
+    get_object = mocker.patch.object(
+        s3_empty_client, 'get_object', side_effect=get_object)
+    callback = mocker.Mock()
+    s3.s3_download(
+        's3://bucket/key',
+        dst_url,
+        callback=callback,
+        max_workers=1,
+        range_size=16)
+
+    with open(dst_url, 'rb') as f:
+        assert f.read() == content
+    # 3 of 7 ranges were downloaded before interrupted
+    assert get_object.call_count == 4
+    assert callback.call_args_list[0] == ((48,),)
+    assert sum(call[0][0] for call in callback.call_args_list) == 100
+    assert os.listdir(str(tmpdir)) == ['file']
+
+    # Sidecar of another version is discarded
+    with open(dst_url + '.megfile-download.json', 'w') as f:
+        f.write('{"etag": "another"}\n{"start": 0, "stop": 16}\n')
+    with open(dst_url + '.megfile-download', 'wb') as f:
+        f.write(b'\0' * 100)
+    get_object.reset_mock()
+    s3.s3_download('s3://bucket/key', dst_url, range_size=16)
+    with open(dst_url, 'rb') as f:
+        assert f.read() == content
+    assert get_object.call_count == 7
+
+
+def test_s3_download_file_changed(s3_empty_client, tmpdir, mocker):
+    s3_empty_client.create_bucket(Bucket='bucket')
+    s3_empty_client.put_object(Bucket='bucket', Key='key', Body=b'0' * 100)
+    mocker.patch.object(
+        s3_empty_client,
+        'get_object',
+        side_effect=lambda **kwargs: {
+            'Body': BytesIO(b'1' * 16),
+            'ETag': '"changed"'
+        })
+
+    with pytest.raises(S3FileChangedError):
+        s3.s3_download(
+            's3://bucket/key', str(tmpdir.join('file')), range_size=16)
+
+    mocker.patch.object(
+        s3_empty_client,
+        'get_object',
+        side_effect=botocore.exceptions.ClientError(
+            {'Error': {
+                'Code': 'PreconditionFailed'
+            }}, 'GetObject'))
+    with pytest.raises(S3FileChangedError):
+        s3.s3_download('s3://bucket/key', str(tmpdir.join('file')))
+
+
 def test_s3_remove(s3_setup):
     with pytest.raises(UnsupportedError) as error:
         s3.s3_remove('s3://')
@@ -785,6 +1469,95 @@ def test_s3_remove_multi_page(truncating_client):
     assert s3.s3_exists('s3://bucketA/fileAA') is False
 
 
+def test_s3_remove_report(s3_setup, mocker):
+    mocker.patch('megfile.s3.max_delete_keys', 1)
+    delete_objects = mocker.spy(s3_setup, 'delete_objects')
+
+    report = s3.s3_remove('s3://bucketA/folderAB', max_workers=2)
+    assert (report.deleted, report.failures) == (2, [])
+    assert delete_objects.call_count == 2
+    assert s3.s3_exists('s3://bucketA/folderAB/') is False
+
+    report = s3.s3_remove('s3://bucketA/fileAA', max_workers=1)
+    assert (report.deleted, report.failures) == (1, [])
+    report = s3.s3_remove('s3://bucketA/fileAA', missing_ok=True)
+    assert (report.deleted, report.failures) == (0, [])
+
+
+def test_s3_remove_partial_failure(s3_setup, mocker):
+    mocker.patch('time.sleep')
+    delete_objects = s3_setup.delete_objects
+    throttled = ['folderAB/fileAB']
+
+    def partial_delete_objects(Bucket, Delete):
+        keys = [obj['Key'] for obj in Delete['Objects']]
+        errors = []
+        for key in keys:
+            if key in throttled:
+                throttled.remove(key)
+                errors.append(
+                    {
+                        'Key': key,
+                        'Code': 'SlowDown',
+                        'Message': 'Please reduce your request rate.'
+                    })
+            elif key == 'folderAB/fileAC':
+                errors.append(
+                    {
+                        'Key': key,
+                        'Code': 'AccessDenied',
+                        'Message': 'Access Denied'
+                    })
+        failed_keys = [error['Key'] for error in errors]
+        objects = [{'Key': key} for key in keys if key not in failed_keys]
+        if objects:
+            delete_objects(Bucket=Bucket, Delete={'Objects': objects})
+        return {'Errors': errors}
+
+    mocker.patch.object(
+        s3_setup, 'delete_objects', side_effect=partial_delete_objects)
+
+    report = s3.s3_remove('s3://bucketA/folderAB')
+    assert report.failures == [
+        s3.S3RemoveFailure(
+            's3://bucketA/folderAB/fileAC', 'AccessDenied', 'Access Denied')
+    ]
+    assert report.deleted == 1
+    assert s3_setup.delete_objects.call_count == 2
+    assert s3.s3_exists('s3://bucketA/folderAB/fileAB') is False
+    assert s3.s3_exists('s3://bucketA/folderAB/fileAC')
+
+
+def test_s3_remove_report_raise_for_failures(s3_setup):
+    report = s3.S3RemoveReport()
+    report.raise_for_failures()
+
+    report.failures = [
+        s3.S3RemoveFailure(
+            's3://bucketA/folderAB/fileAC', 'AccessDenied', 'Access Denied'),
+        s3.S3RemoveFailure(
+            's3://bucketA/folderAB/fileAB', 'InternalError', 'Internal Error'),
+    ]
+    with pytest.raises(S3PermissionError) as error:
+        report.raise_for_failures()
+    assert 's3://bucketA/folderAB/fileAC' in str(error.value)
+    assert '2 objects failed to be deleted' in str(error.value)
+
+    report.failures = report.failures[1:]
+    with pytest.raises(S3UnknownError):
+        report.raise_for_failures()
+
+
+def test_s3_remove_error(s3_setup, mocker):
+    error = botocore.exceptions.ClientError(
+        {'Error': {
+            'Code': 'AccessDenied'
+        }}, 'DeleteObjects')
+    mocker.patch.object(s3_setup, 'delete_objects', side_effect=error)
+    with pytest.raises(S3PermissionError):
+        s3.s3_remove('s3://bucketA/folderAB')
+
+
 @pytest.mark.skip('moto issue https://github.com/spulec/moto/issues/2759')
 def test_s3_remove_slashes(s3_empty_client):
     s3_empty_client.create_bucket(Bucket='bucket')
@@ -809,6 +1582,21 @@ def test_s3_sync(truncating_client):
     assert s3.s3_exists('s3://bucketA/folderAA/folderAAA1/fileAAAA')
 
 
+def test_s3_sync_progress(truncating_client):
+    progresses = []
+    s3.s3_sync(
+        's3://bucketA/folderAB',
+        's3://bucketC/folderAB',
+        max_workers=2,
+        progress_callback=lambda progress: progresses.append(
+            (progress.copied_files, progress.copied_bytes)))
+    assert list(s3.s3_scan('s3://bucketC/folderAB')) == [
+        's3://bucketC/folderAB/fileAB',
+        's3://bucketC/folderAB/fileAC',
+    ]
+    assert progresses[-1] == (2, 12)
+
+
 def test_s3_rename(truncating_client):
     s3.s3_rename(
         's3://bucketA/folderAA/folderAAA/fileAAAA',
@@ -817,6 +1605,23 @@ def test_s3_rename(truncating_client):
     assert s3.s3_exists('s3://bucketA/folderAA/folderAAA/fileAAAA1')
 
 
+def test_s3_rename_remove_failure(truncating_client, mocker):
+    report = s3.S3RemoveReport()
+    report.failures.append(
+        s3.S3RemoveFailure(
+            's3://bucketA/folderAA/folderAAA/fileAAAA', 'AccessDenied',
+            'Access Denied'))
+    mocker.patch('megfile.s3.s3_remove', return_value=report)
+    with pytest.raises(S3PermissionError):
+        s3.s3_rename(
+            's3://bucketA/folderAA/folderAAA/fileAAAA',
+            's3://bucketA/folderAA/folderAAA/fileAAAA1')
+    with pytest.raises(S3PermissionError):
+        s3.s3_move(
+            's3://bucketA/folderAA/folderAAA',
+            's3://bucketA/folderAA/folderAAA1')
+
+
 def test_s3_unlink(s3_setup):
     with pytest.raises(IsADirectoryError) as error:
         s3.s3_unlink('s3://')
@@ -1077,6 +1882,74 @@ def test_s3_scan_stat(truncating_client, mocker):
         s3.s3_scan_stat('s3://')
 
 
+def test_s3_scan_stat_parallel(s3_setup, truncating_client, mocker):
+    for index in range(3):
+        s3_setup.put_object(
+            Bucket='bucketA', Key='folderAB/%d/file' % index, Body=b'')
+    s3_setup.put_object(Bucket='bucketA', Key='folderAB', Body=b'')
+    mocker.patch('megfile.s3.PARTITION_FACTOR', 1)
+    list_objects = mocker.spy(s3, '_list_objects_recursive')
+
+    for url in ('s3://bucketA', 's3://bucketA/folderAB', 's3://bucketB',
+                's3://bucketA/fileAA', 's3://notExistBucket'):
+        expected = list(s3.s3_scan_stat(url))
+        list_objects.reset_mock()
+        assert list(s3.s3_scan_stat(url, max_workers=2)) == expected
+        assert sorted(s3.s3_scan_stat(url, max_workers=2,
+                                      ordered=False)) == sorted(expected)
+    assert list(s3.s3_scan('s3://bucketA',
+                           max_workers=3)) == list(s3.s3_scan('s3://bucketA'))
+
+    # Directories are expanded by delimiter listing, then partitions are listed recursively
+    list_objects.reset_mock()
+    assert len(list(s3.s3_scan_stat('s3://bucketA/', max_workers=4))) == 10
+    delimiters = [call[0][3:] for call in list_objects.call_args_list]
+    assert delimiters.count(('/',)) == 1 + 3
+    assert delimiters.count(()) == 4
+
+
+def test_s3_scan_stat_parallel_flat_prefix(s3_empty_client, mocker):
+    s3_empty_client.create_bucket(Bucket='bucket')
+    for index in range(20):
+        s3_empty_client.put_object(
+            Bucket='bucket', Key='flat/%02d' % index, Body=b'')
+    mocker.patch('megfile.s3.max_keys', 2)
+    mocker.patch('megfile.s3.PARTITION_MAX_PAGES', 2)
+    mocker.patch('megfile.s3.PARTITION_BUFFER_PAGES', 1)
+    list_objects = mocker.spy(s3_empty_client, 'list_objects_v2')
+
+    # Flat prefix is not loaded into memory for partitions, but streamed as a whole partition
+    for ordered in (True, False):
+        list_objects.reset_mock()
+        result = s3.s3_scan_stat(
+            's3://bucket/flat/', max_workers=2, ordered=ordered)
+        assert next(result)[0] == 's3://bucket/flat/00'
+        # 2 pages of directory, and at most max_workers pages buffered, one being put and one being listed
+        assert list_objects.call_count <= 2 + 2 + 2
+        assert len(list(result)) == 19
+
+    # Listing stops when consumer is gone, though queues are full
+    list_objects.reset_mock()
+    for ordered in (True, False):
+        result = s3.s3_scan_stat(
+            's3://bucket/flat/', max_workers=2, ordered=ordered)
+        next(result)
+        result.close()
+    assert list_objects.call_count < 2 * 10
+
+
+def test_s3_scan_stat_parallel_error(truncating_client, mocker):
+    mocker.patch(
+        'megfile.s3._list_objects_recursive',
+        side_effect=botocore.exceptions.ClientError(
+            {'Error': {
+                'Code': 'AccessDenied'
+            }}, 'ListObjectsV2'))
+    mocker.patch('megfile.s3.s3_isdir', return_value=True)
+    with pytest.raises(S3PermissionError):
+        list(s3.s3_scan_stat('s3://bucketA', max_workers=2))
+
+
 def test_s3_path_join():
     assert s3.s3_path_join('s3://') == 's3://'
     assert s3.s3_path_join('s3://', 'bucket/key') == 's3://bucket/key'
@@ -2004,6 +2877,32 @@ def test_s3_share_cache_open(s3_empty_client):
         assert reader.read() == content
 
 
+def test_s3_share_cache_open_shm_cache(s3_empty_client, tmpdir):
+    content = b'test data for s3_share_cache_open'
+    s3_empty_client.create_bucket(Bucket='bucket')
+    s3_empty_client.put_object(Bucket='bucket', Key='key', Body=content)
+
+    with s3.s3_share_cache_open('s3://bucket/key', shm_cache=True,
+                                shm_cache_dir=str(tmpdir)) as reader:
+        assert reader.read() == content
+    assert len(os.listdir(str(tmpdir))) > 0
+
+
+def test_s3_prefetch_open_block_cache(s3_empty_client, tmpdir):
+    content = b'test data for s3_prefetch_open'
+    s3_empty_client.create_bucket(Bucket='bucket')
+    s3_empty_client.put_object(Bucket='bucket', Key='key', Body=content)
+
+    with s3.s3_prefetch_open('s3://bucket/key',
+                             block_cache_dir=str(tmpdir)) as reader:
+        assert reader.read() == content
+    assert len(os.listdir(str(tmpdir))) > 0
+
+    with s3.s3_buffered_open('s3://bucket/key', 'rb',
+                             block_cache_dir=str(tmpdir)) as reader:
+        assert reader.read() == content
+
+
 def test_s3_prefetch_open_raises_exceptions(s3_empty_client):
     s3_empty_client.create_bucket(Bucket='bucket')
     s3_empty_client.put_object(Bucket='bucket', Key='key')
@@ -2021,7 +2920,7 @@ def test_s3_prefetch_open_raises_exceptions(s3_empty_client):
     assert 's3://bucket/keyy' in str(error.value)
 
 
-def test_s3_pipe_open(s3_empty_client):
+def test_s3_pipe_open(s3_empty_client, mocker):
     content = b'test data for s3_pipe_open'
     s3_empty_client.create_bucket(Bucket='bucket')
 
@@ -2032,10 +2931,13 @@ def test_s3_pipe_open(s3_empty_client):
     body = s3_empty_client.get_object(Bucket='bucket', Key='key')['Body'].read()
     assert body == content
 
+    head_object = mocker.spy(s3_empty_client, 'head_object')
     with s3.s3_pipe_open('s3://bucket/key', 'rb') as reader:
         assert reader.name == 's3://bucket/key'
         assert reader.mode == 'rb'
         assert reader.read() == content
+    # File is checked by HEAD once, read-handle doesn't request it again
+    assert head_object.call_count == 1
 
 
 def test_s3_pipe_open_raises_exceptions(s3_empty_client):
@@ -2179,6 +3081,10 @@ def test_s3_buffered_open(mocker, s3_empty_client, fs):
     writer = s3.s3_buffered_open('s3://bucket/key', 'wb', limited_seekable=True)
     assert isinstance(writer.raw, s3.S3LimitedSeekableWriter)
 
+    writer = s3.s3_buffered_open(
+        's3://bucket/key', 'wb', size_hint=2 * 10000 * s3.DEFAULT_BLOCK_SIZE)
+    assert writer.raw._block_size == 2 * s3.DEFAULT_BLOCK_SIZE
+
     reader = s3.s3_buffered_open('s3://bucket/key', 'rb')
     assert isinstance(reader.raw, s3.S3PrefetchReader)
 
@@ -2276,6 +3182,83 @@ def test_s3_load_content(s3_empty_client):
         s3.s3_load_content('s3://bucket/key', 5, 2)
 
 
+def test_s3_load_content_without_head(s3_empty_client, mocker):
+    content = b'test data for s3_load_content'
+    s3_empty_client.create_bucket(Bucket='bucket')
+    s3_empty_client.put_object(Bucket='bucket', Key='key', Body=content)
+    s3_empty_client.put_object(Bucket='bucket', Key='empty', Body=b'')
+
+    head_object_func = mocker.spy(s3_empty_client, 'head_object')
+    assert s3.s3_load_content('s3://bucket/key') == content
+    assert s3.s3_load_content('s3://bucket/key', 4) == content[4:]
+    assert s3.s3_load_content('s3://bucket/key', -4) == content[-4:]
+    assert s3.s3_load_content('s3://bucket/key', -100) == content
+    assert s3.s3_load_content('s3://bucket/key', 4, 7) == content[4:7]
+    assert s3.s3_load_content('s3://bucket/key', 4, 4) == b''
+    assert s3.s3_load_content('s3://bucket/key', 100) == b''
+    assert s3.s3_load_content('s3://bucket/empty') == b''
+    assert s3.s3_load_content(
+        's3://bucket/key', 4, -2, size=len(content)) == content[4:-2]
+    assert head_object_func.call_count == 0
+
+    with pytest.raises(FileNotFoundError):
+        s3.s3_load_content('s3://bucket/notExist')
+
+
+def test_s3_prefetch_open_stat(s3_empty_client, mocker):
+    content = b'test data for s3_prefetch_open'
+    s3_empty_client.create_bucket(Bucket='bucket')
+    s3_empty_client.put_object(Bucket='bucket', Key='key', Body=content)
+    stat = s3.s3_stat('s3://bucket/key')
+
+    head_object_func = mocker.spy(s3_empty_client, 'head_object')
+    with s3.s3_prefetch_open('s3://bucket/key', stat=stat) as reader:
+        assert reader.read() == content
+    with s3.s3_share_cache_open('s3://bucket/key', stat=stat) as reader:
+        assert reader.read() == content
+    assert head_object_func.call_count == 0
+
+
+def test_s3_load_ranges(s3_empty_client, mocker):
+    content = b'test data for s3_load_ranges'
+    s3_empty_client.create_bucket(Bucket='bucket')
+    s3_empty_client.put_object(Bucket='bucket', Key='key', Body=content)
+
+    head_object_func = mocker.spy(s3_empty_client, 'head_object')
+    get_object_func = mocker.spy(s3_empty_client, 'get_object')
+    views = s3.s3_load_ranges('s3://bucket/key', [(5, 9), (0, 4), (10, 100)])
+    assert [bytes(view) for view in views
+           ] == [content[5:9], content[:4], content[10:]]
+    # nearby ranges are merged, and size is not needed
+    assert get_object_func.call_count == 1
+    assert head_object_func.call_count == 0
+
+    # start of None is 0, size is not needed
+    views = s3.s3_load_ranges('s3://bucket/key', [(None, 4), (None, 100)])
+    assert [bytes(view) for view in views] == [content[:4], content]
+    assert head_object_func.call_count == 0
+
+    views = s3.s3_load_ranges('s3://bucket/key', [(None, 4), (-6, None)])
+    assert [bytes(view) for view in views] == [content[:4], content[-6:]]
+    assert head_object_func.called
+
+    # Ranges starting at or beyond end of file are empty, like s3_load_content
+    size = len(content)
+    views = s3.s3_load_ranges(
+        's3://bucket/key', [(size + 2, size + 5), (size, size + 1)])
+    assert [bytes(view) for view in views] == [b'', b'']
+    assert s3.s3_load_content('s3://bucket/key', size + 2, size + 5) == b''
+
+    with pytest.raises(ValueError):
+        s3.s3_load_ranges('s3://bucket/key', [(5, 2)])
+    with pytest.raises(IsADirectoryError):
+        s3.s3_load_ranges('s3://bucket/', [(0, 1)])
+    with pytest.raises(FileNotFoundError):
+        s3.s3_load_ranges('s3:///key', [(0, 1)])
+    with pytest.raises(FileNotFoundError):
+        s3.s3_load_ranges('s3://bucket/notExist', [(0, 1)])
+
+
 def test_s3_load_content_retry(s3_empty_client, mocker):
     content = b'test data for s3_load_content'
     s3_empty_client.create_bucket(Bucket='bucket')
@@ -0,0 +1,315 @@
+import asyncio
+import sys
+from subprocess import check_output
+from threading import Thread
+
+import moto
+import pytest
+
+from megfile import s3, s3_async
+from megfile.errors import S3FileNotFoundError, S3IsADirectoryError, UnsupportedError
+from tests.test_s3 import s3_empty_client
+
+BUCKET = 'bucket'
+KEY = 'key'
+CONTENT = b'block0 block1 block2 block3 block4 '
+
+# Event loop creates a socketpair to wake itself up, requests are sent to moto server on localhost only
+pytestmark = [
+    pytest.mark.enable_socket,
+    pytest.mark.allow_hosts(['127.0.0.1']),
+]
+
+
+class AsyncBody:
+
+    def __init__(self, body):
+        self._body = body
+
+    async def read(self, size=None):
+        if size is None:
+            return self._body.read()
+        return self._body.read(size)
+
+    def close(self):
+        self._body.close()
+
+
+class AsyncClient:
+    '''Works like an aiobotocore client, requests are sent by the sync client'''
+
+    def __init__(self, client):
+        self._client = client
+
+    def __getattr__(self, name):
+        method = getattr(self._client, name)
+
+        async def wrapper(*args, **kwargs):
+            await asyncio.sleep(0)
+            result = method(*args, **kwargs)
+            if 'Body' in result:
+                result['Body'] = AsyncBody(result['Body'])
+            return result
+
+        return wrapper
+
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+@pytest.fixture
+def async_client(s3_empty_client, mocker):
+    client = AsyncClient(s3_empty_client)
+
+    async def get_async_s3_client(bucket=None):
+        return client
+
+    mocker.patch(
+        'megfile.s3_async.get_async_s3_client', new=get_async_s3_client)
+    return client
+
+
+@pytest.fixture
+def client(s3_empty_client, async_client):
+    s3_empty_client.create_bucket(Bucket=BUCKET)
+    s3_empty_client.put_object(Bucket=BUCKET, Key=KEY, Body=CONTENT)
+    return s3_empty_client
+
+
+def test_megfile_import_without_s3_async():
+    # s3_async requires python 3.6+, it's not imported with megfile
+    output = check_output(
+        [
+            sys.executable, '-c',
+            'import sys, megfile; print("megfile.s3_async" in sys.modules)'
+        ])
+    assert output.strip() == b'False'
+
+
+def test_async_s3_load_content(client, mocker):
+    head_object = mocker.spy(client, 'head_object')
+    url = 's3://bucket/key'
+
+    assert run(s3_async.async_s3_load_content(url)) == CONTENT
+    assert run(s3_async.async_s3_load_content(url, 7, 13)) == b'block1'
+    assert run(s3_async.async_s3_load_content(url, -6)) == b'lock4 '
+    assert run(s3_async.async_s3_load_content(url, 100)) == b''
+    assert run(s3_async.async_s3_load_content(url, 3, 3)) == b''
+    assert not head_object.called
+
+    assert run(s3_async.async_s3_load_content(url, -7, -1)) == b'block4'
+    assert head_object.call_count == 1
+    assert run(s3_async.async_s3_load_content(
+        url, 0, -1, size=len(CONTENT))) == CONTENT[:-1]
+    assert head_object.call_count == 1
+
+    with pytest.raises(ValueError):
+        run(s3_async.async_s3_load_content(url, 5, 2))
+    with pytest.raises(S3FileNotFoundError):
+        run(s3_async.async_s3_load_content('s3://bucket/not-found'))
+    with pytest.raises(S3IsADirectoryError):
+        run(s3_async.async_s3_load_content('s3://bucket/dir/'))
+
+
+def test_async_s3_scan_stat(client):
+    client.put_object(Bucket=BUCKET, Key='dir/a', Body=b'a')
+    client.put_object(Bucket=BUCKET, Key='dir/b/c', Body=b'bc')
+    client.put_object(Bucket=BUCKET, Key='dir', Body=b'dir')
+
+    async def scan_stat(url, missing_ok=True):
+        result = []
+        async for path, stat in s3_async.async_s3_scan_stat(
+                url, missing_ok=missing_ok):
+            result.append((path, stat.size))
+        return result
+
+    assert run(scan_stat('s3://bucket/dir')) == [
+        ('s3://bucket/dir', 3),
+        ('s3://bucket/dir/a', 1),
+        ('s3://bucket/dir/b/c', 2),
+    ]
+    assert run(scan_stat('s3://bucket/dir/')) == [
+        ('s3://bucket/dir/a', 1),
+        ('s3://bucket/dir/b/c', 2),
+    ]
+    assert run(scan_stat('s3://bucket/key')) == [('s3://bucket/key', 35)]
+    assert run(scan_stat('s3://bucket/not-found')) == []
+
+    with pytest.raises(S3FileNotFoundError):
+        run(scan_stat('s3://bucket/not-found', missing_ok=False))
+    with pytest.raises(UnsupportedError):
+        run(scan_stat('s3://'))
+
+
+def test_async_s3_scan_stat_truncated(client, mocker):
+    mocker.patch('megfile.s3_async.max_keys', 1)
+    for index in range(3):
+        client.put_object(Bucket=BUCKET, Key='dir/%d' % index, Body=b'')
+
+    async def scan(url):
+        result = []
+        async for path, _ in s3_async.async_s3_scan_stat(url):
+            result.append(path)
+        return result
+
+    assert run(scan('s3://bucket/dir/')) == [
+        's3://bucket/dir/0',
+        's3://bucket/dir/1',
+        's3://bucket/dir/2',
+    ]
+
+
+def test_async_s3_open(client):
+
+    async def write_and_read():
+        async with await s3_async.async_s3_open('s3://bucket/new',
+                                                'wb') as writer:
+            await writer.write(CONTENT)
+            await writer.write(CONTENT)
+        async with await s3_async.async_s3_open('s3://bucket/new',
+                                                block_size=7) as reader:
+            return await reader.read()
+
+    assert run(write_and_read()) == CONTENT * 2
+
+    with pytest.raises(ValueError):
+        run(s3_async.async_s3_open('s3://bucket/key', 'ab'))
+
+
+def test_async_s3_open_invalidate_metadata(client, mocker):
+    mocker.patch.object(moto.s3.models, 'UPLOAD_PART_MIN_SIZE', 5)
+    s3.s3_enable_metadata_cache(ttl=60)
+    try:
+        for path, block_size in [('s3://bucket/small', 64),
+                                 ('s3://bucket/large', 7)]:
+            # Negative result is cached
+            assert s3.s3_isfile(path) is False
+
+            async def write():
+                async with await s3_async.async_s3_open(
+                        path, 'wb', block_size=block_size) as writer:
+                    await writer.write(CONTENT)
+
+            run(write())
+            # Written file is invalidated, whether it's uploaded by put_object or by parts
+            assert s3.s3_isfile(path) is True
+    finally:
+        s3.s3_disable_metadata_cache()
+
+
+def test_async_s3_open_stat(client, mocker):
+    get_object = mocker.spy(client, 'get_object')
+    head_object = mocker.spy(client, 'head_object')
+
+    async def read_with_stat():
+        async for _, stat in s3_async.async_s3_scan_stat('s3://bucket/'):
+            reader = await s3_async.async_s3_open(
+                's3://bucket/key', stat=stat, block_size=64)
+            assert not get_object.called
+            async with reader:
+                return await reader.read()
+
+    assert run(read_with_stat()) == CONTENT
+    assert get_object.call_count == 1
+    assert not head_object.called
+
+
+@pytest.fixture
+def moto_server(monkeypatch):
+    '''moto server on localhost, requests of aiobotocore client are sent to it by aiohttp'''
+    pytest.importorskip('aiobotocore')
+    moto_server = pytest.importorskip('moto.server')
+    from werkzeug.serving import make_server
+
+    moto.s3.models.s3_backend.reset()
+    server = make_server(
+        '127.0.0.1', 0, moto_server.create_backend_app('s3'), threaded=True)
+    thread = Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    endpoint_url = 'http://127.0.0.1:%d' % server.server_port
+    monkeypatch.setenv('OSS_ENDPOINT', endpoint_url)
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'testing')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'testing')
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+    yield endpoint_url
+    server.shutdown()
+    thread.join()
+    moto.s3.models.s3_backend.reset()
+
+
+def test_async_s3_aiobotocore(moto_server, mocker):
+    mocker.patch.object(moto.s3.models, 'UPLOAD_PART_MIN_SIZE', 5)
+
+    async def write_and_read():
+        client = await s3_async.get_async_s3_client()
+        assert client is await s3_async.get_async_s3_client()
+        await client.create_bucket(Bucket=BUCKET)
+        try:
+            async with await s3_async.async_s3_open('s3://bucket/small',
+                                                    'wb') as writer:
+                await writer.write(CONTENT)
+            # Uploaded by parts
+            async with await s3_async.async_s3_open('s3://bucket/large', 'wb',
+                                                    block_size=7) as writer:
+                await writer.write(CONTENT)
+                await writer.write(CONTENT)
+
+            async with await s3_async.async_s3_open('s3://bucket/large',
+                                                    block_size=7) as reader:
+                assert await reader.read(10) == CONTENT[:10]
+                await reader.seek(-6, 2)
+                assert await reader.read() == b'lock4 '
+
+            result = []
+            async for path, stat in s3_async.async_s3_scan_stat('s3://bucket/'):
+                result.append((path, stat.size))
+                async with await s3_async.async_s3_open(path, stat=stat,
+                                                        block_size=7) as reader:
+                    assert await reader.read() == CONTENT * (stat.size // 35)
+            assert result == [
+                ('s3://bucket/large', 70),
+                ('s3://bucket/small', 35),
+            ]
+
+            assert await s3_async.async_s3_load_content(
+                's3://bucket/small', 7, 13) == b'block1'
+            assert await s3_async.async_s3_load_content(
+                's3://bucket/small', 100) == b''
+            with pytest.raises(S3FileNotFoundError):
+                await s3_async.async_s3_load_content('s3://bucket/not-found')
+        finally:
+            await s3_async.close_async_s3_client()
+
+    run(write_and_read())
+
+
+def test_get_async_s3_client_route(moto_server, mocker):
+    mocker.patch.object(s3, '_routes', [])
+    # Default endpoint is not reachable, requests of routed buckets are sent to moto server
+    mocker.patch(
+        'megfile.s3_async.get_endpoint_url', return_value='http://127.0.0.1:1')
+    s3.s3_add_route('onprem-*', endpoint_url=moto_server)
+
+    async def write_and_read():
+        client = await s3_async.get_async_s3_client('onprem-bucket')
+        try:
+            assert client.meta.endpoint_url == moto_server
+            assert client is await s3_async.get_async_s3_client('onprem-other')
+            default_client = await s3_async.get_async_s3_client('bucket')
+            assert default_client.meta.endpoint_url == 'http://127.0.0.1:1'
+
+            await client.create_bucket(Bucket='onprem-bucket')
+            async with await s3_async.async_s3_open('s3://onprem-bucket/key',
+                                                    'wb') as writer:
+                await writer.write(CONTENT)
+            return await s3_async.async_s3_load_content(
+                's3://onprem-bucket/key')
+        finally:
+            await s3_async.close_async_s3_client()
+
+    assert run(write_and_read()) == CONTENT
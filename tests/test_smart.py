@@ -1,6 +1,8 @@
 import os
+import time
 from io import BytesIO, StringIO
 from pathlib import Path
+from threading import current_thread, main_thread
 from typing import List, Tuple
 from unittest.mock import patch
 
@@ -9,9 +11,12 @@ from mock import patch
 
 import megfile
 from megfile import smart
-from megfile.interfaces import Access, StatResult
-from megfile.s3 import _s3_binary_mode
+from megfile.interfaces import Access, FileEntry, StatResult
+from megfile.errors import S3PermissionError
+from megfile.s3 import S3RemoveFailure, S3RemoveReport, _s3_binary_mode
 from megfile.smart_path import SmartPath
+from tests.test_s3 import s3_empty_client
+from tests.test_s3_async import run
 
 
 @pytest.fixture
@@ -227,7 +232,7 @@ def test_smart_sync(mocker):
     smart_isdir = mocker.patch('megfile.smart.smart_isdir', side_effect=isdir)
     smart_isfile = mocker.patch(
         'megfile.smart.smart_isfile', side_effect=isfile)
-    smart_scan = mocker.patch('megfile.smart.smart_scan')
+    smart_scan_stat = mocker.patch('megfile.smart.smart_scan_stat')
     '''
       folder/
         - folderA/
@@ -242,13 +247,14 @@ def test_smart_sync(mocker):
 
     def listdir(path: str):
         if path == 'folder':
-            return ["folder/folderA/fileB", "folder/fileA"]
+            paths = ["folder/folderA/fileB", "folder/fileA"]
         if path == 'folder/fileA':
-            return ["folder/fileA"]
+            paths = ["folder/fileA"]
         if path == 'a':
-            return ['a', 'a/b/c', 'a/d']
+            paths = ['a', 'a/b/c', 'a/d']
+        return [FileEntry(path, StatResult(size=1)) for path in paths]
 
-    smart_scan.side_effect = listdir
+    smart_scan_stat.side_effect = listdir
 
     smart.smart_sync('folder', 'dst')
     assert smart_copy.call_count == 2
@@ -269,6 +275,130 @@ def test_smart_sync(mocker):
     smart_copy.assert_any_call('a/d', 'dst/d', callback=None)
 
 
+def test_smart_sync_progress(tmpdir):
+    src_path = str(tmpdir / 'src')
+    for name, content in (('a', b'a'), ('b/c', b'bc'), ('b/d/e', b'bde')):
+        smart.smart_save_content(os.path.join(src_path, name), content)
+
+    progresses = []
+    copied = {}
+
+    def callback(path, num_bytes):
+        copied[path] = copied.get(path, 0) + num_bytes
+
+    dst_path = str(tmpdir / 'dst')
+    smart.smart_sync(
+        src_path,
+        dst_path,
+        callback=callback,
+        max_workers=2,
+        progress_callback=lambda progress: progresses.append(
+            (progress.copied_files, progress.copied_bytes)))
+
+    assert smart.smart_load_content(os.path.join(dst_path, 'b/d/e')) == b'bde'
+    assert sorted(smart.smart_scan(dst_path)) == [
+        os.path.join(dst_path, name) for name in ('a', 'b/c', 'b/d/e')
+    ]
+    assert sum(copied.values()) == 6
+    assert progresses[-1] == (3, 6)
+
+
+def test_smart_sync_skip_unchanged(tmpdir):
+    src_path = str(tmpdir / 'src')
+    dst_path = str(tmpdir / 'dst')
+    for name, content in (('a-b', b'ab'), ('a/c', b'ac'), ('b/d', b'bd'),
+                          ('c', b'c')):
+        smart.smart_save_content(os.path.join(src_path, name), content)
+    smart.smart_sync(src_path, dst_path)
+
+    # same size but older in dst, different size, new file
+    os.utime(os.path.join(dst_path, 'a-b'), (time.time() - 100,) * 2)
+    smart.smart_save_content(os.path.join(src_path, 'a/c'), b'acc')
+    smart.smart_save_content(os.path.join(src_path, 'b/e'), b'be')
+
+    delta = smart.smart_sync(
+        src_path, dst_path, skip_unchanged=True, dry_run=True)
+    assert delta.files == [
+        (os.path.join(src_path, name), os.path.join(dst_path, name), size)
+        for name, size in (('a-b', 2), ('a/c', 3), ('b/e', 2))
+    ]
+    assert (delta.copy_files, delta.copy_bytes) == (3, 7)
+    assert (delta.skip_files, delta.skip_bytes) == (2, 3)
+    assert not os.path.exists(os.path.join(dst_path, 'b/e'))
+
+    delta = smart.smart_sync(src_path, dst_path, skip_unchanged=True)
+    assert delta.files == []
+    assert (delta.copy_files, delta.skip_files) == (3, 2)
+    assert smart.smart_load_content(os.path.join(dst_path, 'a/c')) == b'acc'
+    assert smart.smart_load_content(os.path.join(dst_path, 'b/e')) == b'be'
+
+    delta = smart.smart_sync(src_path, dst_path, skip_unchanged=True)
+    assert (delta.copy_files, delta.skip_files) == (0, 5)
+
+    delta = smart.smart_sync(src_path, dst_path, dry_run=True)
+    assert (delta.copy_files, delta.skip_files) == (5, 0)
+
+    with pytest.raises(ValueError):
+        smart.smart_sync(src_path, dst_path, compare='size')
+
+
+def test_smart_sync_skip_unchanged_etag(tmpdir, s3_empty_client):
+    s3_empty_client.create_bucket(Bucket='bucket')
+    src_path = str(tmpdir / 'src')
+    for name, content in (('a', b'a'), ('b/c', b'bc')):
+        smart.smart_save_content(os.path.join(src_path, name), content)
+
+    delta = smart.smart_sync(
+        src_path, 's3://bucket/dst', skip_unchanged=True, compare='etag')
+    assert (delta.copy_files, delta.skip_files) == (2, 0)
+
+    smart.smart_save_content(os.path.join(src_path, 'b/c'), b'cb')
+    delta = smart.smart_sync(
+        src_path,
+        's3://bucket/dst',
+        skip_unchanged=True,
+        compare='etag',
+        dry_run=True)
+    assert delta.files == [
+        (os.path.join(src_path, 'b/c'), 's3://bucket/dst/b/c', 2)
+    ]
+
+    delta = smart.smart_sync(
+        's3://bucket/dst', 's3://bucket/copy', skip_unchanged=True)
+    assert (delta.copy_files, delta.skip_files) == (2, 0)
+    delta = smart.smart_sync(
+        's3://bucket/dst',
+        's3://bucket/copy',
+        skip_unchanged=True,
+        compare='etag')
+    assert (delta.copy_files, delta.skip_files) == (0, 2)
+
+
+def test_smart_sync_skip_unchanged_etag_md5_in_worker(
+        tmpdir, s3_empty_client, mocker):
+    s3_empty_client.create_bucket(Bucket='bucket')
+    src_path = str(tmpdir / 'src')
+    for name, content in (('a', b'a'), ('b/c', b'bc')):
+        smart.smart_save_content(os.path.join(src_path, name), content)
+    smart.smart_sync(src_path, 's3://bucket/dst')
+
+    threads = []
+    content_md5 = smart._content_md5
+
+    def record_thread(path, stat):
+        threads.append(current_thread())
+        return content_md5(path, stat)
+
+    mocker.patch('megfile.smart._content_md5', side_effect=record_thread)
+    smart.smart_save_content(os.path.join(src_path, 'a'), b'b')
+    delta = smart.smart_sync(
+        src_path, 's3://bucket/dst', skip_unchanged=True, compare='etag')
+    assert (delta.copy_files, delta.skip_files) == (1, 1)
+    assert smart.smart_load_content('s3://bucket/dst/a') == b'b'
+    assert len(threads) == 4
+    assert main_thread() not in threads
+
+
 @patch.object(SmartPath, 'remove')
 def test_smart_remove(funcA):
     funcA.return_value = None
@@ -290,6 +420,18 @@ def test_smart_move(funcA):
     funcA.assert_called_once_with('s3://bucket/b')
 
 
+def test_smart_move_remove_failure(tmpdir, s3_empty_client, mocker):
+    s3_empty_client.create_bucket(Bucket='bucket')
+    smart.smart_save_content('s3://bucket/src/a', b'a')
+    report = S3RemoveReport()
+    report.failures.append(
+        S3RemoveFailure('s3://bucket/src/a', 'AccessDenied', 'Access Denied'))
+    mocker.patch('megfile.smart.smart_remove', return_value=report)
+    with pytest.raises(S3PermissionError):
+        smart.smart_move('s3://bucket/src', str(tmpdir / 'dst'))
+    assert smart.smart_load_content(str(tmpdir / 'dst' / 'a')) == b'a'
+
+
 @patch.object(SmartPath, 'rename')
 def test_smart_rename(funcA):
     funcA.return_value = None
@@ -692,6 +834,42 @@ def test_smart_load_content():
         smart.smart_load_content(path, 5, 2)
 
 
+def test_smart_load_ranges(mocker):
+    path = 'tests/test_smart.py'
+    content = open(path, 'rb').read()
+
+    views = smart.smart_load_ranges(path, [(4, 7), (None, 3), (-5, None)])
+    assert [bytes(view) for view in views
+           ] == [content[4:7], content[:3], content[-5:]]
+
+    with pytest.raises(ValueError):
+        smart.smart_load_ranges(path, [(5, 2)])
+
+    s3_load_ranges = mocker.patch('megfile.smart.s3_load_ranges')
+    smart.smart_load_ranges('s3://bucket/key', [(0, 1)])
+    s3_load_ranges.assert_called_once_with('s3://bucket/key', [(0, 1)])
+
+
+@pytest.mark.enable_socket
+def test_async_smart_open(tmpdir, mocker):
+    path = str(tmpdir / 'dir' / 'file')
+
+    async def write_and_read():
+        async with await smart.async_smart_open(path, 'w') as writer:
+            await writer.write('line1\nline2\n')
+        async with await smart.async_smart_open(path, 'r') as reader:
+            return await reader.readline(), await reader.read()
+
+    assert run(write_and_read()) == ('line1\n', 'line2\n')
+
+    async def s3_open(path, mode, **kwargs):
+        return path, mode, kwargs
+
+    mocker.patch('megfile.s3_async.async_s3_open', new=s3_open)
+    result = run(smart.async_smart_open('s3://bucket/key', 'rb', block_size=1))
+    assert result == ('s3://bucket/key', 'rb', {'block_size': 1})
+
+
 def test_smart_save_content(mocker):
     content = 'test data for smart_save_content'
     smart_open = mocker.patch('megfile.smart.smart_open')
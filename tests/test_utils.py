@@ -4,7 +4,7 @@ from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 import pytest
 
 from megfile.s3 import s3_buffered_open
-from megfile.utils import get_content_size, is_readable, is_seekable, is_writable, process_local, shadow_copy, thread_local
+from megfile.utils import coalesce_ranges, get_content_size, is_readable, is_seekable, is_writable, process_local, shadow_copy, thread_local
 from tests.test_s3 import s3_empty_client
 
 BUCKET = 'bucket'
@@ -145,6 +145,20 @@ def assert_different_list(local_func, l1):
     assert l3 is not l1
 
 
+def test_coalesce_ranges():
+    assert coalesce_ranges([], 2, 10) == []
+    assert coalesce_ranges([(8, 9), (0, 2), (3, 5)], 1,
+                           10) == [(0, 5, [1, 2]), (8, 9, [0])]
+    # overlapped and contained ranges
+    assert coalesce_ranges([(0, 6), (2, 4), (5, 8)], 0,
+                           10) == [(0, 8, [0, 1, 2])]
+    # merged range is limited by max_size
+    assert coalesce_ranges([(0, 4), (4, 8), (8, 12)], 0,
+                           8) == [(0, 8, [0, 1]), (8, 12, [2])]
+    assert coalesce_ranges([(0, 20), (20, 22)], 0,
+                           8) == [(0, 20, [0]), (20, 22, [1])]
+
+
 def test_process_local():
     l1 = process_local('list', list)
 